@@ -2,18 +2,18 @@ import pygame
 import random
 import math
 
-# Initialize Pygame
-pygame.init()
+from game_loop import Game, GameLoop, idle, open_window
+from game_profile import profiler
+from game_sprites import sprites
+from game_text import text
 
 # Screen dimensions
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Simple Asteroids Game")
-clock = pygame.time.Clock()
+# The window, opened by setup()
+screen = None
 
-# Set up fonts
-font = pygame.font.SysFont(None, 48)
-small_font = pygame.font.SysFont(None, 32)
+# Simulation steps per second; objects move by their velocity once per step.
+FPS = 60
 
 # Colors
 WHITE = (255, 255, 255)
@@ -23,6 +23,15 @@ GRAY = (100, 100, 100)
 
 # Spaceship class
 class Spaceship:
+    __slots__ = (
+        "position",
+        "velocity",
+        "angle",
+        "rotation_speed",
+        "acceleration",
+        "radius",
+    )
+
     def __init__(self):
         self.position = pygame.Vector2(WIDTH / 2, HEIGHT / 2)
         self.velocity = pygame.Vector2(0, 0)
@@ -51,19 +60,20 @@ class Spaceship:
         self.position.x %= WIDTH
         self.position.y %= HEIGHT
 
-    def draw(self, surface):
-        # Draw the ship as a triangle.
+    def draw(self, surface, alpha=1.0):
+        # Draw the ship as a triangle, where it is between the last two steps.
+        position = self.position - self.velocity * (1 - alpha)
         rad = math.radians(self.angle)
-        tip = self.position + pygame.Vector2(math.cos(rad), -math.sin(rad)) * 20
+        tip = position + pygame.Vector2(math.cos(rad), -math.sin(rad)) * 20
         left = (
-            self.position
+            position
             + pygame.Vector2(
                 math.cos(rad + math.radians(140)), -math.sin(rad + math.radians(140))
             )
             * 20
         )
         right = (
-            self.position
+            position
             + pygame.Vector2(
                 math.cos(rad - math.radians(140)), -math.sin(rad - math.radians(140))
             )
@@ -72,99 +82,107 @@ class Spaceship:
         pygame.draw.polygon(surface, WHITE, [tip, left, right])
 
 
-# Asteroid class
+# Asteroid class. Asteroids and bullets, of which there can be many, keep their position
+# and velocity in plain floats rather than pygame.Vector2s, and in slots.
 class Asteroid:
+    __slots__ = ("size", "x", "y", "vx", "vy", "radius")
+
     def __init__(self, position=None, size=3):
         """
         size: 3 for large, 2 for medium, 1 for small.
         """
         self.size = size
         if position is None:
-            self.position = pygame.Vector2(
-                random.randrange(WIDTH), random.randrange(HEIGHT)
-            )
+            self.x = float(random.randrange(WIDTH))
+            self.y = float(random.randrange(HEIGHT))
         else:
-            self.position = pygame.Vector2(position)
+            self.x, self.y = position
         angle = random.uniform(0, 2 * math.pi)
         speed = random.uniform(1, 3)
-        self.velocity = pygame.Vector2(math.cos(angle) * speed, math.sin(angle) * speed)
+        self.vx = math.cos(angle) * speed
+        self.vy = math.sin(angle) * speed
         self.radius = size * 15  # Larger asteroids have a larger radius
 
     def update(self):
-        self.position += self.velocity
-        self.position.x %= WIDTH
-        self.position.y %= HEIGHT
+        self.x = (self.x + self.vx) % WIDTH
+        self.y = (self.y + self.vy) % HEIGHT
 
-    def draw(self, surface):
-        pygame.draw.circle(
-            surface, GRAY, (int(self.position.x), int(self.position.y)), self.radius, 2
-        )
+    def sprite(self, alpha=1.0):
+        """The asteroid's image and where to blit it."""
+        back = 1 - alpha
+        x, y = self.x - self.vx * back, self.y - self.vy * back
+        image = sprites.circle(self.radius, GRAY, 2)
+        return image, (int(x) - self.radius, int(y) - self.radius)
 
 
 # Bullet class
 class Bullet:
+    __slots__ = ("x", "y", "vx", "vy", "radius", "lifetime")
+
     def __init__(self, position, angle):
-        self.position = pygame.Vector2(position)
+        self.x, self.y = position
         rad = math.radians(angle)
-        self.velocity = pygame.Vector2(math.cos(rad), -math.sin(rad)) * 8
+        self.vx = math.cos(rad) * 8
+        self.vy = -math.sin(rad) * 8
         self.radius = 2
         self.lifetime = 60  # Frames
 
     def update(self):
-        self.position += self.velocity
-        self.position.x %= WIDTH
-        self.position.y %= HEIGHT
+        self.x = (self.x + self.vx) % WIDTH
+        self.y = (self.y + self.vy) % HEIGHT
         self.lifetime -= 1
 
-    def draw(self, surface):
-        pygame.draw.circle(
-            surface, WHITE, (int(self.position.x), int(self.position.y)), self.radius
-        )
-
+    def sprite(self, alpha=1.0):
+        """The bullet's image and where to blit it."""
+        back = 1 - alpha
+        x, y = self.x - self.vx * back, self.y - self.vy * back
+        image = sprites.circle(self.radius, WHITE)
+        return image, (int(x) - self.radius, int(y) - self.radius)
 
-def show_game_over_screen():
-    """Display the game over screen until the player presses R to restart or quits."""
-    while True:
-        screen.fill(BLACK)
-        # Render game over messages
-        game_over_text = font.render("GAME OVER", True, WHITE)
-        restart_text = small_font.render("Press R to Restart", True, WHITE)
-        quit_text = small_font.render("Press Q or close window to Quit", True, WHITE)
-
-        # Position texts at the center of the screen
-        screen.blit(
-            game_over_text, game_over_text.get_rect(center=(WIDTH / 2, HEIGHT / 2 - 50))
-        )
-        screen.blit(restart_text, restart_text.get_rect(center=(WIDTH / 2, HEIGHT / 2)))
-        screen.blit(quit_text, quit_text.get_rect(center=(WIDTH / 2, HEIGHT / 2 + 50)))
-        pygame.display.flip()
 
-        # Wait for events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    return  # Exit this loop and restart the game
-                if event.key == pygame.K_q:
-                    pygame.quit()
-                    exit()
+def draw_game_over_screen():
+    screen.fill(BLACK)
+    # Game over messages, centred on the screen
+    text.draw(screen, "GAME OVER", 48, WHITE, center=(WIDTH / 2, HEIGHT / 2 - 50))
+    text.draw(screen, "Press R to Restart", 32, WHITE, center=(WIDTH / 2, HEIGHT / 2))
+    text.draw(
+        screen,
+        "Press Q or close window to Quit",
+        32,
+        WHITE,
+        center=(WIDTH / 2, HEIGHT / 2 + 50),
+    )
 
-        clock.tick(60)
 
+def show_game_over_screen():
+    """Display the game over screen until the player presses R to restart or quits."""
+    # Drawn once, then asleep until a key is pressed.
+    if idle(draw_game_over_screen, (pygame.K_r, pygame.K_q)) != pygame.K_r:
+        pygame.quit()
+        exit()
 
-def run_game():
-    spaceship = Spaceship()
-    asteroids = [Asteroid(size=3) for _ in range(5)]
-    bullets = []
-    running = True
 
-    while running:
-        clock.tick(60)  # 60 FPS
+class AsteroidsGame(Game):
+    def __init__(self):
+        self.spaceship = Spaceship()
+        self.asteroids = [Asteroid(size=3) for _ in range(5)]
+        self.bullets = []
+        # Asteroids shot so far.
+        self.score = 0
+
+    def snapshot(self):
+        spaceship = self.spaceship
+        return (
+            tuple(spaceship.position),
+            tuple(spaceship.velocity),
+            spaceship.angle,
+            [((a.x, a.y), a.size) for a in self.asteroids],
+            [((b.x, b.y), b.lifetime) for b in self.bullets],
+        )
 
+    def input(self, events):
         # Event handling
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
@@ -172,58 +190,75 @@ def run_game():
             # Fire bullet when space is pressed
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
-                    bullet = Bullet(spaceship.position, spaceship.angle)
-                    bullets.append(bullet)
+                    bullet = Bullet(self.spaceship.position, self.spaceship.angle)
+                    self.bullets.append(bullet)
 
+    def update(self, dt):
+        spaceship = self.spaceship
         # Update game objects
         spaceship.update()
-        for asteroid in asteroids:
+        for asteroid in self.asteroids:
             asteroid.update()
-        for bullet in bullets:
+        for bullet in self.bullets:
             bullet.update()
 
         # Remove bullets that have expired
-        bullets = [b for b in bullets if b.lifetime > 0]
-
-        # Check collisions between bullets and asteroids
-        new_asteroids = []
-        for asteroid in asteroids:
-            hit = False
-            for bullet in bullets:
-                if asteroid.position.distance_to(bullet.position) < asteroid.radius:
-                    hit = True
-                    # If the asteroid is not the smallest, split it into two smaller asteroids
-                    if asteroid.size > 1:
-                        for _ in range(2):
-                            new_asteroids.append(
-                                Asteroid(
-                                    position=asteroid.position, size=asteroid.size - 1
+        self.bullets = [b for b in self.bullets if b.lifetime > 0]
+
+        with profiler.section("collision"):
+            # Check collisions between bullets and asteroids
+            new_asteroids = []
+            for asteroid in self.asteroids:
+                hit = False
+                for bullet in self.bullets:
+                    distance = math.hypot(asteroid.x - bullet.x, asteroid.y - bullet.y)
+                    if distance < asteroid.radius:
+                        hit = True
+                        self.score += 1
+                        # If the asteroid is not the smallest, split it into two smaller asteroids
+                        if asteroid.size > 1:
+                            for _ in range(2):
+                                new_asteroids.append(
+                                    Asteroid(
+                                        position=(asteroid.x, asteroid.y),
+                                        size=asteroid.size - 1,
+                                    )
                                 )
-                            )
-                    break
-            if not hit:
-                new_asteroids.append(asteroid)
-        asteroids = new_asteroids
-
-        # Check collision between the spaceship and asteroids
-        for asteroid in asteroids:
-            if (
-                spaceship.position.distance_to(asteroid.position)
-                < asteroid.radius + spaceship.radius
-            ):
-                running = False  # End game loop if collision occurs
-
+                        break
+                if not hit:
+                    new_asteroids.append(asteroid)
+            self.asteroids = new_asteroids
+
+            # Check collision between the spaceship and asteroids
+            for asteroid in self.asteroids:
+                distance = math.hypot(
+                    spaceship.position.x - asteroid.x, spaceship.position.y - asteroid.y
+                )
+                if distance < asteroid.radius + spaceship.radius:
+                    self.running = False  # End game loop if collision occurs
+
+    def render(self, alpha):
         # Drawing
         screen.fill(BLACK)
-        spaceship.draw(screen)
-        for asteroid in asteroids:
-            asteroid.draw(screen)
-        for bullet in bullets:
-            bullet.draw(screen)
-        pygame.display.flip()
+        self.spaceship.draw(screen, alpha)
+        screen.blits(
+            [asteroid.sprite(alpha) for asteroid in self.asteroids]
+            + [bullet.sprite(alpha) for bullet in self.bullets],
+            doreturn=False,
+        )
+
+
+def run_game():
+    GameLoop(AsteroidsGame(), step_rate=FPS, render_rate=FPS).run()
+
+
+def setup():
+    global screen
+    screen = open_window((WIDTH, HEIGHT), "Simple Asteroids Game")
 
 
 def main():
+    setup()
     while True:
         run_game()
         # When run_game() returns, a collision has occurred.
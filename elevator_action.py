@@ -2,8 +2,13 @@ import pygame
 import sys
 import random
 
-# Initialize Pygame
-pygame.init()
+from elevator_cars import OPEN, Car, ElevatorScheduler
+from elevator_entities import EntityManager
+from elevator_level import DOOR_HEIGHT, DOOR_WIDTH, Building
+from game_loop import Game, GameLoop, idle, open_window
+from game_profile import profiler
+from game_sprites import sprites
+from game_text import text
 
 # ----- Configuration -----
 SCREEN_WIDTH = 800
@@ -18,42 +23,41 @@ GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 YELLOW = (255, 255, 0)
 CYAN = (0, 255, 255)
-
-# Define building floors.
-# In this simple version there are three floors.
-# For each floor we specify a “floor line” (y coordinate) and a list of door rectangles.
-# (Door rectangles are used for both descending via an elevator and, on the bottom floor, as the exit.)
-DOOR_WIDTH = 50
-DOOR_HEIGHT = 80
-floors = [
-    {  # Floor 0 (top)
-        "y": 100,
-        "doors": [
-            pygame.Rect(50, 100 - DOOR_HEIGHT // 2, DOOR_WIDTH, DOOR_HEIGHT),
-            pygame.Rect(700, 100 - DOOR_HEIGHT // 2, DOOR_WIDTH, DOOR_HEIGHT),
-        ],
-    },
-    {  # Floor 1 (middle)
-        "y": 300,
-        "doors": [pygame.Rect(375, 300 - DOOR_HEIGHT // 2, DOOR_WIDTH, DOOR_HEIGHT)],
-    },
-    {  # Floor 2 (ground/exit floor)
-        "y": 500,
-        "doors": [
-            pygame.Rect(
-                375, 500 - DOOR_HEIGHT // 2, DOOR_WIDTH, DOOR_HEIGHT
-            )  # exit door
-        ],
-    },
+GREY = (128, 128, 128)
+
+# Most enemies alive at once on one floor and in the whole building, and most bullets in
+# flight. Spawns beyond these are skipped.
+FLOOR_ENEMY_CAP = 6
+ENEMY_CAP = 24
+BULLET_CAP = 32
+
+# Elevators carry enemies as well as the player. Each spawn is an enemy riding in from
+# another floor with this chance, when an elevator serves the player's floor, and an
+# enemy at an elevator's door when it opens gets in with the other.
+ENEMY_RIDE_CHANCE = 0.5
+ENEMY_BOARD_CHANCE = 0.3
+# Stands in for an enemy riding an elevator.
+ENEMY_RIDER = "enemy"
+
+# The building, one line per floor, top floor first (see elevator_level.py for the
+# legend). Other buildings can be loaded from a file given on the command line.
+building_layout = [
+    "..D.............P...........D...",
+    "....$..........D................",
+    "...............E................",
 ]
-
-# Document is placed on floor 1.
-document_rect = pygame.Rect(100, floors[1]["y"] - 15, 30, 30)
+building = Building(building_layout)
 document_collected = False
 
+# How far the camera moves towards the player's floor each frame, as a fraction of the
+# distance left.
+CAMERA_EASE = 0.15
+
 
 # ----- Game Object Classes -----
 class Player:
+    __slots__ = ("rect", "floor", "direction", "car", "ride")
+
     WIDTH = 30
     HEIGHT = 40
     SPEED = 5
@@ -62,8 +66,18 @@ class Player:
         self.rect = pygame.Rect(x, y, Player.WIDTH, Player.HEIGHT)
         self.floor = floor_index
         self.direction = 1  # 1 = facing right; -1 = facing left
+        # The elevator car the player has called or is riding, and their ride in it.
+        self.car = None
+        self.ride = None
+
+    @property
+    def riding(self):
+        return self.car is not None and self.ride in self.car.riders
 
     def update(self, keys):
+        # Stay put while waiting for or riding an elevator.
+        if self.car is not None:
+            return
         # Move left/right
         if keys[pygame.K_LEFT]:
             self.rect.x -= Player.SPEED
@@ -78,55 +92,84 @@ class Player:
         if self.rect.right > SCREEN_WIDTH:
             self.rect.right = SCREEN_WIDTH
 
-    def try_descend(self):
+    def try_descend(self, elevators, now):
         """
-        If the player is overlapping any door on the current floor,
-        and there is a lower floor, move the player to the lower floor.
+        If the player is overlapping any door on the current floor, call its elevator
+        to take the player down a floor. Once called, each press rides a floor further.
         """
-        global document_collected
-        if self.floor < len(floors) - 1:
-            for door in floors[self.floor]["doors"]:
-                if self.rect.colliderect(door):
-                    # Descend to the next floor.
-                    self.floor += 1
-                    # Update the vertical position so that the player's feet
-                    # are near the floor line (we center vertically relative to floor).
-                    self.rect.y = floors[self.floor]["y"] - self.rect.height // 2
-                    break
-
-    def draw(self, surface):
-        pygame.draw.rect(surface, YELLOW, self.rect)
+        if self.car is not None:
+            if self.ride[1] < self.car.bottom:
+                self.ride[1] += 1
+                if self.riding:
+                    elevators.call(self.car, self.ride[1], now)
+            return
+        shaft = building.shaft_at(self.floor, self.rect)
+        if shaft is None:
+            return
+        # Wait in front of the door.
+        self.rect.centerx = building.shafts[shaft][0] + DOOR_WIDTH // 2
+        self.car = elevators.cars[shaft]
+        self.ride = elevators.request(self.car, self, self.floor, self.floor + 1, now)
+
+    def leave_elevator(self):
+        self.floor = self.car.floor
+        # Update the vertical position so that the player's feet
+        # are near the floor line (we center vertically relative to floor).
+        self.rect.y = building.floor_y(self.floor) - self.rect.height // 2
+        self.car = None
+        self.ride = None
+
+    def draw(self, surface, camera):
+        rect = camera.apply(self.rect)
+        pygame.draw.rect(surface, YELLOW, rect)
         # Optional: Draw a simple "gun" to indicate facing.
-        gun_tip = (self.rect.centerx + self.direction * 10, self.rect.centery)
+        gun_tip = (rect.centerx + self.direction * 10, rect.centery)
         pygame.draw.circle(surface, RED, gun_tip, 4)
 
 
 class Bullet:
+    __slots__ = ("rect", "direction", "floor", "alive")
+
     WIDTH = 6
     HEIGHT = 4
     SPEED = 10
 
     def __init__(self, x, y, direction, floor):
         self.rect = pygame.Rect(x, y, Bullet.WIDTH, Bullet.HEIGHT)
+        self.reset(x, y, direction, floor)
+
+    def reset(self, x, y, direction, floor):
+        # Also called when a pooled bullet is fired again.
+        self.rect.topleft = (x, y)
         self.direction = direction
         self.floor = floor
+        self.alive = True
 
     def update(self):
         self.rect.x += self.direction * Bullet.SPEED
 
-    def draw(self, surface):
-        pygame.draw.rect(surface, CYAN, self.rect)
+    def sprite(self, camera):
+        """The bullet's image and where to blit it."""
+        return sprites.rect(self.rect.size, CYAN), camera.apply(self.rect)
 
 
 class Enemy:
+    __slots__ = ("rect", "floor", "direction", "alive")
+
     WIDTH = 30
     HEIGHT = 40
     SPEED = 2
 
     def __init__(self, x, y, floor):
         self.rect = pygame.Rect(x, y, Enemy.WIDTH, Enemy.HEIGHT)
+        self.reset(x, y, floor)
+
+    def reset(self, x, y, floor):
+        # Also called when a pooled enemy is spawned again.
+        self.rect.topleft = (x, y)
         self.floor = floor
         self.direction = random.choice([-1, 1])
+        self.alive = True
 
     def update(self):
         self.rect.x += self.direction * Enemy.SPEED
@@ -134,37 +177,79 @@ class Enemy:
         if self.rect.left < 0 or self.rect.right > SCREEN_WIDTH:
             self.direction *= -1
 
-    def draw(self, surface):
-        pygame.draw.rect(surface, RED, self.rect)
+    def sprite(self, camera):
+        """The enemy's image and where to blit it."""
+        return sprites.rect(self.rect.size, RED), camera.apply(self.rect)
+
+
+class Camera:
+    """Scrolls vertically to keep the player's floor in view."""
+
+    def __init__(self, floor):
+        # World y of the top of the screen.
+        self.y = float(self.target(floor))
+
+    def target(self, floor):
+        # Centre the floor on the screen, without showing past the top or bottom.
+        y = building.floor_y(floor) - SCREEN_HEIGHT // 2
+        return max(0, min(y, building.rect.height - SCREEN_HEIGHT))
+
+    def update(self, floor):
+        self.y += (self.target(floor) - self.y) * CAMERA_EASE
+
+    def apply(self, rect):
+        """Returns rect moved from world to screen coordinates."""
+        return rect.move(0, -round(self.y))
+
+    def visible_floors(self):
+        return building.floors_between(self.y, self.y + SCREEN_HEIGHT)
 
 
 # ----- Utility Functions -----
-def draw_floors(surface):
-    # Draw horizontal floor lines and doors.
-    for floor in floors:
-        y = floor["y"]
+def draw_floors(surface, camera):
+    # Draw horizontal floor lines and doors, for the floors in view only.
+    for floor in camera.visible_floors():
+        y = building.floor_y(floor) - round(camera.y)
         # Draw the floor line.
         pygame.draw.line(surface, WHITE, (0, y), (SCREEN_WIDTH, y), 2)
         # Draw each door.
-        for door in floor["doors"]:
-            pygame.draw.rect(surface, BLUE, door, 2)
+        for door in building.doors[floor]:
+            pygame.draw.rect(surface, BLUE, camera.apply(door), 2)
+        if floor == building.exit[0]:
+            pygame.draw.rect(surface, BLUE, camera.apply(building.exit[1]), 2)
+
+
+def draw_elevators(surface, camera, elevators, now):
+    # Draw the shafts passing the floors in view, and their cars.
+    shafts = set()
+    for floor in camera.visible_floors():
+        shafts.update(building.floor_shafts[floor])
+    for shaft in shafts:
+        x, top, bottom = building.shafts[shaft]
+        top_y = max(0, camera.apply(building.shaft_door(shaft, top)).top)
+        bottom_y = min(
+            SCREEN_HEIGHT, camera.apply(building.shaft_door(shaft, bottom)).bottom
+        )
+        for rail_x in (x, x + DOOR_WIDTH):
+            pygame.draw.line(surface, GREY, (rail_x, top_y), (rail_x, bottom_y))
+        car = elevators.cars[shaft]
+        rect = camera.apply(building.shaft_door(shaft, car.position(now)))
+        # Closed cars are solid; open ones show their inside.
+        pygame.draw.rect(surface, GREY, rect, 2 if car.state == OPEN else 0)
 
 
-def draw_document(surface):
-    if not document_collected:
-        pygame.draw.rect(surface, GREEN, document_rect)
+def draw_document(surface, camera):
+    if not document_collected and building.document is not None:
+        pygame.draw.rect(surface, GREEN, camera.apply(building.document[1]))
 
 
-def draw_text(surface, text, size, color, center):
-    font = pygame.font.SysFont(None, size)
-    text_surface = font.render(text, True, color)
-    rect = text_surface.get_rect(center=center)
-    surface.blit(text_surface, rect)
+def draw_text(surface, string, size, color, center):
+    text.draw(surface, string, size, color, center=center)
 
 
 # ----- Game Over / Win Screens -----
 def show_end_screen(message):
-    while True:
+    def draw():
         screen.fill(BLACK)
         draw_text(
             screen, message, 64, WHITE, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 30)
@@ -176,144 +261,234 @@ def show_end_screen(message):
             WHITE,
             (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 30),
         )
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    return  # restart the game
-                elif event.key == pygame.K_q:
-                    pygame.quit()
-                    sys.exit()
-        clock.tick(15)
 
+    if idle(draw, (pygame.K_r, pygame.K_q)) != pygame.K_r:
+        pygame.quit()
+        sys.exit()
 
-# ----- Main Game Function -----
-def run_game():
-    global document_collected
-    # Initialize player on the top floor (floor 0) at roughly center.
-    player = Player(SCREEN_WIDTH // 2, floors[0]["y"] - Player.HEIGHT // 2, 0)
-    bullets = []
-    enemies = []
-    enemy_spawn_timer = 0
-    document_collected = False
-
-    running = True
-    while running:
-        clock.tick(FPS)
-        keys = pygame.key.get_pressed()
 
+# ----- Main Game Class -----
+class ElevatorGame(Game):
+    def __init__(self):
+        global document_collected
+        # Initialize player at the building's start, on the top floor unless it says otherwise.
+        start_floor, start_x = building.player_start
+        self.player = Player(
+            start_x, building.floor_y(start_floor) - Player.HEIGHT // 2, start_floor
+        )
+        self.camera = Camera(start_floor)
+        # Bullets and enemies left over from the last game go back to their pools.
+        entities.clear()
+        entities.bounds = building.rect
+        # One car per shaft, starting at its top floor.
+        self.elevators = ElevatorScheduler(
+            [
+                Car(index, top, bottom)
+                for index, (_, top, bottom) in enumerate(building.shafts)
+            ]
+        )
+        self.elevators.on_exit = self.on_exit
+        self.elevators.on_arrive = self.on_arrive
+        # Game time in seconds, which the elevators run on.
+        self.now = 0.0
+        self.enemy_spawn_timer = 0
+        # Buildings without a document only need the exit to be reached.
+        document_collected = building.document is None
+        self.show_stats = False
+        # The message to end the game with, once it is over.
+        self.result = None
+
+    def on_exit(self, car, rider, now):
+        player = self.player
+        if rider is player:
+            player.leave_elevator()
+        elif car.floor == player.floor:
+            # Enemies getting out anywhere else are off the active floor.
+            door = building.shaft_door(car.index, car.floor)
+            spawn_x = door.centerx - Enemy.WIDTH // 2
+            spawn_y = building.floor_y(car.floor) - Enemy.HEIGHT // 2
+            entities.spawn_enemy(spawn_x, spawn_y, car.floor)
+
+    def on_arrive(self, car, now):
+        if car.floor != self.player.floor:
+            return
+        door = building.shaft_door(car.index, car.floor)
+        for enemy in list(entities.touching(car.floor, door)):
+            if random.random() < ENEMY_BOARD_CHANCE:
+                entities.despawn_enemy(enemy)
+                destination = random.choice(
+                    [f for f in range(car.top, car.bottom + 1) if f != car.floor]
+                )
+                self.elevators.request(car, ENEMY_RIDER, car.floor, destination, now)
+
+    def snapshot(self):
+        player = self.player
+        return (
+            self.now,
+            tuple(player.rect),
+            player.floor,
+            player.car is not None and player.car.index,
+            document_collected,
+            [(tuple(e.rect), e.floor) for e in entities.enemies],
+            [(tuple(b.rect), b.floor) for b in entities.bullets],
+            [(car.state, car.floor, car.target) for car in self.elevators.cars],
+        )
+
+    def input(self, events):
+        player = self.player
         # ----- Event Handling -----
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             # Shooting a bullet.
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
+                if event.key == pygame.K_SPACE and not player.riding:
                     # Create a bullet from the player’s center.
                     bullet_x = player.rect.centerx
                     bullet_y = player.rect.centery
-                    bullets.append(
-                        Bullet(bullet_x, bullet_y, player.direction, player.floor)
-                    )
+                    entities.fire(bullet_x, bullet_y, player.direction, player.floor)
                 # Try to descend when DOWN is pressed.
                 if event.key == pygame.K_DOWN:
-                    player.try_descend()
+                    player.try_descend(self.elevators, self.now)
+                # Toggle the entity counts.
+                if event.key == pygame.K_F3:
+                    self.show_stats = not self.show_stats
+
+    def update(self, dt):
+        global document_collected
+        player = self.player
+        self.now += dt
+        keys = pygame.key.get_pressed()
 
         # ----- Update Game Objects -----
         player.update(keys)
-
-        # Update bullets.
-        for bullet in bullets:
-            bullet.update()
-        # Remove bullets that have left the screen.
-        bullets = [b for b in bullets if 0 <= b.rect.x <= SCREEN_WIDTH]
+        # Move the elevators; only the cars with an arrival or departure due do anything.
+        self.elevators.advance(self.now)
+        if player.riding:
+            position = player.car.position(self.now)
+            player.rect.y = building.floor_y(position) - Player.HEIGHT // 2
 
         # Spawn an enemy on the same floor as the player every few seconds.
-        enemy_spawn_timer += 1
-        if enemy_spawn_timer >= FPS * 3:  # every 3 seconds
-            enemy_spawn_timer = 0
-            # Choose a spawn x position near one of the doors on the player's floor, if any.
-            door_list = floors[player.floor]["doors"]
-            if door_list:
-                door = random.choice(door_list)
-                spawn_x = door.x + door.width // 2 - Enemy.WIDTH // 2
-                spawn_y = floors[player.floor]["y"] - Enemy.HEIGHT // 2
-                enemies.append(Enemy(spawn_x, spawn_y, player.floor))
-            else:
-                # Otherwise, spawn somewhere randomly.
-                spawn_x = random.randint(0, SCREEN_WIDTH - Enemy.WIDTH)
-                spawn_y = floors[player.floor]["y"] - Enemy.HEIGHT // 2
-                enemies.append(Enemy(spawn_x, spawn_y, player.floor))
-
-        # Update enemies.
-        for enemy in enemies:
-            # Only update enemies on the same floor as the player.
-            if enemy.floor == player.floor:
-                enemy.update()
+        self.enemy_spawn_timer += 1
+        if self.enemy_spawn_timer >= FPS * 3:  # every 3 seconds
+            self.enemy_spawn_timer = 0
+            self.spawn_enemy()
+
+        # Move bullets and the enemies on the player's floor. Everything on the floors
+        # the player has left, and bullets that have left the screen, is despawned.
+        entities.update((player.floor,))
 
         # Check bullet/enemy collisions.
-        for bullet in bullets[:]:
-            for enemy in enemies[:]:
-                if bullet.floor == enemy.floor and bullet.rect.colliderect(enemy.rect):
-                    bullets.remove(bullet)
-                    enemies.remove(enemy)
-                    break
-
-        # Check enemy/player collisions (only if on the same floor).
-        for enemy in enemies:
-            if enemy.floor == player.floor and player.rect.colliderect(enemy.rect):
-                show_end_screen("GAME OVER!")
+        with profiler.section("collision"):
+            entities.collide()
+
+        # Check enemy/player collisions (only if on the same floor, and not in a car).
+        if not player.riding:
+            for enemy in entities.touching(player.floor, player.rect):
+                self.result = "GAME OVER!"
+                self.running = False
                 return
 
         # Check document collection.
-        if (
-            (not document_collected)
-            and player.floor == 1
-            and player.rect.colliderect(document_rect)
-        ):
+        if (not document_collected) and building.at_document(player.floor, player.rect):
             document_collected = True
 
         # Check win condition:
-        # If the player is on floor 2 (the exit floor), inside the exit door,
+        # If the player is on the exit floor, inside the exit door,
         # and has already collected the document, then the player wins.
-        if player.floor == 2:
-            for door in floors[2]["doors"]:
-                if player.rect.colliderect(door) and document_collected:
-                    show_end_screen("YOU WIN!")
-                    return
+        if document_collected and building.at_exit(player.floor, player.rect):
+            self.result = "YOU WIN!"
+            self.running = False
+            return
 
+        self.camera.update(
+            player.car.position(self.now) if player.riding else player.floor
+        )
+
+    def spawn_enemy(self):
+        player = self.player
+        # Send one up or down in an elevator serving the player's floor, if any, or
+        # choose a spawn x position near one of the doors on the player's floor.
+        shafts = building.floor_shafts[player.floor]
+        door_list = building.doors[player.floor]
+        if shafts and random.random() < ENEMY_RIDE_CHANCE:
+            car = self.elevators.cars[random.choice(shafts)]
+            origin = random.choice(
+                [f for f in range(car.top, car.bottom + 1) if f != player.floor]
+            )
+            self.elevators.request(car, ENEMY_RIDER, origin, player.floor, self.now)
+        elif door_list:
+            door = random.choice(door_list)
+            spawn_x = door.x + door.width // 2 - Enemy.WIDTH // 2
+            spawn_y = building.floor_y(player.floor) - Enemy.HEIGHT // 2
+            entities.spawn_enemy(spawn_x, spawn_y, player.floor)
+        else:
+            # Otherwise, spawn somewhere randomly.
+            spawn_x = random.randint(0, SCREEN_WIDTH - Enemy.WIDTH)
+            spawn_y = building.floor_y(player.floor) - Enemy.HEIGHT // 2
+            entities.spawn_enemy(spawn_x, spawn_y, player.floor)
+
+    def render(self, alpha):
+        player, camera = self.player, self.camera
         # ----- Draw Everything -----
         screen.fill(BLACK)
         # Draw floors and elevator doors.
-        draw_floors(screen)
+        draw_floors(screen, camera)
+        draw_elevators(screen, camera, self.elevators, self.now)
         # Draw document if not yet collected.
-        draw_document(screen)
+        draw_document(screen, camera)
         # Draw player.
-        player.draw(screen)
-        # Draw bullets.
-        for bullet in bullets:
-            bullet.draw(screen)
-        # Draw enemies.
-        for enemy in enemies:
-            enemy.draw(screen)
+        player.draw(screen, camera)
+        # Draw bullets, then enemies, in one batch.
+        screen.blits(
+            [bullet.sprite(camera) for bullet in entities.bullets]
+            + [enemy.sprite(camera) for enemy in entities.enemies],
+            doreturn=False,
+        )
         # Optionally, display the current floor and document status.
-        status_text = f"Floor: {player.floor}    Document: {'Yes' if document_collected else 'No'}"
+        status_text = f"Floor: {player.floor}/{building.floor_count - 1}    Document: {'Yes' if document_collected else 'No'}"
         draw_text(screen, status_text, 24, WHITE, (SCREEN_WIDTH // 2, 20))
+        if self.show_stats:
+            stats_text = "    ".join(
+                f"{name}: {value}" for name, value in entities.stats().items()
+            )
+            draw_text(screen, stats_text, 20, WHITE, (SCREEN_WIDTH // 2, 40))
+            stats_text = "    ".join(
+                f"{name}: {value}" for name, value in self.elevators.stats().items()
+            )
+            draw_text(screen, stats_text, 20, WHITE, (SCREEN_WIDTH // 2, 60))
 
-        pygame.display.flip()
+
+def run_game():
+    game = ElevatorGame()
+    GameLoop(game, step_rate=FPS, render_rate=FPS).run()
+    show_end_screen(game.result)
 
 
 # ----- Main Loop -----
-clock = pygame.time.Clock()
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Simple Elevator Action")
+# The window, opened by setup()
+screen = None
+entities = EntityManager(
+    Enemy,
+    Bullet,
+    pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT),
+    floor_cap=FLOOR_ENEMY_CAP,
+    enemy_cap=ENEMY_CAP,
+    bullet_cap=BULLET_CAP,
+)
+
+
+def setup():
+    """Loads the building named on the command line, if any, and opens the window."""
+    global screen, building
+    if len(sys.argv) > 1:
+        building = Building.load(sys.argv[1])
+    screen = open_window((SCREEN_WIDTH, SCREEN_HEIGHT), "Simple Elevator Action")
 
 
 def main():
+    setup()
     while True:
         run_game()
 
@@ -0,0 +1,238 @@
+"""
+Elevator cars for elevator_action.py, moved by an event-driven scheduler. Between its
+arrivals and door closings a car's position is a function of the time, so nothing is
+done for a car in frames without one of those events, and the cost of a frame depends
+on how many events fall in it rather than on how many cars there are.
+
+Cars are dispatched with LOOK: a car keeps going the way it is moving while it has stops
+ahead of it, then turns round for the stops behind it, and waits idle when it has none.
+
+    python elevator_cars.py
+"""
+
+import heapq
+import random
+import time
+
+# Seconds a car takes to travel one floor, and to let riders on and off.
+FLOOR_TIME = 0.4
+DOOR_TIME = 1.0
+
+IDLE = "idle"
+MOVING = "moving"
+OPEN = "open"
+
+# Kinds of event.
+ARRIVE = 0
+CLOSE = 1
+
+
+class Car:
+    """
+    A car in a shaft serving the floors from top down to bottom. Floors are numbered
+    down the building, so a direction of 1 is downwards.
+    """
+
+    def __init__(self, index, top, bottom, floor=None):
+        self.index = index
+        self.top = top
+        self.bottom = bottom
+        self.state = IDLE
+        # The floor the car is at or last left, the time it left and where it's going.
+        self.floor = top if floor is None else floor
+        self.departed = 0.0
+        self.target = None
+        self.direction = 0
+        self.stops = set()
+        # [rider, destination] lists of the riders in the car, and by floor of those
+        # waiting for it.
+        self.riders = []
+        self.waiting = {}
+        # Bumped whenever the car's next event changes, so that stale ones are skipped.
+        self.version = 0
+
+    def position(self, now):
+        """Returns the floor the car is at at time now, fractional between floors."""
+        if self.state != MOVING:
+            return float(self.floor)
+        travelled = min(
+            (now - self.departed) / FLOOR_TIME, abs(self.target - self.floor)
+        )
+        return self.floor + self.direction * travelled
+
+
+class ElevatorScheduler:
+    """
+    Moves cars from one event to the next, kept in a heap ordered by time.
+
+    If set, on_arrive(car, now) is called when a car's doors open, after its riders
+    have got out and the waiting ones in, and on_exit(car, rider, now) for every rider
+    getting out.
+    """
+
+    def __init__(self, cars):
+        self.cars = cars
+        # (time, sequence, version, car index, kind) tuples.
+        self.events = []
+        self.sequence = 0
+        self.on_arrive = None
+        self.on_exit = None
+        # Number of events handled so far.
+        self.handled = 0
+
+    def request(self, car, rider, origin, destination, now):
+        """
+        Sends car to pick rider up at origin and take them to destination. Returns the
+        [rider, destination] entry, whose destination may be changed until the rider
+        boards; after that, the new destination has to be called too.
+        """
+        entry = [rider, destination]
+        if car.state == OPEN and car.floor == origin:
+            self._board(car, entry, now)
+        else:
+            car.waiting.setdefault(origin, []).append(entry)
+            self.call(car, origin, now)
+        return entry
+
+    def call(self, car, floor, now):
+        """Adds a stop at floor to car's stops."""
+        if not car.top <= floor <= car.bottom:
+            raise ValueError(f"floor {floor} is outside car {car.index}'s shaft")
+        if floor == car.floor and car.state != MOVING:
+            if car.state == IDLE:
+                # Already there: open the doors.
+                car.target = floor
+                self._arrive(car, now)
+            return
+        car.stops.add(floor)
+        if car.state == IDLE:
+            self._dispatch(car, now)
+        elif car.state == MOVING:
+            # A stop between the car and its target is served on the way.
+            ahead = (floor - car.position(now)) * car.direction
+            if ahead > 0 and (car.target - floor) * car.direction > 0:
+                self._set_target(car, floor)
+
+    def advance(self, now):
+        """Handles every event due by now, each at the time it fell due."""
+        events = self.events
+        while events and events[0][0] <= now:
+            when, _, version, index, kind = heapq.heappop(events)
+            car = self.cars[index]
+            if version != car.version:
+                continue
+            self.handled += 1
+            if kind == ARRIVE:
+                self._arrive(car, when)
+            else:
+                self._dispatch(car, when)
+
+    def _push(self, car, when, kind):
+        car.version += 1
+        self.sequence += 1
+        heapq.heappush(self.events, (when, self.sequence, car.version, car.index, kind))
+
+    def _set_target(self, car, floor):
+        car.target = floor
+        self._push(car, car.departed + abs(floor - car.floor) * FLOOR_TIME, ARRIVE)
+
+    def _dispatch(self, car, now):
+        car.stops.discard(car.floor)
+        if not car.stops:
+            car.state = IDLE
+            car.direction = 0
+            car.target = None
+            car.version += 1
+            return
+        ahead = [
+            floor for floor in car.stops if (floor - car.floor) * car.direction > 0
+        ]
+        if not ahead:
+            # Nothing left this way, or the car was idle: head for the nearest stop.
+            nearest = min(car.stops, key=lambda floor: abs(floor - car.floor))
+            car.direction = 1 if nearest > car.floor else -1
+            ahead = [
+                floor for floor in car.stops if (floor - car.floor) * car.direction > 0
+            ]
+        car.state = MOVING
+        car.departed = now
+        self._set_target(car, min(ahead, key=lambda floor: abs(floor - car.floor)))
+
+    def _arrive(self, car, now):
+        car.floor = car.target
+        car.target = None
+        car.state = OPEN
+        car.stops.discard(car.floor)
+        staying = []
+        for entry in car.riders:
+            if entry[1] == car.floor:
+                if self.on_exit is not None:
+                    self.on_exit(car, entry[0], now)
+            else:
+                staying.append(entry)
+        car.riders = staying
+        for entry in car.waiting.pop(car.floor, ()):
+            self._board(car, entry, now)
+        if self.on_arrive is not None:
+            self.on_arrive(car, now)
+        self._push(car, now + DOOR_TIME, CLOSE)
+
+    def _board(self, car, entry, now):
+        car.riders.append(entry)
+        self.call(car, entry[1], now)
+
+    def stats(self):
+        states = {IDLE: 0, MOVING: 0, OPEN: 0}
+        for car in self.cars:
+            states[car.state] += 1
+        return {
+            "cars": len(self.cars),
+            **states,
+            "queued_events": len(self.events),
+            "handled_events": self.handled,
+        }
+
+
+def benchmark(car_counts=(10, 100, 1000), floors=400, seconds=600, fps=60, seed=0):
+    """
+    Simulates seconds of a floors-tall building at fps with each of car_counts cars,
+    every car getting a rider every 20 seconds on average, and times how long
+    requesting rides and advancing the scheduler takes per frame.
+    """
+    results = {}
+    for count in car_counts:
+        rng = random.Random(seed)
+        cars = []
+        for index in range(count):
+            top = rng.randrange(floors - 1)
+            cars.append(Car(index, top, min(floors - 1, top + rng.randint(5, 60))))
+        scheduler = ElevatorScheduler(cars)
+        rate = count / 20
+        next_ride = rng.expovariate(rate)
+        frame_times = []
+        for frame in range(seconds * fps):
+            now = frame / fps
+            start = time.perf_counter()
+            while next_ride <= now:
+                car = rng.choice(cars)
+                origin, destination = rng.sample(range(car.top, car.bottom + 1), 2)
+                scheduler.request(car, None, origin, destination, now)
+                next_ride += rng.expovariate(rate)
+            scheduler.advance(now)
+            frame_times.append(time.perf_counter() - start)
+        frame_times.sort()
+        results[count] = {
+            "mean_us": sum(frame_times) / len(frame_times) * 1e6,
+            "p99_us": frame_times[int(len(frame_times) * 0.99)] * 1e6,
+            "events_per_frame": scheduler.handled / len(frame_times),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for count, result in benchmark().items():
+        print(
+            f"{count} cars: {result['mean_us']:.1f} us/frame mean,"
+            f" {result['p99_us']:.1f} us p99,"
+            f" {result['events_per_frame']:.2f} events/frame"
+        )
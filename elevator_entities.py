@@ -0,0 +1,275 @@
+"""
+Entity storage for elevator_action.py: entities grouped by floor, each floor's list kept
+sorted by the left edge of their rects, so collisions between two kinds of entity are a
+one-dimensional sweep along x instead of a test of every pair. EntityManager owns the
+bullets and enemies of a game, recycling them through pools and keeping their number
+bounded however long the game runs.
+"""
+
+import bisect
+
+
+def _left(entity):
+    return entity.rect.left
+
+
+class FloorBuckets:
+    """
+    Entities with `rect`, `floor` and `alive` attributes, grouped by floor.
+
+    remove() only marks an entity dead; compact() drops the dead entities and restores
+    the x order of every floor in one pass, and should run once a frame after the
+    entities have moved. Between compactions, the buckets may hold dead entities and be
+    slightly out of order, so callers skip entities that aren't alive.
+    """
+
+    def __init__(self):
+        self.floors = {}
+        # The widest rect added so far, which bounds how far left of a point an entity
+        # overlapping it can start.
+        self.widest = 0
+
+    def add(self, entity):
+        entity.alive = True
+        self.floors.setdefault(entity.floor, []).append(entity)
+        self.widest = max(self.widest, entity.rect.width)
+
+    def remove(self, entity):
+        entity.alive = False
+
+    def on_floor(self, floor):
+        return self.floors.get(floor, ())
+
+    def __iter__(self):
+        for bucket in self.floors.values():
+            for entity in bucket:
+                if entity.alive:
+                    yield entity
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.floors.values())
+
+    def compact(self):
+        """Drops the dead entities and sorts every floor again; returns the dropped."""
+        dropped = []
+        for floor, bucket in list(self.floors.items()):
+            live = []
+            for entity in bucket:
+                (live if entity.alive else dropped).append(entity)
+            if not live:
+                del self.floors[floor]
+                continue
+            # Entities only move a little each frame, so the list is nearly sorted
+            # already and this takes close to linear time.
+            live.sort(key=_left)
+            self.floors[floor] = live
+        return dropped
+
+    def overlapping(self, floor, rect):
+        """Yields the live entities on floor whose rects overlap rect."""
+        bucket = self.floors.get(floor, ())
+        start = bisect.bisect_right(bucket, rect.left - self.widest, key=_left)
+        end = bisect.bisect_left(bucket, rect.right, key=_left)
+        for entity in bucket[start:end]:
+            if entity.alive and entity.rect.colliderect(rect):
+                yield entity
+
+
+def sweep(first, second):
+    """
+    Yields the (a, b) pairs of live entities, a from first and b from second, whose
+    rects overlap. Both lists must be sorted by left edge. Entities the caller kills
+    while handling a pair are left out of later pairs.
+    """
+    active_first = []
+    active_second = []
+    i = j = 0
+    while i < len(first) or j < len(second):
+        if j == len(second) or (i < len(first) and _left(first[i]) <= _left(second[j])):
+            a = first[i]
+            i += 1
+            if not a.alive:
+                continue
+            # Entities ending before this one starts can't overlap it or any after it.
+            active_second = [
+                b for b in active_second if b.alive and b.rect.right > a.rect.left
+            ]
+            for b in active_second:
+                if b.alive and a.rect.colliderect(b.rect):
+                    yield a, b
+                    if not a.alive:
+                        break
+            else:
+                active_first.append(a)
+        else:
+            b = second[j]
+            j += 1
+            if not b.alive:
+                continue
+            active_first = [
+                a for a in active_first if a.alive and a.rect.right > b.rect.left
+            ]
+            for a in active_first:
+                if a.alive and a.rect.colliderect(b.rect):
+                    yield a, b
+                    if not b.alive:
+                        break
+            else:
+                active_second.append(b)
+
+
+class Pool:
+    """
+    Released objects kept for reuse, up to limit of them. acquire() re-initialises one
+    with its reset(*args) method, or makes a new one with factory(*args) if none is free.
+    """
+
+    def __init__(self, factory, limit):
+        self.factory = factory
+        self.limit = limit
+        self.free = []
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
+            return obj
+        return self.factory(*args)
+
+    def release(self, obj):
+        if len(self.free) < self.limit:
+            self.free.append(obj)
+
+
+class EntityManager:
+    """
+    Spawns, moves and despawns the bullets and enemies of a game.
+
+    Spawns beyond the caps (enemies per floor, enemies in total and bullets in total)
+    are refused, and every frame update() despawns whatever is outside the active floors
+    or has left bounds, so the number of live entities, and with it the memory and the
+    time a frame takes, stays bounded for as long as the game runs. Despawned entities
+    go back to their pool and are reused by later spawns.
+    """
+
+    def __init__(
+        self, enemy_factory, bullet_factory, bounds, floor_cap, enemy_cap, bullet_cap
+    ):
+        self.bounds = bounds
+        self.floor_cap = floor_cap
+        self.enemy_cap = enemy_cap
+        self.bullet_cap = bullet_cap
+        self.enemy_pool = Pool(enemy_factory, enemy_cap)
+        self.bullet_pool = Pool(bullet_factory, bullet_cap)
+        self.enemies = FloorBuckets()
+        self.bullets = FloorBuckets()
+        # Live enemies by floor; floors without any are left out.
+        self.floor_counts = {}
+        self.enemy_count = 0
+        self.bullet_count = 0
+        # Totals since the manager was made.
+        self.spawned = 0
+        self.despawned = 0
+        self.refused = 0
+
+    def spawn_enemy(self, x, y, floor):
+        """Returns the new enemy, or None if a cap has been reached."""
+        floor_count = self.floor_counts.get(floor, 0)
+        if self.enemy_count >= self.enemy_cap or floor_count >= self.floor_cap:
+            self.refused += 1
+            return None
+        enemy = self.enemy_pool.acquire(x, y, floor)
+        self.enemies.add(enemy)
+        self.floor_counts[floor] = floor_count + 1
+        self.enemy_count += 1
+        self.spawned += 1
+        return enemy
+
+    def fire(self, x, y, direction, floor):
+        """Returns the new bullet, or None if the bullet cap has been reached."""
+        if self.bullet_count >= self.bullet_cap:
+            self.refused += 1
+            return None
+        bullet = self.bullet_pool.acquire(x, y, direction, floor)
+        self.bullets.add(bullet)
+        self.bullet_count += 1
+        self.spawned += 1
+        return bullet
+
+    def despawn_enemy(self, enemy):
+        if not enemy.alive:
+            return
+        self.enemies.remove(enemy)
+        self.floor_counts[enemy.floor] -= 1
+        if not self.floor_counts[enemy.floor]:
+            del self.floor_counts[enemy.floor]
+        self.enemy_count -= 1
+        self.despawned += 1
+
+    def despawn_bullet(self, bullet):
+        if not bullet.alive:
+            return
+        self.bullets.remove(bullet)
+        self.bullet_count -= 1
+        self.despawned += 1
+
+    def update(self, active_floors):
+        """
+        Moves the bullets and the enemies on active_floors, then despawns the entities
+        on other floors and those that have left bounds.
+        """
+        for floor, bucket in list(self.enemies.floors.items()):
+            active = floor in active_floors
+            for enemy in bucket:
+                if not enemy.alive:
+                    continue
+                if active:
+                    enemy.update()
+                if not active or not self.bounds.colliderect(enemy.rect):
+                    self.despawn_enemy(enemy)
+        for bullet in self.bullets:
+            bullet.update()
+            if bullet.floor not in active_floors or not self.bounds.colliderect(
+                bullet.rect
+            ):
+                self.despawn_bullet(bullet)
+        self.compact()
+
+    def compact(self):
+        for enemy in self.enemies.compact():
+            self.enemy_pool.release(enemy)
+        for bullet in self.bullets.compact():
+            self.bullet_pool.release(bullet)
+
+    def collide(self):
+        """Despawns every bullet that hits an enemy along with the enemy it hits."""
+        hits = 0
+        for floor, bullets in self.bullets.floors.items():
+            for bullet, enemy in sweep(bullets, self.enemies.on_floor(floor)):
+                self.despawn_bullet(bullet)
+                self.despawn_enemy(enemy)
+                hits += 1
+        return hits
+
+    def touching(self, floor, rect):
+        """Yields the enemies on floor overlapping rect."""
+        return self.enemies.overlapping(floor, rect)
+
+    def clear(self):
+        """Despawns everything, as when a new game starts."""
+        for enemy in list(self.enemies):
+            self.despawn_enemy(enemy)
+        for bullet in list(self.bullets):
+            self.despawn_bullet(bullet)
+        self.compact()
+
+    def stats(self):
+        return {
+            "enemies": self.enemy_count,
+            "bullets": self.bullet_count,
+            "floors": len(self.floor_counts),
+            "pooled": len(self.enemy_pool.free) + len(self.bullet_pool.free),
+            "spawned": self.spawned,
+            "despawned": self.despawned,
+            "refused": self.refused,
+        }
@@ -0,0 +1,220 @@
+"""
+Buildings for elevator_action.py. A building is a text layout with one line per floor,
+top floor first, in which every character is a COLUMN_WIDTH pixel wide column:
+
+    '.' - empty
+    'D' - elevator door down to the next floor, starting at this column
+    'E' - exit door, starting at this column
+    '$' - the secret document
+    'P' - player start (the middle of the top floor if there is none)
+
+Doors in the same column on consecutive floors open onto the same elevator shaft, which
+reaches down to the floor below its lowest door.
+
+Building indexes the layout so the floors in view, the door in front of the player and
+the document and exit checks are found directly, however tall the building is.
+
+    python elevator_level.py 300 tower.txt
+    python elevator_action.py tower.txt
+"""
+
+import bisect
+import random
+import sys
+
+import pygame
+
+COLUMN_WIDTH = 25
+# Distance between floor lines, and the y of the top floor's line.
+FLOOR_HEIGHT = 200
+TOP_FLOOR_Y = 100
+DOOR_WIDTH = 50
+DOOR_HEIGHT = 80
+DOCUMENT_SIZE = 30
+
+
+class Building:
+    def __init__(self, layout):
+        self.layout = layout
+        self.columns = max(len(row) for row in layout)
+        # For every floor, its door rects sorted by x and their left edges, for bisect.
+        self.doors = []
+        self.door_lefts = []
+        # [x, top floor, bottom floor] of every shaft; for every floor, the shaft behind
+        # each of its doors (None for doors on the bottom floor) and the shafts passing it.
+        self.shafts = []
+        self.door_shafts = []
+        self.floor_shafts = []
+        # (floor, rect) of the exit door and the document.
+        self.exit = None
+        self.document = None
+        # (floor, x) the player starts at.
+        self.player_start = None
+        self.parse_layout()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            layout = [line.rstrip("\n") for line in file]
+        # Blank lines and lines starting with '#' are comments.
+        return cls([row for row in layout if row.strip() and not row.startswith("#")])
+
+    def parse_layout(self):
+        for floor, row in enumerate(self.layout):
+            y = self.floor_y(floor)
+            doors = []
+            for column, char in enumerate(row):
+                x = column * COLUMN_WIDTH
+                if char == "D":
+                    doors.append(
+                        pygame.Rect(x, y - DOOR_HEIGHT // 2, DOOR_WIDTH, DOOR_HEIGHT)
+                    )
+                elif char == "E":
+                    self.exit = (
+                        floor,
+                        pygame.Rect(x, y - DOOR_HEIGHT // 2, DOOR_WIDTH, DOOR_HEIGHT),
+                    )
+                elif char == "$":
+                    self.document = (
+                        floor,
+                        pygame.Rect(
+                            x, y - DOCUMENT_SIZE // 2, DOCUMENT_SIZE, DOCUMENT_SIZE
+                        ),
+                    )
+                elif char == "P":
+                    self.player_start = (floor, x)
+                elif char != ".":
+                    raise ValueError(
+                        f"floor {floor}: unknown character {char!r} in building layout"
+                    )
+            self.doors.append(doors)
+            self.door_lefts.append([door.left for door in doors])
+        if self.exit is None:
+            raise ValueError("building layout has no exit door")
+        self.index_shafts()
+        if self.player_start is None:
+            self.player_start = (0, self.columns * COLUMN_WIDTH // 2)
+
+    def index_shafts(self):
+        above = {}
+        for floor, doors in enumerate(self.doors):
+            shafts = {}
+            for door in doors:
+                shaft = above.get(door.left)
+                if floor == self.floor_count - 1:
+                    shaft = None
+                elif shaft is None:
+                    shaft = len(self.shafts)
+                    self.shafts.append([door.left, floor, floor + 1])
+                else:
+                    self.shafts[shaft][2] = floor + 1
+                shafts[door.left] = shaft
+            self.door_shafts.append(list(shafts.values()))
+            above = shafts
+        self.floor_shafts = [[] for _ in self.layout]
+        for shaft, (_, top, bottom) in enumerate(self.shafts):
+            for floor in range(top, bottom + 1):
+                self.floor_shafts[floor].append(shaft)
+
+    @property
+    def floor_count(self):
+        return len(self.layout)
+
+    @property
+    def rect(self):
+        return pygame.Rect(
+            0, 0, self.columns * COLUMN_WIDTH, self.floor_count * FLOOR_HEIGHT
+        )
+
+    def floor_y(self, floor):
+        """The y of a floor's line; things on the floor stand centred on it."""
+        return TOP_FLOOR_Y + floor * FLOOR_HEIGHT
+
+    def floors_between(self, top, bottom):
+        """Returns the range of floors drawn anywhere between y = top and y = bottom."""
+        # Each floor's band reaches half a floor above and below its line.
+        offset = FLOOR_HEIGHT // 2 - TOP_FLOOR_Y
+        first = max(0, (top + offset) // FLOOR_HEIGHT)
+        last = min(self.floor_count - 1, (bottom + offset) // FLOOR_HEIGHT)
+        return range(int(first), int(last) + 1)
+
+    def shaft_at(self, floor, rect):
+        """Returns the shaft behind a door on floor that rect overlaps, or None."""
+        lefts = self.door_lefts[floor]
+        start = bisect.bisect_right(lefts, rect.left - DOOR_WIDTH)
+        end = bisect.bisect_left(lefts, rect.right)
+        for index in range(start, end):
+            if self.doors[floor][index].colliderect(rect):
+                return self.door_shafts[floor][index]
+        return None
+
+    def shaft_door(self, shaft, floor):
+        """
+        Returns the rect of a shaft's door on floor. floor may be fractional, for a car
+        between floors, and the rect's y is then rounded down to a whole pixel.
+        """
+        y = self.floor_y(floor) - DOOR_HEIGHT // 2
+        return pygame.Rect(self.shafts[shaft][0], y, DOOR_WIDTH, DOOR_HEIGHT)
+
+    def at_exit(self, floor, rect):
+        return floor == self.exit[0] and rect.colliderect(self.exit[1])
+
+    def at_document(self, floor, rect):
+        return (
+            self.document is not None
+            and floor == self.document[0]
+            and rect.colliderect(self.document[1])
+        )
+
+
+def generate_layout(floor_count, columns=32, max_shaft=20, seed=None):
+    """
+    A random building of floor_count floors: one to three doors on every floor but the
+    last, which has the exit, opening onto shafts up to max_shaft floors long, and the
+    document somewhere in the middle third.
+    """
+    rng = random.Random(seed)
+    door_columns = DOOR_WIDTH // COLUMN_WIDTH
+    # Doors at least a door's width apart.
+    slots = range(0, columns - door_columns, door_columns * 2)
+    document_floor = rng.randint(
+        floor_count // 3, max(floor_count // 3, floor_count * 2 // 3 - 1)
+    )
+    # Keys are the columns of shafts with doors on the floor being made, and values the
+    # number of floors they have doors on below it.
+    shafts = {}
+    layout = []
+    for floor in range(floor_count):
+        row = ["."] * columns
+        if floor == floor_count - 1:
+            row[rng.randrange(columns - door_columns)] = "E"
+        else:
+            wanted = rng.randint(1, 3)
+            free = [column for column in slots if column not in shafts]
+            for column in rng.sample(free, max(0, wanted - len(shafts))):
+                shafts[column] = rng.randint(0, max_shaft - 1)
+            for column, below in list(shafts.items()):
+                row[column] = "D"
+                if below:
+                    shafts[column] = below - 1
+                else:
+                    del shafts[column]
+        if floor == 0 and row[columns // 2] == ".":
+            row[columns // 2] = "P"
+        if floor == document_floor:
+            # Clear of the doors, which are two columns wide.
+            free = [
+                c
+                for c in range(1, columns - 1)
+                if row[c - 1] != "D" and row[c] == row[c + 1] == "."
+            ]
+            row[rng.choice(free)] = "$"
+        layout.append("".join(row))
+    return layout
+
+
+if __name__ == "__main__":
+    # Writes a random building: python elevator_level.py FLOORS PATH
+    count = int(sys.argv[1])
+    with open(sys.argv[2], "w") as file:
+        file.write("\n".join(generate_layout(count)) + "\n")
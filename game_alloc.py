@@ -0,0 +1,327 @@
+"""
+Opt-in allocation profiling for the pygame games, to find what feeds the garbage
+collector. Set GAME_ALLOC, or pass --alloc, and tracemalloc traces every allocation
+while the game runs. Every line of the games' own code that runs is charged with the
+memory it allocated, and at the end of every frame, the memory each source line holds is
+compared with the frame before. Every garbage collection is timed, and the line running
+when it started is kept, as that allocation set it off. When the game exits, the lines
+that allocated and grew the most and a histogram of the collections' pauses are
+printed:
+
+    python asteroids.py --alloc
+    GAME_ALLOC=frames.csv python pacman.py
+
+GAME_ALLOC=PATH (or --alloc=PATH) also writes a CSV row per frame: the bytes and blocks
+the frame left allocated, its peak above where it started, and its collections and their
+milliseconds.
+
+Objects made and freed within a frame, like most pygame.Vector2 and pygame.Rect
+temporaries, leave no growth on any line, so lines are also charged as they run: a line
+of a file beside this one is charged with the most memory held above where it started,
+calls into code elsewhere included. That counts a temporary freed before the next is
+made once, which is enough to rank the lines that churn. Growth is what matters to the
+collector, though: a collection of the youngest generation starts when the container
+objects allocated outnumber those freed by gc.get_threshold()[0]. Tracing makes the game
+many times slower, so frame times are not meaningful while it is on.
+"""
+
+import atexit
+import collections
+import csv
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+from game_options import option
+
+# Frames of traceback kept per allocation; only the innermost line is reported.
+DEPTH = 1
+# Lines listed in the report.
+TOP = 15
+# Upper bounds in milliseconds of the pause histogram's buckets; the last is unbounded.
+PAUSE_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 5, 10]
+
+# Lines of files in this directory, the games', are charged with what they allocate.
+_GAMES = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+# Allocations made by the tracker itself, which aren't the game's.
+_OWN = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def _traced(frame):
+    # Whether a function is the games' own, whose lines are charged.
+    filename = frame.f_code.co_filename
+    return filename.startswith(_GAMES) and filename != __file__
+
+
+def _made(frame):
+    # Bytes of the frame object tracing gives a function. The dict of its locals it
+    # also gets mostly comes from the interpreter's free list rather than the allocator.
+    return sys.getsizeof(frame)
+
+
+class AllocationTracker:
+    def __init__(self):
+        self.enabled = False
+        self.frame = 0
+        # "file:line" -> bytes and blocks it grew by, over all the frames it grew.
+        self.grown_bytes = collections.Counter()
+        self.grown_blocks = collections.Counter()
+        # "file:line" -> bytes charged to it as it ran, over all frames.
+        self.allocated = collections.Counter()
+        # The line running, and the memory traced when it was last charged.
+        self.line = "?"
+        self.line_start = 0
+        self.frame_peak = 0
+        # Bytes the tracer itself adds to every charge, taken off each (see _calibrate).
+        self.overhead = 0
+        # The trace functions, kept so that handing one out allocates nothing.
+        self.trace_lines = self._trace_lines
+        self.trace_returns = self._trace_returns
+        # (milliseconds, generation, frame, "file:line") of every collection.
+        self.pauses = []
+        self.peaks = []
+        # Collections set off by the tracker's own snapshots, left out of the report.
+        self.own_collections = 0
+        self.busy = False
+        self.file = None
+        self.writer = None
+
+    def enable(self, path=None):
+        """Starts tracing, writing a CSV row per frame to path if given."""
+        self.enabled = True
+        tracemalloc.start(DEPTH)
+        self.previous = tracemalloc.take_snapshot().filter_traces(_OWN)
+        self.frame_start = tracemalloc.get_traced_memory()[0]
+        self.frame_pauses = []
+        gc.callbacks.append(self._collected)
+        self._calibrate()
+        if path:
+            self.file = open(path, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(
+                ["frame", "bytes", "blocks", "peak_bytes", "collections", "gc_ms"]
+            )
+        atexit.register(self.close)
+
+    def _calibrate(self):
+        # Line events with nothing run between them measure what the tracer allocates
+        # itself on every one.
+        here = sys._getframe()
+        self.trace_lines(here, "line", None)
+        self.allocated.clear()
+        self.trace_lines(here, "line", None)
+        self.overhead = self.allocated.total()
+        self.allocated.clear()
+        self.line = "?"
+
+    def _start_tracing(self):
+        # Lines are charged from the end of the first frame, like growth, so the games'
+        # setup isn't. The functions already running, GameLoop.run among them, are
+        # traced from here on too.
+        sys.settrace(self._trace_calls)
+        frame = sys._getframe(1)
+        while frame is not None:
+            if _traced(frame):
+                frame.f_trace = self.trace_lines
+            frame = frame.f_back
+
+    def _trace_calls(self, frame, event, arg):
+        # Called on every call. Tracing gives the function a frame object, which the
+        # calling line holds while it runs but didn't allocate.
+        self._charge(_made(frame))
+        self._restart()
+        if _traced(frame):
+            return self.trace_lines
+        # What code elsewhere allocates is charged to the games' line that called it.
+        frame.f_trace_lines = False
+        return self.trace_returns
+
+    def _trace_lines(self, frame, event, arg):
+        if event == "line":
+            self._charge()
+            self.line = f"{frame.f_code.co_filename}:{frame.f_lineno}"
+            self._restart()
+        elif event == "return":
+            # The rest of the calling line is the caller's again, if it is traced.
+            self._charge()
+            caller = frame.f_back
+            if caller is not None and caller.f_trace is self.trace_lines:
+                self.line = f"{caller.f_code.co_filename}:{caller.f_lineno}"
+            self._restart()
+        return self.trace_lines
+
+    def _trace_returns(self, frame, event, arg):
+        if event == "return":
+            self._charge()
+            self._restart()
+        return self.trace_returns
+
+    def _charge(self, made=0):
+        """Charges the line running with the most it held above where it started."""
+        peak = tracemalloc.get_traced_memory()[1]
+        grown = peak - self.line_start - self.overhead - made
+        if grown > 0:
+            self.allocated[self.line] += grown
+        self.frame_peak = max(self.frame_peak, peak)
+
+    def _restart(self):
+        # After the tracer's own allocations, which would otherwise be charged.
+        tracemalloc.reset_peak()
+        self.line_start = tracemalloc.get_traced_memory()[0]
+
+    def _collected(self, phase, info):
+        if self.busy:
+            if phase == "start":
+                self.own_collections += 1
+        elif phase == "start":
+            self.collection_start = time.perf_counter_ns()
+            try:
+                # The code that was running, whose allocation set the collection off.
+                frame = sys._getframe(1)
+                self.site = f"{frame.f_code.co_filename}:{frame.f_lineno}"
+            except ValueError:
+                self.site = "?"
+        else:
+            ms = (time.perf_counter_ns() - self.collection_start) / 1e6
+            self.frame_pauses.append(ms)
+            self.pauses.append((ms, info["generation"], self.frame, self.site))
+
+    def end_frame(self):
+        """Compares the frame's allocations with the last; GameLoop calls this."""
+        current, peak = tracemalloc.get_traced_memory()
+        # Charging lines resets the peak, so the frame's is the highest they saw.
+        peak = max(peak, self.frame_peak)
+        # The snapshots make and free thousands of objects, which count towards the next
+        # collection, so the frame is closed with the collector off, and any collection
+        # that brought due is run here, before the game's code runs again.
+        # Nor are their calls traced, which would take far longer than they do.
+        self.busy = True
+        enabled = gc.isenabled()
+        gc.disable()
+        sys.settrace(None)
+        try:
+            self._compare(peak)
+        finally:
+            if enabled:
+                gc.enable()
+                if gc.get_count()[0] > gc.get_threshold()[0]:
+                    gc.collect(0)
+            self.busy = False
+        if self.frame == 0:
+            self._start_tracing()
+        else:
+            sys.settrace(self._trace_calls)
+        self.frame += 1
+
+    def _compare(self, peak):
+        snapshot = tracemalloc.take_snapshot().filter_traces(_OWN)
+        grown_bytes = grown_blocks = 0
+        for stat in snapshot.compare_to(self.previous, "lineno"):
+            # The first frame holds everything since tracing started, like the game's
+            # setup, rather than what a frame allocates.
+            if stat.size_diff > 0 and self.frame > 0:
+                frame = stat.traceback[0]
+                site = f"{frame.filename}:{frame.lineno}"
+                self.grown_bytes[site] += stat.size_diff
+                self.grown_blocks[site] += max(stat.count_diff, 0)
+            grown_bytes += stat.size_diff
+            grown_blocks += stat.count_diff
+        self.previous = snapshot
+        if self.frame > 0:
+            self.peaks.append(peak - self.frame_start)
+        if self.writer is not None:
+            self.writer.writerow(
+                [
+                    self.frame,
+                    grown_bytes,
+                    grown_blocks,
+                    peak - self.frame_start,
+                    len(self.frame_pauses),
+                    f"{sum(self.frame_pauses):.4f}",
+                ]
+            )
+        self.frame_pauses = []
+        tracemalloc.reset_peak()
+        self.frame_start = self.frame_peak = tracemalloc.get_traced_memory()[0]
+        # The snapshots aren't the line that called end_frame's.
+        self.line_start = self.frame_start
+
+    def histogram(self):
+        """Collections by generation and pause bucket, as {generation: [counts]}."""
+        counts = {generation: [0] * (len(PAUSE_BUCKETS) + 1) for generation in range(3)}
+        for ms, generation, _, _ in self.pauses:
+            bucket = sum(ms > bound for bound in PAUSE_BUCKETS)
+            counts[generation][bucket] += 1
+        return counts
+
+    def report(self, file=sys.stderr):
+        frames = max(self.frame - 1, 1)
+        print(f"over {frames} frames, after the first, allocated by lines:", file=file)
+        print(f"  {'bytes/frame':>12}  line", file=file)
+        for site, allocated in self.allocated.most_common(TOP):
+            print(f"  {allocated / frames:12.1f}  {site}", file=file)
+        print("and still held by lines at the end of the frame:", file=file)
+        print(f"  {'bytes/frame':>12} {'blocks/frame':>12}  line", file=file)
+        for site, grown in self.grown_bytes.most_common(TOP):
+            print(
+                f"  {grown / frames:12.1f} {self.grown_blocks[site] / frames:12.2f}"
+                f"  {site}",
+                file=file,
+            )
+        if self.peaks:
+            peaks = sorted(self.peaks)
+            print(
+                f"  frame peak above its start: p50 {peaks[len(peaks) // 2]} bytes,"
+                f" max {peaks[-1]} bytes",
+                file=file,
+            )
+
+        print(
+            f"{len(self.pauses)} garbage collections"
+            f" ({self.own_collections} more set off by the tracker left out):",
+            file=file,
+        )
+        labels = [f"<={bound}" for bound in PAUSE_BUCKETS] + [f">{PAUSE_BUCKETS[-1]}"]
+        print("  gen " + "".join(f"{label + ' ms':>11}" for label in labels), file=file)
+        for generation, counts in self.histogram().items():
+            print(
+                f"  {generation:3d} " + "".join(f"{count:11d}" for count in counts),
+                file=file,
+            )
+        sites = collections.Counter()
+        for ms, _, _, site in self.pauses:
+            sites[site] += ms
+        for site, ms in sites.most_common(5):
+            print(f"  {ms:8.2f} ms of pauses set off at {site}", file=file)
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        sys.settrace(None)
+        gc.callbacks.remove(self._collected)
+        tracemalloc.stop()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.report()
+
+    def stats(self):
+        return {
+            "frames": self.frame,
+            "collections": len(self.pauses),
+            "gc_ms": sum(ms for ms, _, _, _ in self.pauses),
+            "peak_bytes": max(self.peaks, default=0),
+        }
+
+
+tracker = AllocationTracker()
+_value = option("--alloc", "GAME_ALLOC", "1")
+if _value and _value != "0":
+    tracker.enable(None if _value == "1" else _value)
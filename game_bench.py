@@ -0,0 +1,435 @@
+"""
+Headless benchmark for the pygame games. Runs each game on SDL's dummy video driver for a
+fixed number of frames, with a seeded RNG and a scripted sequence of key presses, and
+measures ticks per second, update and render time percentiles, and the peak Python memory
+allocated during the update and render phases. minecraft.py has its own benchmark in
+voxel_bench.py.
+
+    python game_bench.py --out baseline.json
+    python game_bench.py compare baseline.json
+    python game_bench.py compare baseline.json current.json --threshold 0.2
+
+`compare` runs the benchmark again (or reads the results given) and lists every figure
+that got worse than the baseline by more than the threshold, exiting with status 1 if
+there are any.
+
+    python game_bench.py entities --count 20000
+
+measures the games' entity classes instead: the bytes each instance takes with whatever
+it owns, and updates per second, as they are and rebuilt without __slots__.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Recordings are of the real keyboard, which the benchmark's scripted keys stand in
+# for, so GAME_RECORD is dropped before game_replay reads it.
+os.environ.pop("GAME_RECORD", None)
+
+import pygame
+
+from game_loop import GameLoop
+
+# Module and game class of every game; steps per second come from the module's FPS.
+GAMES = {
+    "pong": ("pong", "PongGame"),
+    "asteroids": ("asteroids", "AsteroidsGame"),
+    "tetris": ("tetris", "Game"),
+    "pacman": ("pacman", "PacmanGame"),
+    "elevator_action": ("elevator_action", "ElevatorGame"),
+}
+
+# Key presses of every game: (key, period, start, length) holds key down for length
+# frames from frame start of every period frames.
+SCRIPTS = {
+    "pong": [
+        (pygame.K_w, 120, 0, 60),
+        (pygame.K_s, 120, 60, 60),
+        (pygame.K_UP, 90, 0, 45),
+        (pygame.K_DOWN, 90, 45, 45),
+    ],
+    "asteroids": [
+        (pygame.K_LEFT, 180, 0, 40),
+        (pygame.K_RIGHT, 180, 90, 40),
+        (pygame.K_UP, 60, 0, 20),
+        (pygame.K_SPACE, 15, 0, 1),
+    ],
+    "tetris": [
+        (pygame.K_LEFT, 40, 0, 1),
+        (pygame.K_RIGHT, 40, 20, 1),
+        (pygame.K_UP, 30, 10, 1),
+        (pygame.K_SPACE, 90, 80, 1),
+    ],
+    "pacman": [
+        (pygame.K_LEFT, 40, 0, 1),
+        (pygame.K_UP, 40, 10, 1),
+        (pygame.K_RIGHT, 40, 20, 1),
+        (pygame.K_DOWN, 40, 30, 1),
+    ],
+    "elevator_action": [
+        (pygame.K_RIGHT, 200, 0, 100),
+        (pygame.K_LEFT, 200, 100, 100),
+        (pygame.K_SPACE, 30, 0, 1),
+        (pygame.K_DOWN, 120, 60, 1),
+    ],
+}
+
+# Figures compared against a baseline, and whether a higher value is better.
+COMPARED = {
+    "ticks_per_second": True,
+    "update_ms.p50": False,
+    "update_ms.p99": False,
+    "render_ms.p50": False,
+    "render_ms.p99": False,
+    "update_peak_bytes": False,
+    "render_peak_bytes": False,
+}
+# Entity classes measured by `entities`: module, class, a function making the i-th one
+# and one updating it, or None if it has no update of its own.
+ENTITIES = [
+    ("asteroids", "Spaceship", lambda cls, i: cls(), None),
+    ("asteroids", "Asteroid", lambda cls, i: cls(), lambda entity: entity.update()),
+    (
+        "asteroids",
+        "Bullet",
+        lambda cls, i: cls((i % 800, i % 600), i % 360),
+        lambda entity: entity.update(),
+    ),
+    ("tetris", "Tetromino", lambda cls, i: cls(3, 0, "IJLOSTZ"[i % 7]), None),
+    ("pacman", "Pacman", lambda cls, i: cls((36, 36)), None),
+    ("pacman", "Ghost", lambda cls, i: cls((36, 36)), None),
+    ("elevator_action", "Player", lambda cls, i: cls(i % 770, 0, 0), None),
+    (
+        "elevator_action",
+        "Bullet",
+        lambda cls, i: cls(i % 790, 0, 1, 0),
+        lambda entity: entity.update(),
+    ),
+    (
+        "elevator_action",
+        "Enemy",
+        lambda cls, i: cls(i % 770, 0, 0),
+        lambda entity: entity.update(),
+    ),
+]
+
+# Growth in peak bytes small enough to ignore whatever the threshold, since the peaks
+# are only a few hundred bytes and a single new object moves them by tens of percent.
+MEMORY_SLACK = 4096
+
+
+class ScriptedKeys:
+    """Stands in for pygame.key.get_pressed() with the keys a script holds down."""
+
+    def __init__(self, script):
+        self.script = script
+        self.held = set()
+
+    def __getitem__(self, key):
+        return key in self.held
+
+    def advance(self, frame):
+        """Moves the script on to frame, posting events for the keys that changed."""
+        held = {
+            key
+            for key, period, start, length in self.script
+            if start <= frame % period < start + length
+        }
+        for key in held - self.held:
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0))
+        for key in self.held - held:
+            pygame.event.post(pygame.event.Event(pygame.KEYUP, key=key, mod=0))
+        self.held = held
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def play(name, frames, seed, on_game=None, rate=None):
+    """
+    Plays frames frames of a game with its script, starting a new game whenever one
+    ends, as fast as possible or at rate frames per second. on_game(game) is called with
+    every game made. Returns the GameLoop and the number of games played.
+    """
+    module_name, class_name = GAMES[name]
+    module = importlib.import_module(module_name)
+    if hasattr(module, "setup"):
+        # Tetris opens its window when a Game is made; the others in setup(), which
+        # mustn't see the benchmark's own arguments.
+        argv = sys.argv
+        sys.argv = [f"{module_name}.py"]
+        try:
+            module.setup()
+        finally:
+            sys.argv = argv
+    game_class = getattr(module, class_name)
+    random.seed(seed)
+    keys = ScriptedKeys(SCRIPTS[name])
+    get_pressed = pygame.key.get_pressed
+    pygame.key.get_pressed = lambda: keys
+    try:
+
+        def new_game():
+            game = game_class()
+            if on_game is not None:
+                on_game(game)
+            return game
+
+        game = new_game()
+        # Cleared once the game is made, as Tetris only opens its window then.
+        pygame.event.clear()
+        loop = GameLoop(
+            game,
+            step_rate=getattr(module, "FPS", 60),
+            headless=True,
+            history=frames,
+        )
+        games = 1
+        while loop.frames < frames:
+            if not loop.game.running:
+                loop.game = new_game()
+                games += 1
+            keys.advance(loop.frames)
+            loop.run(frames=1)
+            if rate:
+                loop.clock.tick(rate)
+    finally:
+        pygame.key.get_pressed = get_pressed
+    return loop, games
+
+
+def measure_memory(name, frames, seed):
+    """Peak bytes allocated during any one update and any one render call."""
+    peaks = {"update": 0, "render": 0}
+
+    def traced(phase, method):
+        def call(*args):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                return method(*args)
+            finally:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                peaks[phase] = max(peaks[phase], peak)
+
+        return call
+
+    def instrument(game):
+        game.update = traced("update", game.update)
+        game.render = traced("render", game.render)
+
+    tracemalloc.start()
+    try:
+        play(name, frames, seed, instrument)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def benchmark(name, frames, seed):
+    start = time.perf_counter()
+    loop, games = play(name, frames, seed)
+    seconds = time.perf_counter() - start
+    result = {"frames": loop.frames, "games": games}
+    result["ticks_per_second"] = loop.steps / seconds
+    for phase in ("update", "render"):
+        values = [getattr(timing, phase) * 1000 for timing in loop.timings]
+        result[f"{phase}_ms"] = {
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "max": max(values),
+        }
+    # Traced separately, as tracing slows everything down.
+    for phase, peak in measure_memory(name, frames, seed).items():
+        result[f"{phase}_peak_bytes"] = peak
+    return result
+
+
+def without_slots(cls):
+    """A copy of cls keeping its attributes in a __dict__ instead of __slots__."""
+    slots = vars(cls).get("__slots__", ())
+    namespace = {
+        name: value
+        for name, value in vars(cls).items()
+        if name not in slots and name != "__slots__"
+    }
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+def measure_entities(count, rounds=20, seed=0):
+    """
+    Bytes per instance and updates per second of every class in ENTITIES, with count
+    instances, as {"module.Class": {"slots": (bytes, rate), "dict": (bytes, rate)}}.
+    rate is None for classes without an update.
+    """
+    results = {}
+    for module_name, class_name, make, update in ENTITIES:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        result = results[f"{module_name}.{class_name}"] = {}
+        for variant, variant_class in (("slots", cls), ("dict", without_slots(cls))):
+            random.seed(seed)
+            tracemalloc.start()
+            try:
+                base = tracemalloc.get_traced_memory()[0]
+                entities = [make(variant_class, i) for i in range(count)]
+                size = tracemalloc.get_traced_memory()[0] - base
+            finally:
+                tracemalloc.stop()
+            size -= sys.getsizeof(entities)
+            rate = None
+            if update is not None:
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    for entity in entities:
+                        update(entity)
+                rate = count * rounds / (time.perf_counter() - start)
+            result[variant] = (size / count, rate)
+    return results
+
+
+def run_entities(args):
+    results = measure_entities(args.count)
+    print(
+        f"{'class':28s} {'bytes':>7s} {'no slots':>9s}"
+        f" {'updates/s':>11s} {'no slots':>11s}"
+    )
+    for name, result in results.items():
+        (size, rate), (dict_size, dict_rate) = result["slots"], result["dict"]
+        rates = (
+            f"{rate:11.0f} {dict_rate:11.0f}"
+            if rate is not None
+            else f"{'-':>11s} {'-':>11s}"
+        )
+        print(f"{name:28s} {size:7.0f} {dict_size:9.0f} {rates}")
+
+
+def run(args):
+    games = {}
+    for name in args.games:
+        games[name] = benchmark(name, args.frames, args.seed)
+        result = games[name]
+        print(
+            f"{name:16s} {result['ticks_per_second']:8.0f} ticks/s,"
+            f" update p50 {result['update_ms']['p50']:.3f} ms"
+            f" p99 {result['update_ms']['p99']:.3f} ms,"
+            f" render p50 {result['render_ms']['p50']:.3f} ms"
+            f" p99 {result['render_ms']['p99']:.3f} ms,"
+            f" peak {result['update_peak_bytes']} / {result['render_peak_bytes']} bytes",
+            file=sys.stderr,
+        )
+    return {
+        "config": {
+            "frames": args.frames,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+        },
+        "games": games,
+    }
+
+
+def figure(result, path):
+    for part in path.split("."):
+        result = result[part]
+    return result
+
+
+def compare(baseline, current, threshold):
+    """Returns (game, figure, baseline value, current value) for every regression."""
+    regressions = []
+    for name, base in baseline["games"].items():
+        if name not in current["games"]:
+            continue
+        for path, higher_is_better in COMPARED.items():
+            before = figure(base, path)
+            after = figure(current["games"][name], path)
+            if higher_is_better:
+                worse = after < before * (1 - threshold)
+            elif path.endswith("_bytes"):
+                worse = after > max(before * (1 + threshold), before + MEMORY_SLACK)
+            else:
+                worse = after > before * (1 + threshold)
+            if worse:
+                regressions.append((name, path, before, after))
+    return regressions
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "command", nargs="?", choices=["run", "compare", "entities"], default="run"
+    )
+    parser.add_argument("baseline", nargs="?", help="baseline results to compare with")
+    parser.add_argument(
+        "current", nargs="?", help="results to compare, instead of a run"
+    )
+    parser.add_argument("--games", nargs="+", choices=list(GAMES), default=list(GAMES))
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="fraction a figure may get worse by before it counts as a regression",
+    )
+    parser.add_argument("--out", help="write the JSON here instead of stdout")
+    parser.add_argument(
+        "--count", type=int, default=20000, help="instances of each class, for entities"
+    )
+    args = parser.parse_args()
+
+    if args.command == "entities":
+        run_entities(args)
+        return
+
+    if args.command == "compare":
+        if not args.baseline:
+            parser.error("compare needs a baseline file")
+        baseline = load(args.baseline)
+        if args.current:
+            current = load(args.current)
+        else:
+            # Run the way the baseline was made.
+            args.frames = baseline["config"]["frames"]
+            args.seed = baseline["config"]["seed"]
+            args.games = [name for name in args.games if name in baseline["games"]]
+            current = run(args)
+    else:
+        current = run(args)
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(current, file, indent=2)
+    elif args.command == "run":
+        print(json.dumps(current, indent=2))
+
+    if args.command == "compare":
+        regressions = compare(baseline, current, args.threshold)
+        for name, path, before, after in regressions:
+            print(f"REGRESSION {name} {path}: {before:.4g} -> {after:.4g}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
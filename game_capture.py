@@ -0,0 +1,236 @@
+"""
+Frame capture for the pygame games, for recording play sessions. Set GAME_CAPTURE, or
+pass --capture=PATH, and every frame the game shows is copied into one of a small ring
+of preallocated NumPy buffers, and a background thread writes them to disk, so the game
+loop never waits on encoding or the disk:
+
+    python pong.py --capture=frames
+    python pong.py --capture=session.raw
+
+A directory gets a PNG sequence, one file per frame named by its number. A path ending
+in .raw gets the frames' RGB bytes one after another, rows top to bottom. Either way
+an index is written alongside, frames/index.txt or session.raw.idx. Its first line is the
+width and height, and every frame written adds a line with the frame's number and its
+seconds since capture started.
+
+When the writer falls behind and every buffer is waiting to be written, new frames are
+dropped, not waited for, which the gaps in the frame numbers show; how many were dropped
+is printed when the game exits.
+
+    python game_capture.py --frames 300
+
+measures the frame time of every game without capture and capturing to each format.
+"""
+
+import argparse
+import atexit
+import os
+import queue
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+from game_options import option
+
+# Frames that can be waiting for the writer at once.
+RING_SIZE = 8
+# zlib level of the PNG frames; the games' flat colours compress well even at 1.
+PNG_LEVEL = 1
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def encode_png(rgb, level=PNG_LEVEL):
+    """Encodes a (height, width, 3) uint8 array as an RGB PNG."""
+    height, width, _ = rgb.shape
+    # Every row starts with its filter type, 0 for none.
+    rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)
+    rows[:, 1:] = rgb.reshape(height, -1)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        _PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(rows.data, level))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+class Capture:
+    """
+    Copies frames into a ring of RING_SIZE buffers and writes them to path from a
+    background thread; GameLoop hands it every frame. The buffers are allocated at the
+    size of the first frame.
+    """
+
+    def __init__(self, path, ring_size=RING_SIZE):
+        self.path = path
+        self.raw = path.endswith(".raw")
+        self.ring_size = ring_size
+        self.ring = None
+        self.free = queue.Queue()
+        self.full = queue.Queue()
+        self.thread = None
+        self.frames = 0
+        self.written = 0
+        self.dropped = 0
+        self.start = None
+        atexit.register(self.close)
+
+    def _open(self, surface):
+        width, height = surface.get_size()
+        if surface.get_bytesize() != 4:
+            raise ValueError("frame capture needs a 32-bit display surface")
+        # The packed pixels, copied row by row as they are in memory, are far quicker to
+        # copy than the RGB planes of surfarray.pixels3d(), so the writer unpacks them.
+        self.ring = np.empty((self.ring_size, height, width), dtype=np.uint32)
+        self.channels = [shift // 8 for shift in surface.get_shifts()[:3]]
+        for slot in range(self.ring_size):
+            self.free.put(slot)
+        if self.raw:
+            self.file = open(self.path, "wb")
+            self.index = open(self.path + ".idx", "w")
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            self.index = open(os.path.join(self.path, "index.txt"), "w")
+        self.index.write(f"{width} {height}\n")
+        self.start = time.perf_counter()
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def frame(self, surface):
+        """Copies surface into a free buffer for the writer, or drops it if none is."""
+        if self.ring is None:
+            self._open(surface)
+        number = self.frames
+        self.frames += 1
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        pixels = pygame.surfarray.pixels2d(surface)
+        # surfarray indexes by x first; transposed, the copy runs along memory.
+        np.copyto(self.ring[slot], pixels.T)
+        del pixels
+        self.full.put((slot, number, time.perf_counter() - self.start))
+
+    def _write(self):
+        # numpy's copies, zlib and file writes let go of the GIL, so the game keeps
+        # running while a frame is unpacked, encoded and written.
+        while True:
+            item = self.full.get()
+            if item is None:
+                return
+            slot, number, seconds = item
+            rgb = self.ring[slot].view(np.uint8).reshape(*self.ring.shape[1:], 4)
+            rgb = np.ascontiguousarray(rgb[..., self.channels])
+            self.free.put(slot)
+            if self.raw:
+                self.file.write(rgb.data)
+            else:
+                with open(os.path.join(self.path, f"{number:06d}.png"), "wb") as file:
+                    file.write(encode_png(rgb))
+            self.index.write(f"{number} {seconds:.6f}\n")
+            self.written += 1
+
+    def close(self):
+        """Writes the frames still waiting, closes the files and reports any drops."""
+        if self.thread is None:
+            return
+        self.full.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.raw:
+            self.file.close()
+        self.index.close()
+        print(
+            f"captured {self.written} of {self.frames} frames to {self.path},"
+            f" {self.dropped} dropped",
+            file=sys.stderr,
+        )
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "written": self.written,
+            "dropped": self.dropped,
+            "waiting": self.full.qsize(),
+        }
+
+
+# The capture GameLoop feeds, if capturing.
+_path = option("--capture", "GAME_CAPTURE")
+capture = Capture(_path) if _path else None
+
+
+def benchmark(frames, rate):
+    """
+    Mean and p99 milliseconds per frame of every game, paced at rate frames per second,
+    without capture and capturing to PNG and raw frames, with the frames dropped.
+    """
+    import game_bench
+    import game_loop
+
+    results = {}
+    for name in game_bench.GAMES:
+        results[name] = {}
+        for mode in ("off", "png", "raw"):
+            with tempfile.TemporaryDirectory() as directory:
+                if mode != "off":
+                    path = os.path.join(directory, "frames")
+                    game_loop.capture = Capture(
+                        path + (".raw" if mode == "raw" else "")
+                    )
+                try:
+                    loop, _ = game_bench.play(name, frames, 0, rate=rate)
+                finally:
+                    capture = game_loop.capture
+                    game_loop.capture = None
+                    if capture is not None:
+                        capture.close()
+                        atexit.unregister(capture.close)
+                times = sorted(
+                    (timing.input + timing.update + timing.render) * 1000
+                    for timing in loop.timings
+                )
+                results[name][mode] = (
+                    sum(times) / len(times),
+                    game_bench.percentile(times, 0.99),
+                    capture.dropped if capture is not None else 0,
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the frame time of capture.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--rate", type=int, default=60, help="frames per second")
+    args = parser.parse_args()
+    for name, modes in benchmark(args.frames, args.rate).items():
+        print(
+            f"{name:16s} "
+            + ", ".join(
+                f"{mode} {mean:.2f} ms p99 {p99:.2f} ms"
+                + (f" ({dropped} dropped)" if mode != "off" else "")
+                for mode, (mean, p99, dropped) in modes.items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+Reinforcement learning environments for the pygame games. GameEnv wraps a game's
+simulation in the usual reset()/step(action) interface, stepping it directly rather
+than through a window in real time, and VectorEnv steps many of them in worker
+processes, which write observations, rewards and done flags straight into NumPy arrays
+in shared memory instead of pickling them back.
+
+    env = VectorEnv("pong", num_envs=8)
+    observations = env.reset()
+    observations, rewards, dones = env.step(actions)
+
+An action is an index into the game's actions in GAMES, each a set of keys held down
+and keys pressed, and the reward is how much the game's score went up. An observation is
+the frame the game draws, scaled down to OBSERVATION_SIZE in greyscale, or with
+observation="state" the much cheaper planes game_obs draws from the game's state.
+
+    python game_env.py pong --steps 2000
+
+measures env-steps per second as the number of worker processes goes from 1 to the
+number of cores.
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Recordings are of the real keyboard, which the environments' held keys stand in
+# for, so GAME_RECORD is dropped before game_replay reads it.
+os.environ.pop("GAME_RECORD", None)
+
+import numpy as np
+import pygame
+
+OBSERVATION_SIZE = (84, 84)
+# Weights of red, green and blue in the greyscale observations.
+GREY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Module and class of every game, the keys held and pressed by each of its actions,
+# and its score, whose increase is the reward.
+GAMES = {
+    "pong": (
+        "pong",
+        "PongGame",
+        [((), ()), ((pygame.K_w,), ()), ((pygame.K_s,), ())],
+        lambda game: game.score1 - game.score2,
+    ),
+    "asteroids": (
+        "asteroids",
+        "AsteroidsGame",
+        [
+            ((), ()),
+            ((pygame.K_LEFT,), ()),
+            ((pygame.K_RIGHT,), ()),
+            ((pygame.K_UP,), ()),
+            ((), (pygame.K_SPACE,)),
+            ((pygame.K_UP,), (pygame.K_SPACE,)),
+        ],
+        lambda game: game.score,
+    ),
+    "tetris": (
+        "tetris",
+        "Game",
+        [
+            ((), ()),
+            ((), (pygame.K_LEFT,)),
+            ((), (pygame.K_RIGHT,)),
+            ((), (pygame.K_UP,)),
+            ((), (pygame.K_DOWN,)),
+            ((), (pygame.K_SPACE,)),
+        ],
+        lambda game: game.score,
+    ),
+    "pacman": (
+        "pacman",
+        "PacmanGame",
+        [
+            ((), ()),
+            ((), (pygame.K_LEFT,)),
+            ((), (pygame.K_RIGHT,)),
+            ((), (pygame.K_UP,)),
+            ((), (pygame.K_DOWN,)),
+        ],
+        lambda game: -len(game.maze.pellets) + (game.result == "You Win!") * 100,
+    ),
+    "elevator_action": (
+        "elevator_action",
+        "ElevatorGame",
+        [
+            ((), ()),
+            ((pygame.K_LEFT,), ()),
+            ((pygame.K_RIGHT,), ()),
+            ((), (pygame.K_SPACE,)),
+            ((), (pygame.K_DOWN,)),
+        ],
+        lambda game: _elevator_score(game),
+    ),
+}
+
+
+def _elevator_score(game):
+    elevator_action = importlib.import_module("elevator_action")
+    return (
+        game.player.floor
+        + elevator_action.document_collected * 10
+        + (game.result == "YOU WIN!") * 100
+    )
+
+
+# Games keeping their state in module globals, which can't run two at once in a process.
+ONE_PER_PROCESS = {"elevator_action"}
+
+
+class WorkerError(RuntimeError):
+    """A VectorEnv worker process died."""
+
+
+class HeldKeys:
+    """Stands in for pygame.key.get_pressed() with the keys an action holds down."""
+
+    def __init__(self, keys):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+# The keys held by the environment being stepped, which pygame.key.get_pressed()
+# returns once a GameEnv has been made in this process.
+_held = HeldKeys(())
+
+
+def _get_pressed():
+    return _held
+
+
+class GameEnv:
+    """
+    One game, stepped one fixed simulation step at a time, or frame_skip steps with the
+    same action. An episode ends when the game does, or after max_steps steps.
+    """
+
+    def __init__(
+        self, name, seed=None, frame_skip=1, max_steps=10000, observation="pixels"
+    ):
+        module_name, class_name, actions, score = GAMES[name]
+        self.name = name
+        if observation == "state":
+            import game_obs
+
+            self.observe = self.observe_state
+            self.observation_shape = game_obs.OBSERVERS[name][1]
+        elif observation == "pixels":
+            self.observe = self.observe_pixels
+            self.observation_shape = OBSERVATION_SIZE[::-1]
+        else:
+            raise ValueError(f"unknown observation {observation!r}")
+        self.module = importlib.import_module(module_name)
+        self.game_class = getattr(self.module, class_name)
+        self.actions = [
+            (
+                HeldKeys(held),
+                [pygame.event.Event(pygame.KEYDOWN, key=key, mod=0) for key in pressed],
+            )
+            for held, pressed in actions
+        ]
+        pygame.key.get_pressed = _get_pressed
+        self.score = score
+        self.step_length = 1 / getattr(self.module, "FPS", 60)
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.rng_state = random.Random(seed).getstate()
+        self.screen = None
+        self.small = pygame.Surface(OBSERVATION_SIZE)
+        self.game = None
+
+    @property
+    def action_count(self):
+        return len(self.actions)
+
+    def _run(self, function, *args):
+        # Every environment has its own random state, so that several can share a
+        # process and still each play the same game from the same seed.
+        state = random.getstate()
+        random.setstate(self.rng_state)
+        try:
+            return function(*args)
+        finally:
+            self.rng_state = random.getstate()
+            random.setstate(state)
+
+    def reset(self, out=None):
+        """Starts a new episode and returns its first observation."""
+        if self.screen is None:
+            setup = getattr(self.module, "setup", None)
+            if setup is not None:
+                # setup() reads the game's own arguments, like elevator_action's
+                # building file, which the caller's aren't.
+                argv = sys.argv
+                sys.argv = [f"{self.module.__name__}.py"]
+                try:
+                    setup()
+                finally:
+                    sys.argv = argv
+        self.game = self._run(self.game_class)
+        self.screen = pygame.display.get_surface()
+        self.steps = 0
+        self.last_score = self.score(self.game)
+        return self.observe(out)
+
+    def step(self, action, out=None):
+        """Returns the observation, reward and whether the episode is over."""
+        global _held
+        game = self.game
+        _held, events = self.actions[action]
+        self._run(self._advance, game, events)
+        score = self.score(game)
+        reward = score - self.last_score
+        self.last_score = score
+        done = not game.running or self.steps >= self.max_steps
+        return self.observe(out), reward, done
+
+    def _advance(self, game, events):
+        game.input(events)
+        for _ in range(self.frame_skip):
+            if not game.running:
+                break
+            game.update(self.step_length)
+            self.steps += 1
+
+    def observe_state(self, out=None):
+        import game_obs
+
+        return game_obs.observe(self.name, self.game, out)
+
+    def observe_pixels(self, out=None):
+        """Draws the game and writes it, scaled and greyscale, into out or a new array."""
+        self.game.render(1.0)
+        pygame.transform.smoothscale(self.screen, OBSERVATION_SIZE, self.small)
+        # surfarray indexes by x first.
+        pixels = pygame.surfarray.pixels3d(self.small)
+        grey = (pixels @ GREY_WEIGHTS).T
+        del pixels
+        if out is None:
+            out = np.empty(OBSERVATION_SIZE[::-1], dtype=np.uint8)
+        out[...] = grey
+        return out
+
+
+def _worker(name, observation, indices, seeds, buffers, connection):
+    memories = [shared_memory.SharedMemory(name=buffer) for buffer, _, _ in buffers]
+    observations, rewards, dones, actions = (
+        np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+        for memory, (_, shape, dtype) in zip(memories, buffers)
+    )
+    envs = [GameEnv(name, seed, observation=observation) for seed in seeds]
+    try:
+        # Ready; VectorEnv waits for every worker to get this far.
+        connection.send(None)
+        while True:
+            command = connection.recv()
+            if command == "reset":
+                for index, env in zip(indices, envs):
+                    env.reset(observations[index])
+            elif command == "step":
+                for index, env in zip(indices, envs):
+                    _, reward, done = env.step(int(actions[index]), observations[index])
+                    rewards[index] = reward
+                    dones[index] = done
+                    if done:
+                        # Start the next episode; its first observation replaces the
+                        # last one, as in other vectorised environments.
+                        env.reset(observations[index])
+            else:
+                break
+            connection.send(None)
+    finally:
+        del observations, rewards, dones, actions
+        for memory in memories:
+            memory.close()
+
+
+class VectorEnv:
+    """
+    num_envs environments of a game, spread over workers processes (one per environment
+    by default). step(actions) takes an array of action indices and returns views of the
+    shared observation, reward and done arrays, which the next call overwrites.
+
+    If a worker dies, the others are stopped, the shared memory is freed and
+    WorkerError is raised.
+    """
+
+    def __init__(self, name, num_envs, workers=None, seed=0, observation="pixels"):
+        workers = workers or num_envs
+        if name in ONE_PER_PROCESS and workers < num_envs:
+            raise ValueError(f"{name} can only run one environment per worker process")
+        self.num_envs = num_envs
+        if observation == "state":
+            import game_obs
+
+            shape = game_obs.OBSERVERS[name][1]
+        else:
+            shape = OBSERVATION_SIZE[::-1]
+        specs = [
+            ((num_envs, *shape), np.uint8),
+            ((num_envs,), np.float32),
+            ((num_envs,), np.bool_),
+            ((num_envs,), np.int32),
+        ]
+        self.memories = []
+        self.connections = []
+        self.processes = []
+        try:
+            arrays = []
+            buffers = []
+            for shape, dtype in specs:
+                size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                memory = shared_memory.SharedMemory(create=True, size=size)
+                self.memories.append(memory)
+                arrays.append(np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+                buffers.append((memory.name, shape, dtype))
+            self.observations, self.rewards, self.dones, self.actions = arrays
+            del arrays
+
+            context = multiprocessing.get_context("spawn")
+            for worker in range(workers):
+                indices = list(range(worker, num_envs, workers))
+                parent, child = context.Pipe()
+                process = context.Process(
+                    target=_worker,
+                    args=(
+                        name,
+                        observation,
+                        indices,
+                        [seed + i for i in indices],
+                        buffers,
+                        child,
+                    ),
+                    daemon=True,
+                )
+                process.start()
+                # Only the worker's end stays open, so its death reads as EOF here.
+                child.close()
+                self.connections.append(parent)
+                self.processes.append(process)
+            # Every worker reports once its environments are made.
+            self._receive()
+        except BaseException:
+            self._release()
+            raise
+        self.action_count = len(GAMES[name][2])
+
+    def _receive(self):
+        try:
+            for connection in self.connections:
+                connection.recv()
+        except (EOFError, OSError) as error:
+            # The worker's traceback is on stderr.
+            self._release()
+            raise WorkerError("an environment worker process died") from error
+
+    def _command(self, command):
+        try:
+            for connection in self.connections:
+                connection.send(command)
+        except OSError as error:
+            self._release()
+            raise WorkerError("an environment worker process died") from error
+        self._receive()
+
+    def reset(self):
+        self._command("reset")
+        return self.observations
+
+    def step(self, actions):
+        self.actions[:] = actions
+        self._command("step")
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send("close")
+            except OSError:
+                # The worker has already exited.
+                pass
+        for process in self.processes:
+            process.join()
+        self._release()
+
+    def _release(self):
+        """Stops any workers still running and frees the shared memory."""
+        for process in self.processes:
+            if process.is_alive():
+                # SDL turns SIGTERM into a QUIT event, which a worker never reads.
+                process.kill()
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.processes = []
+        self.connections = []
+        self.observations = self.rewards = self.dones = self.actions = None
+        for memory in self.memories:
+            memory.unlink()
+            try:
+                memory.close()
+            except BufferError:
+                # The caller still holds views of the arrays; the memory is unmapped
+                # once they are gone.
+                pass
+        self.memories = []
+
+
+def benchmark(name, steps, envs_per_worker=1, max_workers=None, observation="pixels"):
+    """Env-steps per second with random actions, for 1 up to max_workers workers."""
+    if name in ONE_PER_PROCESS:
+        envs_per_worker = 1
+    results = {}
+    rng = np.random.default_rng(0)
+    for workers in range(1, (max_workers or os.cpu_count()) + 1):
+        env = VectorEnv(
+            name, workers * envs_per_worker, workers, observation=observation
+        )
+        env.reset()
+        start = time.perf_counter()
+        for _ in range(steps):
+            env.step(rng.integers(env.action_count, size=env.num_envs))
+        results[workers] = steps * env.num_envs / (time.perf_counter() - start)
+        env.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures vectorised env throughput.")
+    parser.add_argument("game", choices=list(GAMES))
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--envs-per-worker", type=int, default=1)
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument("--observation", choices=["pixels", "state"], default="pixels")
+    args = parser.parse_args()
+    results = benchmark(
+        args.game,
+        args.steps,
+        args.envs_per_worker,
+        args.max_workers,
+        args.observation,
+    )
+    for workers, rate in results.items():
+        print(f"{workers} workers: {rate:.0f} env-steps/s")
+
+
+if __name__ == "__main__":
+    main()
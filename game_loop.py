@@ -0,0 +1,237 @@
+"""
+The main loop shared by the pygame games. The simulation advances in fixed steps, so a
+game plays the same at any frame rate, while frames are drawn as often as render_rate
+allows, each interpolated between the last two steps. How long every frame spent on
+input, updates and drawing is kept for the last few seconds, and handed to game_profile's
+profiler too when profiling is on, the input of every frame goes to game_replay's
+recorder when recording, and every frame shown goes to game_capture's capture when
+capturing. game_alloc's tracker, when on, closes each frame's allocation record.
+
+A game subclasses Game and is run with GameLoop(game).run(). It opens its window with
+open_window() when it starts, not when it is imported, so the games can be imported
+without side effects. While a game is idle, as when paused, the loop sleeps in
+pygame.event.wait() rather than drawing the same frame again and again, and idle() does
+the same for end screens.
+"""
+
+import collections
+import time
+
+import pygame
+
+from game_alloc import tracker
+from game_capture import capture
+from game_profile import profiler
+from game_replay import recorder
+
+# Posted every interval milliseconds while idle() waits, to redraw animated screens.
+IDLE_TICK = pygame.event.custom_type()
+
+# Durations in seconds of the phases of a frame, and the number of steps it simulated.
+FrameTiming = collections.namedtuple("FrameTiming", "input update render steps")
+
+
+class Game:
+    """
+    A game run by GameLoop. Each frame, input(events) gets the pygame events since the
+    last frame, update(dt) is called once for every fixed step of dt seconds due and
+    render(alpha) draws the frame, alpha being how far time has got from the last step
+    towards the next, from 0 to 1. The loop ends when running is False.
+
+    While idle is True, the loop stops stepping and drawing and waits for the next
+    event, which is handed to input() and followed by one frame.
+
+    snapshot() returns the game's state as plain values, which recordings hash every
+    frame to find where a replay stops matching.
+    """
+
+    running = True
+    idle = False
+
+    def input(self, events):
+        pass
+
+    def update(self, dt):
+        pass
+
+    def render(self, alpha):
+        pass
+
+    def snapshot(self):
+        return None
+
+
+def open_window(size, caption):
+    """
+    Initialises the only pygame subsystems the games use, the display and fonts, rather
+    than everything pygame.init() starts, and opens a window of the given size.
+    """
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(size)
+    pygame.display.set_caption(caption)
+    return screen
+
+
+def lerp(a, b, alpha):
+    """Interpolates from a to b; works for numbers and pygame vectors."""
+    return a + (b - a) * alpha
+
+
+def lerp_rect(a, b, alpha):
+    """Returns a copy of rect b moved alpha of the way from rect a's position."""
+    rect = b.copy()
+    rect.topleft = (round(lerp(a.x, b.x, alpha)), round(lerp(a.y, b.y, alpha)))
+    return rect
+
+
+def idle(draw, keys, interval=None):
+    """
+    Shows a screen that only changes on input: calls draw() and flips the display, then
+    sleeps until one of keys is pressed, and returns it, or the window is closed, and
+    returns None. The screen is drawn again when the window is exposed, and every
+    interval milliseconds if given, for screens with something animated on them.
+    """
+    draw()
+    pygame.display.flip()
+    if capture is not None:
+        capture.frame(pygame.display.get_surface())
+    if interval:
+        pygame.time.set_timer(IDLE_TICK, interval)
+    try:
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                return None
+            if event.type == pygame.KEYDOWN and event.key in keys:
+                return event.key
+            if event.type in (IDLE_TICK, pygame.WINDOWEXPOSED):
+                draw()
+                pygame.display.flip()
+                if capture is not None:
+                    capture.frame(pygame.display.get_surface())
+    finally:
+        if interval:
+            pygame.time.set_timer(IDLE_TICK, 0)
+
+
+class GameLoop:
+    """
+    Runs a Game at step_rate fixed steps per second, drawing at most render_rate frames
+    per second (or as fast as possible if None), and flips the display after each.
+
+    When a frame falls so far behind that more than max_steps steps are due, the rest
+    are dropped and the game slows down, rather than every later frame falling further
+    behind. A headless loop doesn't wait for time to pass: every frame simulates one
+    step, as fast as the machine can go, and draws it too unless render is False. Nor
+    does it wait for events while the game is idle.
+    """
+
+    def __init__(
+        self,
+        game,
+        step_rate=60,
+        render_rate=60,
+        max_steps=5,
+        headless=False,
+        render=True,
+        history=600,
+    ):
+        self.game = game
+        self.step = 1 / step_rate
+        self.render_rate = render_rate
+        self.max_steps = max_steps
+        self.headless = headless
+        self.render = render
+        self.clock = pygame.time.Clock()
+        # FrameTimings of the last history frames.
+        self.timings = collections.deque(maxlen=history)
+        self.frames = 0
+        self.steps = 0
+        self.dropped_steps = 0
+
+    def run(self, frames=None):
+        """Runs until the game stops, or for the given number of frames."""
+        game = self.game
+        step = self.step
+        accumulator = 0.0
+        previous = time.perf_counter_ns()
+        end = None if frames is None else self.frames + frames
+        if recorder is not None:
+            recorder.start(game, step)
+        while game.running and self.frames != end:
+            woken_by = []
+            if game.idle and not self.headless:
+                # Sleep until something happens; the time asleep isn't simulated.
+                woken_by.append(pygame.event.wait())
+                previous = time.perf_counter_ns()
+            start = time.perf_counter_ns()
+            if self.headless:
+                accumulator += step
+            else:
+                accumulator += (start - previous) / 1e9
+            previous = start
+
+            events = woken_by + pygame.event.get()
+            game.input(events)
+            input_done = time.perf_counter_ns()
+
+            steps = 0
+            while accumulator >= step and game.running:
+                if steps == self.max_steps:
+                    # Too far behind to catch up: drop the steps still due.
+                    self.dropped_steps += int(accumulator / step)
+                    accumulator %= step
+                    break
+                game.update(step)
+                accumulator -= step
+                steps += 1
+            update_done = time.perf_counter_ns()
+
+            render_done = update_done
+            if self.render:
+                game.render(min(accumulator / step, 1.0))
+                render_done = time.perf_counter_ns()
+                if profiler.enabled:
+                    profiler.draw(pygame.display.get_surface())
+                pygame.display.flip()
+                if capture is not None:
+                    # Part of the frame's time, as it holds the next frame up.
+                    capture.frame(pygame.display.get_surface())
+            flip_done = time.perf_counter_ns()
+            if recorder is not None:
+                recorder.frame(events, steps)
+
+            self.timings.append(
+                FrameTiming(
+                    (input_done - start) / 1e9,
+                    (update_done - input_done) / 1e9,
+                    (flip_done - update_done) / 1e9,
+                    steps,
+                )
+            )
+            if profiler.enabled:
+                profiler.add("input", input_done - start)
+                profiler.add("update", update_done - input_done)
+                profiler.add("render", render_done - update_done)
+                profiler.add("flip", flip_done - render_done)
+                profiler.end_frame()
+            if tracker.enabled:
+                tracker.end_frame()
+            self.frames += 1
+            self.steps += steps
+            if not self.headless and self.render_rate:
+                self.clock.tick(self.render_rate)
+
+    def stats(self):
+        """Mean milliseconds per phase over the recorded frames, and their rate."""
+        count = len(self.timings) or 1
+        totals = [sum(phase) for phase in zip(*self.timings)] or [0, 0, 0, 0]
+        return {
+            "input_ms": totals[0] / count * 1000,
+            "update_ms": totals[1] / count * 1000,
+            "render_ms": totals[2] / count * 1000,
+            "steps_per_frame": totals[3] / count,
+            "fps": self.clock.get_fps(),
+            "dropped_steps": self.dropped_steps,
+        }
@@ -0,0 +1,232 @@
+"""
+Observations of the pygame games drawn straight from their state into small uint8 NumPy
+arrays, one plane per kind of thing, without drawing a frame on an SDL surface first:
+
+    pong             ball, left paddle, right paddle          3 x 60 x 80
+    asteroids        ship, asteroids, bullets                 3 x 84 x 84
+    tetris           locked blocks, falling piece             2 x 20 x 10
+    pacman           walls, pellets, Pac-Man, ghost           4 x 17 x 28 (tiles)
+    elevator_action  floors and doors, elevator cars, player,
+                     enemies, bullets, document               6 x 60 x 80 (the view)
+
+Cells covered by something are 255 and the rest 0. game_env.GameEnv uses these with
+observation="state".
+
+    python game_obs.py
+
+compares the time each takes with drawing the frame and capturing it with surfarray.
+"""
+
+import math
+import time
+import weakref
+
+import numpy as np
+
+import asteroids
+import elevator_action
+import pacman
+import pong
+import tetris
+
+ON = 255
+
+
+def fill_rect(plane, x, y, width, height, scale):
+    """Sets the cells of plane covered by a rect given in pixels, scaled by scale."""
+    rows, columns = plane.shape
+    left = max(0, int(x * scale))
+    top = max(0, int(y * scale))
+    # Anything at all inside the rect covers at least one cell.
+    right = min(columns, max(left + 1, math.ceil((x + width) * scale)))
+    bottom = min(rows, max(top + 1, math.ceil((y + height) * scale)))
+    plane[top:bottom, left:right] = ON
+
+
+def splat_points(plane, points, scale):
+    """Sets the cells under every (x, y) of points, in pixels; those outside are skipped."""
+    if not len(points):
+        return
+    cells = (np.asarray(points, dtype=np.float32) * scale).astype(np.intp)
+    rows, columns = plane.shape
+    inside = (
+        (cells[:, 0] >= 0)
+        & (cells[:, 0] < columns)
+        & (cells[:, 1] >= 0)
+        & (cells[:, 1] < rows)
+    )
+    cells = cells[inside]
+    plane[cells[:, 1], cells[:, 0]] = ON
+
+
+def splat_discs(plane, circles, scale):
+    """Sets the cells inside every (x, y, radius) of circles, in pixels."""
+    rows, columns = plane.shape
+    for x, y, radius in circles:
+        x, y = x * scale, y * scale
+        # At least the centre cell, however small the disc is scaled.
+        radius = max(radius * scale, 0.5)
+        top, bottom = max(0, int(y - radius)), min(rows, math.ceil(y + radius))
+        left, right = max(0, int(x - radius)), min(columns, math.ceil(x + radius))
+        if top >= bottom or left >= right:
+            continue
+        # Cell centres in the disc's bounding box.
+        ys = np.arange(top, bottom, dtype=np.float32)[:, None] + 0.5 - y
+        xs = np.arange(left, right, dtype=np.float32)[None, :] + 0.5 - x
+        plane[top:bottom, left:right][xs * xs + ys * ys <= radius * radius] = ON
+
+
+PONG_SCALE = 0.1
+
+
+def observe_pong(game, out):
+    for plane, rect in zip(out, game.objects()):
+        fill_rect(plane, *rect, PONG_SCALE)
+
+
+ASTEROIDS_SCALE = 84 / asteroids.WIDTH
+
+
+def observe_asteroids(game, out):
+    ship, rocks, bullets = out
+    splat_points(ship, [game.spaceship.position], ASTEROIDS_SCALE)
+    splat_discs(
+        rocks,
+        [(rock.x, rock.y, rock.radius) for rock in game.asteroids],
+        ASTEROIDS_SCALE,
+    )
+    splat_points(
+        bullets, [(bullet.x, bullet.y) for bullet in game.bullets], ASTEROIDS_SCALE
+    )
+
+
+def observe_tetris(game, out):
+    locked, falling = out
+    black = tetris.BLACK
+    locked[np.array([[cell != black for cell in row] for row in game.grid])] = ON
+    piece = game.current_piece
+    shape = np.asarray(piece.shape, dtype=bool)
+    # The piece may be partly above the top of the grid.
+    top = max(0, piece.y)
+    left = max(0, piece.x)
+    visible = shape[top - piece.y : tetris.GRID_HEIGHT - piece.y, left - piece.x :]
+    visible = visible[:, : tetris.GRID_WIDTH - left]
+    falling[top : top + visible.shape[0], left : left + visible.shape[1]][visible] = ON
+
+
+# Wall planes of the mazes seen so far, by layout, and the pellet plane of every maze
+# with the number of pellets it was drawn with; pellets are only ever eaten, so the plane
+# is drawn again only when that number changes.
+_walls = {}
+_pellets = weakref.WeakKeyDictionary()
+
+
+def observe_pacman(game, out):
+    walls, pellets, player, ghost = out
+    layout = tuple(game.maze.layout)
+    if layout not in _walls:
+        _walls[layout] = (np.array([list(row) for row in layout]) == "#") * ON
+    walls[...] = _walls[layout]
+    tile = 1 / pacman.TILE_SIZE
+    count, plane = _pellets.get(game.maze, (None, None))
+    if count != len(game.maze.pellets):
+        plane = np.zeros_like(pellets)
+        splat_points(plane, [pellet.center for pellet in game.maze.pellets], tile)
+        _pellets[game.maze] = (len(game.maze.pellets), plane)
+    pellets[...] = plane
+    splat_points(player, [game.pacman.pos], tile)
+    splat_points(ghost, [game.ghost.pos], tile)
+
+
+ELEVATOR_SCALE = 0.1
+
+
+def observe_elevator_action(game, out):
+    floors, cars, player, enemies, bullets, document = out
+    building = elevator_action.building
+    entities = elevator_action.entities
+    camera_y = game.camera.y
+    scale = ELEVATOR_SCALE
+
+    def fill(plane, rect):
+        fill_rect(plane, rect.x, rect.y - camera_y, *rect.size, scale)
+
+    visible = game.camera.visible_floors()
+    shafts = set()
+    for floor in visible:
+        line_y = building.floor_y(floor) - camera_y
+        fill_rect(floors, 0, line_y, elevator_action.SCREEN_WIDTH, 1, scale)
+        for door in building.doors[floor]:
+            fill(floors, door)
+        if floor == building.exit[0]:
+            fill(floors, building.exit[1])
+        shafts.update(building.floor_shafts[floor])
+        for enemy in entities.enemies.on_floor(floor):
+            if enemy.alive:
+                fill(enemies, enemy.rect)
+        for bullet in entities.bullets.on_floor(floor):
+            if bullet.alive:
+                fill(bullets, bullet.rect)
+    for shaft in shafts:
+        car = game.elevators.cars[shaft]
+        fill(cars, building.shaft_door(shaft, car.position(game.now)))
+    fill(player, game.player.rect)
+    if not elevator_action.document_collected and building.document is not None:
+        fill(document, building.document[1])
+
+
+# The function drawing every game's observation, and its shape.
+OBSERVERS = {
+    "pong": (observe_pong, (3, 60, 80)),
+    "asteroids": (observe_asteroids, (3, 84, 84)),
+    "tetris": (observe_tetris, (2, tetris.GRID_HEIGHT, tetris.GRID_WIDTH)),
+    "pacman": (observe_pacman, (4, pacman.MAZE_ROWS, pacman.MAZE_COLS)),
+    "elevator_action": (observe_elevator_action, (6, 60, 80)),
+}
+
+
+def observe(name, game, out=None):
+    """Draws game's observation into out, a zeroed array if not given, and returns it."""
+    function, shape = OBSERVERS[name]
+    if out is None:
+        out = np.zeros(shape, dtype=np.uint8)
+    else:
+        out[...] = 0
+    function(game, out)
+    return out
+
+
+def benchmark(steps=500, seed=0):
+    """
+    Microseconds per observation drawn from state and by rendering the frame and scaling
+    and capturing it with surfarray, over steps steps of random play of every game.
+    """
+    import game_env
+
+    results = {}
+    rng = np.random.default_rng(seed)
+    for name in OBSERVERS:
+        env = game_env.GameEnv(name, seed, observation="pixels")
+        env.reset()
+        out = np.zeros(OBSERVERS[name][1], dtype=np.uint8)
+        state = pixels = 0.0
+        for _ in range(steps):
+            _, _, done = env.step(rng.integers(env.action_count))
+            if done:
+                env.reset()
+            start = time.perf_counter()
+            observe(name, env.game, out)
+            state += time.perf_counter() - start
+            start = time.perf_counter()
+            env.observe_pixels()
+            pixels += time.perf_counter() - start
+        results[name] = (state / steps * 1e6, pixels / steps * 1e6)
+    return results
+
+
+if __name__ == "__main__":
+    for name, (state, pixels) in benchmark().items():
+        print(
+            f"{name:16s} state {state:7.1f} us, render and capture {pixels:7.1f} us,"
+            f" {pixels / state:.0f}x"
+        )
@@ -0,0 +1,26 @@
+"""
+Command line flags and environment variables of the opt-in tools for the pygame games:
+game_profile, game_replay, game_capture and game_alloc. Each reads its setting once, when
+it is imported by game_loop, which is why this isn't part of game_loop itself.
+
+    path = option("--capture", "GAME_CAPTURE")
+    value = option("--profile", "GAME_PROFILE", "1")
+"""
+
+import os
+import sys
+
+
+def option(flag, env, default=None):
+    """
+    The value of --flag=VALUE on the command line, or of the environment variable env if
+    the flag isn't given, or "" if neither is. If default is given, a bare --flag gives
+    default too. The flag is removed from sys.argv, so the games' own arguments are
+    where they expect them.
+    """
+    for index, arg in enumerate(sys.argv[1:], 1):
+        name, equals, value = arg.partition("=")
+        if name == flag and (equals or default is not None):
+            del sys.argv[index]
+            return value if equals else default
+    return os.environ.get(env, "")
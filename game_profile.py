@@ -0,0 +1,172 @@
+"""
+Opt-in profiling for the pygame games. Set GAME_PROFILE, or pass --profile, to draw a
+graph of recent frame times with their p50 and p99 over the game, and time named
+sections of code:
+
+    with profiler.section("collision"):
+        ...
+
+    @profiled("draw_grid")
+    def draw_grid(self):
+        ...
+
+GAME_PROFILE=1 (or --profile) only shows the overlay. GAME_PROFILE=frames.csv (or
+--profile=frames.jsonl) also streams a record of every frame to that file: CSV rows of
+frame, section and milliseconds, or one JSON object per frame. GameLoop times the input,
+update, render and flip sections of every frame by itself.
+
+When profiling is off, section() hands back a shared do-nothing context manager and
+profiled() leaves functions as they are, so the instrumentation costs next to nothing.
+"""
+
+import atexit
+import collections
+import contextlib
+import csv
+import functools
+import json
+import time
+
+import pygame
+
+from game_options import option
+
+# Frames the overlay graph and percentiles cover.
+WINDOW = 240
+GRAPH_SIZE = (WINDOW, 60)
+# Frame time at the top of the graph, and the 60 fps budget line drawn across it.
+GRAPH_MAX_MS = 50.0
+BUDGET_MS = 1000 / 60
+
+_NULL_SECTION = contextlib.nullcontext()
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter_ns() - self.start)
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        # Nanoseconds spent in each section during the current frame.
+        self.sections = {}
+        # Frame times in milliseconds, from the start of one frame to the next.
+        self.frame_ms = collections.deque(maxlen=WINDOW)
+        self.frame = 0
+        self.frame_start = None
+        self.file = None
+        self.writer = None
+        self.font = None
+        self.panel = None
+
+    def enable(self, path=None):
+        """Turns profiling on, streaming frame records to path if given."""
+        self.enabled = True
+        if path:
+            self.file = open(path, "w", newline="")
+            if path.endswith(".csv"):
+                self.writer = csv.writer(self.file)
+                self.writer.writerow(["frame", "section", "ms"])
+            atexit.register(self.close)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def section(self, name):
+        """A context manager timing its block as part of section name."""
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def add(self, name, nanoseconds):
+        self.sections[name] = self.sections.get(name, 0) + nanoseconds
+
+    def end_frame(self):
+        """Closes the current frame's record; GameLoop calls this once a frame."""
+        now = time.perf_counter_ns()
+        if self.frame_start is not None:
+            frame_ms = (now - self.frame_start) / 1e6
+            self.frame_ms.append(frame_ms)
+            if self.file is not None:
+                self.write(frame_ms)
+        self.frame_start = now
+        self.frame += 1
+        self.sections.clear()
+
+    def write(self, frame_ms):
+        sections = {name: ns / 1e6 for name, ns in self.sections.items()}
+        if self.writer is not None:
+            self.writer.writerow([self.frame, "frame", f"{frame_ms:.4f}"])
+            for name, ms in sections.items():
+                self.writer.writerow([self.frame, name, f"{ms:.4f}"])
+        else:
+            record = {"frame": self.frame, "frame_ms": frame_ms, **sections}
+            self.file.write(json.dumps(record) + "\n")
+
+    def percentiles(self):
+        """Returns the p50 and p99 frame times in milliseconds over the window."""
+        if not self.frame_ms:
+            return 0.0, 0.0
+        ordered = sorted(self.frame_ms)
+        last = len(ordered) - 1
+        return ordered[last // 2], ordered[int(last * 0.99)]
+
+    def draw(self, surface):
+        """Draws the frame time graph and percentiles in the top left corner."""
+        width, height = GRAPH_SIZE
+        if self.panel is None:
+            self.font = pygame.font.Font(None, 20)
+            self.panel = pygame.Surface((width, height + 20), pygame.SRCALPHA)
+        panel = self.panel
+        panel.fill((0, 0, 0, 160))
+        scale = height / GRAPH_MAX_MS
+        for x, ms in enumerate(self.frame_ms):
+            bar = min(height, round(ms * scale))
+            color = (80, 220, 80) if ms <= BUDGET_MS else (230, 80, 60)
+            pygame.draw.line(panel, color, (x, height - bar), (x, height - 1))
+        budget_y = height - round(BUDGET_MS * scale)
+        pygame.draw.line(panel, (200, 200, 200), (0, budget_y), (width, budget_y))
+        p50, p99 = self.percentiles()
+        text = self.font.render(
+            f"p50 {p50:.1f} ms  p99 {p99:.1f} ms", True, (255, 255, 255)
+        )
+        panel.blit(text, (4, height + 3))
+        surface.blit(panel, (0, 0))
+
+
+def profiled(name):
+    """Decorates a function to time each call as part of section name."""
+
+    def decorate(function):
+        if not profiler.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.add(name, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorate
+
+
+profiler = Profiler()
+_value = option("--profile", "GAME_PROFILE", "1")
+if _value and _value != "0":
+    profiler.enable(None if _value == "1" else _value)
@@ -0,0 +1,239 @@
+"""
+Recording and replay of the pygame games. Set GAME_RECORD=play.rec, or pass
+--record=play.rec, and the game seeds the random module with a fresh seed and saves it,
+together with what the keyboard did every frame, to a small binary file. Replaying it
+feeds the same seed and input back to the game headless, as fast as the simulation runs:
+
+    python elevator_action.py tower.txt --record=play.rec
+    python game_replay.py play.rec
+    python game_replay.py play.rec --render
+
+A hash of every frame's state, from the game's snapshot(), is saved alongside the input,
+so a replay that stops matching the recording names the first frame that differs.
+
+The file starts with a header: MAGIC, the seed, the game's module and its command line
+arguments. After it, every GameLoop run starts with a RUN byte, the game's class and the
+length of a step, and each of its frames is one byte of steps taken, with INPUT set if
+any key changed or was pressed, followed if so by the scancodes that changed state and
+the keys of the KEYDOWN events, and then the frame's state hash. Numbers are varints.
+"""
+
+import argparse
+import atexit
+import importlib
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+
+import pygame
+
+from game_options import option
+
+MAGIC = b"GREC1"
+# Frame byte flags, and the byte starting a run.
+INPUT = 0x40
+STEPS = 0x3F
+RUN = 0xFF
+# Length of pygame.key.get_pressed(), SDL's number of scancodes.
+SCANCODES = 512
+
+
+def write_varint(file, value):
+    while value >= 0x80:
+        file.write(bytes((value & 0x7F | 0x80,)))
+        value >>= 7
+    file.write(bytes((value,)))
+
+
+def read_varint(file):
+    value = shift = 0
+    while True:
+        byte = file.read(1)[0]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value
+        shift += 7
+
+
+def write_string(file, string):
+    data = string.encode()
+    write_varint(file, len(data))
+    file.write(data)
+
+
+def read_string(file):
+    return file.read(read_varint(file)).decode()
+
+
+def state_hash(game):
+    return zlib.crc32(repr(game.snapshot()).encode())
+
+
+def module_name(game):
+    name = type(game).__module__
+    if name == "__main__":
+        # Run as a script: the module is the file's name.
+        name = os.path.splitext(os.path.basename(sys.modules["__main__"].__file__))[0]
+    return name
+
+
+class Recorder:
+    """Writes what GameLoop hands it to a recording at path."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.seed = int.from_bytes(os.urandom(8), "little")
+        random.seed(self.seed)
+        self.game = None
+        self.pressed = set()
+        atexit.register(self.close)
+
+    def start(self, game, step):
+        """Starts a run of a new game; GameLoop calls this every time it runs."""
+        if game is self.game:
+            return
+        if self.game is None:
+            self.file.write(MAGIC)
+            self.file.write(struct.pack("<Q", self.seed))
+            write_string(self.file, module_name(game))
+            write_varint(self.file, len(sys.argv) - 1)
+            for arg in sys.argv[1:]:
+                write_string(self.file, arg)
+        self.game = game
+        self.file.write(bytes((RUN,)))
+        write_string(self.file, type(game).__name__)
+        self.file.write(struct.pack("<d", step))
+
+    def frame(self, events, steps):
+        """Records a frame's events and the steps it took, after they have run."""
+        keys = pygame.key.get_pressed()
+        if not isinstance(keys, tuple):
+            # Stand-ins for the keyboard, like game_bench's scripted keys, only answer
+            # for the keys asked about, and enumerating them never ends.
+            raise TypeError("only pygame's own keyboard state can be recorded")
+        pressed = {scancode for scancode, down in enumerate(keys) if down}
+        changed = sorted(pressed ^ self.pressed)
+        self.pressed = pressed
+        keys = [event.key for event in events if event.type == pygame.KEYDOWN]
+        file = self.file
+        if changed or keys:
+            file.write(bytes((steps | INPUT,)))
+            write_varint(file, len(changed))
+            for scancode in changed:
+                write_varint(file, scancode)
+            write_varint(file, len(keys))
+            for key in keys:
+                write_varint(file, key)
+        else:
+            file.write(bytes((steps,)))
+        file.write(struct.pack("<I", state_hash(self.game)))
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class Desync(Exception):
+    def __init__(self, run, frame, total):
+        super().__init__(
+            f"replay differs from the recording at frame {frame} of run {run}"
+            f" (frame {total} overall)"
+        )
+        self.run = run
+        self.frame = frame
+        self.total = total
+
+
+def replay(path, render=False):
+    """
+    Plays a recording back, raising Desync at the first frame whose state differs from
+    the recording's. Returns the number of frames played.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game recording")
+        (seed,) = struct.unpack("<Q", file.read(8))
+        name = read_string(file)
+        sys.argv = [f"{name}.py"] + [
+            read_string(file) for _ in range(read_varint(file))
+        ]
+        module = importlib.import_module(name)
+        if hasattr(module, "setup"):
+            module.setup()
+        random.seed(seed)
+
+        pressed = [False] * SCANCODES
+        keys = pygame.key.ScancodeWrapper(pressed)
+        get_pressed = pygame.key.get_pressed
+        pygame.key.get_pressed = lambda: keys
+        game = None
+        run = frame = total = 0
+        try:
+            while True:
+                byte = file.read(1)
+                if not byte:
+                    return total
+                if byte[0] == RUN:
+                    game = getattr(module, read_string(file))()
+                    (step,) = struct.unpack("<d", file.read(8))
+                    run += 1
+                    frame = 0
+                    continue
+                events = []
+                if byte[0] & INPUT:
+                    for _ in range(read_varint(file)):
+                        scancode = read_varint(file)
+                        pressed[scancode] = not pressed[scancode]
+                    keys = pygame.key.ScancodeWrapper(pressed)
+                    for _ in range(read_varint(file)):
+                        events.append(
+                            pygame.event.Event(
+                                pygame.KEYDOWN, key=read_varint(file), mod=0
+                            )
+                        )
+                game.input(events)
+                for _ in range(byte[0] & STEPS):
+                    game.update(step)
+                if render:
+                    game.render(1.0)
+                    pygame.display.flip()
+                frame += 1
+                total += 1
+                (recorded,) = struct.unpack("<I", file.read(4))
+                if state_hash(game) != recorded:
+                    raise Desync(run, frame, total)
+        finally:
+            pygame.key.get_pressed = get_pressed
+
+
+# The recorder GameLoop feeds, if recording.
+_path = option("--record", "GAME_RECORD")
+recorder = Recorder(_path) if _path else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a game recording.")
+    parser.add_argument("path")
+    parser.add_argument(
+        "--render", action="store_true", help="draw the frames, still at full speed"
+    )
+    args = parser.parse_args()
+    if not args.render:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    # The game imports this module again, and mustn't record the replay.
+    os.environ.pop("GAME_RECORD", None)
+    start = time.perf_counter()
+    try:
+        frames = replay(args.path, args.render)
+    except Desync as error:
+        print(error)
+        sys.exit(1)
+    seconds = time.perf_counter() - start
+    print(f"{frames} frames replayed in {seconds:.2f} s, matching the recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Cached sprites for the pygame games' moving things. Every shape, size and colour is
+drawn once with pygame.draw onto a small surface of its own, and the games then draw
+all their balls, bullets and enemies with one Surface.blits() call a frame, rather than
+drawing each shape again with pygame.draw every frame.
+
+    from game_sprites import sprites
+
+    image = sprites.circle(radius, WHITE)
+    screen.blits([(image, (x - radius, y - radius)) for x, y in points], doreturn=False)
+
+Shapes drawn without antialiasing are the same pixels pygame.draw would have drawn in
+place. antialias=True draws the shape SUPERSAMPLE times larger and scales it down, with
+an alpha channel for its soft edges.
+
+    python game_sprites.py
+
+measures drawing thousands of shapes each way.
+"""
+
+import argparse
+import os
+import random
+import time
+
+import pygame
+
+# Times larger antialiased shapes are drawn before they are scaled down.
+SUPERSAMPLE = 4
+
+
+class SpriteCache:
+    def __init__(self):
+        # (shape, size, colour, width, antialias) -> Surface
+        self.sprites = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _sprite(self, key, size, draw):
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        color, antialias = key[2], key[4]
+        if antialias:
+            large = pygame.Surface(
+                (size[0] * SUPERSAMPLE, size[1] * SUPERSAMPLE), pygame.SRCALPHA
+            )
+            draw(large, color, SUPERSAMPLE)
+            sprite = pygame.transform.smoothscale(large, size)
+        else:
+            sprite = pygame.Surface(size)
+            # Any colour but the shape's own will do for the transparent background.
+            background = tuple(255 - channel for channel in color)
+            sprite.fill(background)
+            draw(sprite, color, 1)
+            sprite.set_colorkey(background, pygame.RLEACCEL)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha() if antialias else sprite.convert()
+        self.sprites[key] = sprite
+        return sprite
+
+    def circle(self, radius, color, width=0, antialias=False):
+        """
+        A circle like pygame.draw.circle's, outlined width pixels thick if width is
+        given. Blit it at (x - radius, y - radius) to centre it on (x, y).
+        """
+
+        def draw(surface, color, scale):
+            pygame.draw.circle(
+                surface,
+                color,
+                (radius * scale, radius * scale),
+                radius * scale,
+                width * scale,
+            )
+
+        key = ("circle", radius, color, width, antialias)
+        return self._sprite(key, (radius * 2, radius * 2), draw)
+
+    def ellipse(self, size, color, antialias=False):
+        """An ellipse filling a rect of the given size, like pygame.draw.ellipse's."""
+
+        def draw(surface, color, scale):
+            pygame.draw.ellipse(surface, color, surface.get_rect())
+
+        return self._sprite(("ellipse", tuple(size), color, 0, antialias), size, draw)
+
+    def rect(self, size, color):
+        """A filled rect of the given size."""
+
+        def draw(surface, color, scale):
+            surface.fill(color)
+
+        return self._sprite(("rect", tuple(size), color, 0, False), size, draw)
+
+    def clear(self):
+        self.sprites.clear()
+
+    def stats(self):
+        return {"sprites": len(self.sprites), "hits": self.hits, "misses": self.misses}
+
+
+sprites = SpriteCache()
+
+
+# Shapes of the benchmark, with the games' sizes and colours: asteroids, bullets,
+# pellets and elevator enemies.
+SHAPES = [
+    ("circle", 45, (100, 100, 100), 2),
+    ("circle", 30, (100, 100, 100), 2),
+    ("circle", 15, (100, 100, 100), 2),
+    ("circle", 2, (255, 255, 255), 0),
+    ("circle", 3, (255, 255, 255), 0),
+    ("rect", (30, 40), (255, 0, 0), 0),
+]
+
+
+def benchmark(counts, frames=50, seed=0):
+    """
+    Milliseconds per frame to draw count shapes at random places with pygame.draw, and
+    with one blits() call of cached sprites, plain and antialiased, for every count.
+    """
+    screen = pygame.display.get_surface()
+    width, height = screen.get_size()
+    rng = random.Random(seed)
+    results = {}
+    for count in counts:
+        objects = [
+            (rng.choice(SHAPES), rng.randrange(width), rng.randrange(height))
+            for _ in range(count)
+        ]
+
+        def draw():
+            for (shape, size, color, line), x, y in objects:
+                if shape == "circle":
+                    pygame.draw.circle(screen, color, (x, y), size, line)
+                else:
+                    pygame.draw.rect(screen, color, (x, y, *size))
+
+        def batch(antialias):
+            items = []
+            for (shape, size, color, line), x, y in objects:
+                if shape == "circle":
+                    image = sprites.circle(size, color, line, antialias)
+                    items.append((image, (x - size, y - size)))
+                else:
+                    items.append((sprites.rect(size, color), (x, y)))
+            screen.blits(items, doreturn=False)
+
+        timings = {}
+        for name, function in [
+            ("draw", draw),
+            ("blits", lambda: batch(False)),
+            ("blits_aa", lambda: batch(True)),
+        ]:
+            function()
+            start = time.perf_counter()
+            for _ in range(frames):
+                screen.fill((0, 0, 0))
+                function()
+            timings[name] = (time.perf_counter() - start) / frames * 1000
+        results[count] = timings
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures cached sprite drawing.")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 2000, 5000])
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((800, 600))
+    for count, timings in benchmark(args.counts, args.frames).items():
+        print(
+            f"{count:6d} shapes: pygame.draw {timings['draw']:6.2f} ms,"
+            f" blits {timings['blits']:6.2f} ms"
+            f" ({timings['draw'] / timings['blits']:.1f}x),"
+            f" antialiased blits {timings['blits_aa']:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
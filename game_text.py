@@ -0,0 +1,82 @@
+"""
+Cached text for the pygame games. Fonts are made once per name and size, and rendered
+text is kept in a bounded least recently used cache keyed by its string, size, colour
+and font, so a line of text is only rendered again when it changes, like a score going
+up, instead of every frame.
+
+    from game_text import text
+
+    surface = text.render(f"Score: {score}", 36, WHITE)
+    text.draw(screen, "Paused", 48, WHITE, center=(x, y))
+
+Colours are keys of the cache, so they have to be tuples rather than pygame.Color.
+"""
+
+import collections
+
+import pygame
+
+# Rendered surfaces kept at once.
+CACHE_SIZE = 256
+
+
+class TextCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        # (name, size) -> Font
+        self.fonts = {}
+        # (text, size, colour, name) -> Surface, least recently used first.
+        self.surfaces = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size, name=None):
+        """The font of the given size, the default font unless a system font is named."""
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            if name is None:
+                font = pygame.font.Font(None, size)
+            else:
+                font = pygame.font.SysFont(name, size)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, size, color, name=None):
+        """Returns text rendered antialiased in color, reusing an earlier rendering."""
+        key = (text, size, color, name)
+        surfaces = self.surfaces
+        surface = surfaces.get(key)
+        if surface is not None:
+            surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.font(size, name).render(text, True, color)
+        surfaces[key] = surface
+        if len(surfaces) > self.size:
+            surfaces.popitem(last=False)
+        return surface
+
+    def draw(self, surface, text, size, color, name=None, **position):
+        """
+        Blits text onto surface, placed by a rect attribute such as center=(x, y) or
+        topleft=(x, y), and returns the rect it covers.
+        """
+        rendered = self.render(text, size, color, name)
+        return surface.blit(rendered, rendered.get_rect(**position))
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        return {
+            "fonts": len(self.fonts),
+            "surfaces": len(self.surfaces),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# The cache shared by the games.
+text = TextCache()
@@ -1,15 +1,52 @@
 from direct.showbase.ShowBase import ShowBase
+from direct.gui.OnscreenText import OnscreenText
 from panda3d.core import (
-    CollisionTraverser,
-    CollisionNode,
-    CollisionRay,
-    CollisionHandlerQueue,
-    BitMask32,
+    GraphicsWindow,
+    Point3,
+    TextNode,
     Vec3,
     WindowProperties,
 )
 from direct.task import Task
-import sys
+
+from voxel_edit import Box, Sphere, WorldEditor
+from voxel_light import LightEngine
+from voxel_lod import LodSelector
+from voxel_mesh import RemeshQueue
+from voxel_region import RegionStore
+from voxel_terrain import ChunkStreamer, surface_height
+from voxel_world import (
+    BLOCK_NAMES,
+    BLOCK_SPACING,
+    BRICK,
+    DIRT,
+    GRASS,
+    LAMP,
+    LEAVES,
+    PLANKS,
+    SAND,
+    SNOW,
+    STONE,
+    WOOD,
+    VoxelWorld,
+)
+
+# How far (in chunks) terrain is streamed in around the camera. Distant terrain is drawn
+# at lower detail (see voxel_lod.py), which keeps far radii within the frame time that
+# a radius of 6 took at full detail.
+VIEW_RADIUS = 24
+# How far (in world units) the player can reach to add or remove blocks.
+REACH = 20
+# CPU time (in milliseconds) per frame that may be spent on chunk meshes, counting the
+# builds on worker threads, and lighting newly loaded chunks.
+REMESH_BUDGET_MS = 3.0
+# Where edited chunks are saved, and how often (in seconds) edits are written back.
+WORLD_DIR = "world"
+AUTOSAVE_INTERVAL = 30
+# Radius (in blocks) of the sphere shift-clicking fills or clears.
+BRUSH_RADIUS = 4
+# Block types the number keys 1-9 and 0 select for placing.
+HOTBAR = [GRASS, DIRT, STONE, SAND, SNOW, WOOD, LEAVES, BRICK, PLANKS, LAMP]
 
 
 def clamp(value, min_val, max_val):
@@ -17,57 +54,67 @@ def clamp(value, min_val, max_val):
 
 
 class VoxelGame(ShowBase):
-    def __init__(self):
+    def __init__(
+        self,
+        seed=0,
+        view_radius=VIEW_RADIUS,
+        remesh_budget_ms=REMESH_BUDGET_MS,
+        world_dir=WORLD_DIR,
+    ):
         ShowBase.__init__(self)
         # Disable the default mouse-based camera control.
         self.disableMouse()
 
-        # Hide the mouse cursor.
-        props = WindowProperties()
-        props.setCursorHidden(True)
-        self.win.requestProperties(props)
+        # Hide the mouse cursor. Offscreen buffers (see voxel_bench.py) have no cursor,
+        # and no mouse either.
+        self.has_pointer = isinstance(self.win, GraphicsWindow)
+        if self.has_pointer:
+            props = WindowProperties()
+            props.setCursorHidden(True)
+            self.win.requestProperties(props)
 
-        # Set initial camera position and orientation.
-        self.camera.setPos(0, -15, 2)
-        self.camera.setHpr(0, 0, 0)
+        # This value defines the spacing between blocks (and their size).
+        self.block_spacing = BLOCK_SPACING
 
-        # Dictionary to keep track of blocks.
-        # Keys are (x, y, z) tuples and values are the NodePaths for each block.
-        self.blocks = {}
+        # Edited chunks are saved to region files in world_dir. A saved world keeps
+        # the seed it was created with.
+        self.store = RegionStore(world_dir)
+        metadata = self.store.load_metadata()
+        if "seed" in metadata:
+            seed = metadata["seed"]
+        else:
+            self.store.save_metadata({"seed": seed})
 
-        # This value defines the spacing between blocks (and their size).
-        self.block_spacing = 1.1
-
-        # Load a cube model. Panda3D comes with a built-in cube in the "models/box" file.
-        self.block_model = loader.loadModel("models/box")
-        # Scale the cube so that each block is 1.1x1.1x1.1 (since the default box is 2x2x2, scale=1.1/2 = 0.55).
-        self.block_model.setScale(0.55)
-        # Change the block color to a greenish hue.
-        self.block_model.setColor(0.2, 1.0, 0.2, 1.0)
-        self.block_model.flattenLight()
-
-        # Build a simple flat world.
-        # Instead of using integer positions, we multiply by block_spacing so that blocks are exactly adjacent.
-        for ix in range(-10, 11):
-            for iy in range(-10, 11):
-                x = ix * self.block_spacing
-                y = iy * self.block_spacing
-                self.addBlock(x, y, 0)
-
-        # Setup collision detection for mouse picking.
-        self.picker = CollisionTraverser()
-        self.pq = CollisionHandlerQueue()
-        self.picker_node = CollisionNode("mouseRay")
-        self.picker_np = self.camera.attachNewNode(self.picker_node)
-        # Set this node to collide with blocks (we use bit 1 for blocks).
-        self.picker_node.setFromCollideMask(BitMask32.bit(1))
-        self.picker_ray = CollisionRay()
-        self.picker_node.addSolid(self.picker_ray)
-        self.picker.addCollider(self.picker_np, self.pq)
+        # The voxel world is infinite and seeded; chunks around the camera are loaded
+        # or generated in the background and streamed in as they finish.
+        self.world = VoxelWorld()
+        self.streamer = ChunkStreamer(
+            self.world, seed, radius=view_radius, store=self.store
+        )
+        # Chunk meshes are never rebuilt inline; changed chunks are queued and rebuilt
+        # nearest first within a fixed time budget per frame.
+        self.remesher = RemeshQueue(self.world, render, budget_ms=remesh_budget_ms)
+        # Decides which meshes to build: full detail near the camera, merged cells
+        # further out, and hides chunks buried behind solid neighbours.
+        self.lod = LodSelector(self.world, self.remesher, view_radius)
+        # Every edit goes through the editor, which writes whole chunks at a time and
+        # keeps the undo history.
+        self.editor = WorldEditor(self.world, load_chunk=self.streamer.load_now)
+        # Sky and block light, lit as chunks load and relit around every edit.
+        self.light = LightEngine(self.world)
+        self.editor.light = self.light
+
+        # Set initial camera position and orientation, just above the ground at the origin.
+        self.camera.setPos(0, 0, (surface_height(seed, 0, 0) + 3) * self.block_spacing)
+        self.camera.setHpr(0, 0, 0)
 
         # Accept mouse button events.
         self.accept("mouse1", self.removeBlockAtMouse)
         self.accept("mouse3", self.addBlockAtMouse)
+        self.accept("shift-mouse1", self.clearSphereAtMouse)
+        self.accept("shift-mouse3", self.fillSphereAtMouse)
+        self.accept("control-z", self.undo)
+        self.accept("control-y", self.redo)
 
         # Set up key controls for basic first-person movement.
         self.keyMap = {
@@ -84,10 +131,33 @@ class VoxelGame(ShowBase):
         self.accept("a-up", self.setKey, ["left", False])
         self.accept("d", self.setKey, ["right", True])
         self.accept("d-up", self.setKey, ["right", False])
-        self.accept("escape", sys.exit)
+        self.accept("escape", self.quit)
+
+        # Number keys choose which block type the right mouse button places.
+        self.selected_block = HOTBAR[0]
+        for slot, block in enumerate(HOTBAR):
+            self.accept(str((slot + 1) % 10), self.selectBlock, [block])
+
+        # Streaming statistics, toggled with F3.
+        self.stats_text = OnscreenText(
+            parent=self.a2dTopLeft,
+            pos=(0.05, -0.08),
+            scale=0.05,
+            fg=(1, 1, 1, 1),
+            align=TextNode.ALeft,
+            mayChange=True,
+        )
+        self.accept("f3", self.toggleStats)
 
         # Add the update task to move the camera and process mouse look.
         self.taskMgr.add(self.updateCamera, "updateCamera")
+        # Rebuild changed chunk meshes.
+        self.taskMgr.add(self.remesher.drain, "drainRemeshQueue")
+        # Stream chunks in and out around the camera. Runs after the remesher, as new
+        # chunks are lit in what is left of its budget.
+        self.taskMgr.add(self.streamChunks, "streamChunks", sort=1)
+        # Write edits back to disk every so often, not only on unload and exit.
+        self.taskMgr.doMethodLater(AUTOSAVE_INTERVAL, self.autosave, "autosave")
 
         # Center the mouse pointer.
         self.centerMouse()
@@ -95,68 +165,144 @@ class VoxelGame(ShowBase):
     def setKey(self, key, value):
         self.keyMap[key] = value
 
-    def addBlock(self, x, y, z):
-        """Adds a block at the specified coordinate if one isn't already present."""
-        posKey = (x, y, z)
-        if posKey in self.blocks:
-            return
-        block = self.block_model.copyTo(render)
-        block.setPos(x, y, z)
-        # Enable collision on the block.
-        block.setCollideMask(BitMask32.bit(1))
-        self.blocks[posKey] = block
+    def selectBlock(self, block):
+        self.selected_block = block
+
+    def addBlock(self, x, y, z, block=None):
+        """Places a block (the selected type by default) at the specified voxel coordinate."""
+        self.fillRegion(Box((x, y, z), (x + 1, y + 1, z + 1)), block)
 
     def removeBlock(self, x, y, z):
-        """Removes a block at the specified coordinate, if present."""
-        posKey = (x, y, z)
-        if posKey in self.blocks:
-            self.blocks[posKey].removeNode()
-            del self.blocks[posKey]
+        """Removes a block at the specified voxel coordinate, if present."""
+        self.clearRegion(Box((x, y, z), (x + 1, y + 1, z + 1)))
 
-    def addBlockAtMouse(self):
-        """Casts a ray from the camera to where the mouse is pointing and adds a block adjacent to the hit face."""
-        if not self.mouseWatcherNode.hasMouse():
-            return
+    def fillRegion(self, shape, block=None):
+        """Fills a Box or Sphere with a block type (the selected one by default)."""
+        if block is None:
+            block = self.selected_block
+        self.lod.request_chunks(self.editor.fill(shape, block))
+
+    def clearRegion(self, shape):
+        """Removes every block in a Box or Sphere."""
+        self.lod.request_chunks(self.editor.clear(shape))
+
+    def replaceRegion(self, shape, old_block, new_block):
+        """Swaps one block type for another inside a Box or Sphere."""
+        self.lod.request_chunks(self.editor.replace(shape, old_block, new_block))
+
+    def copyRegion(self, shape):
+        """Copies the blocks in a Box or Sphere to the clipboard."""
+        self.editor.copy(shape)
+
+    def pasteRegion(self, x, y, z):
+        """Pastes the clipboard with its lowest corner at a voxel coordinate."""
+        self.lod.request_chunks(self.editor.paste((x, y, z)))
+
+    def undo(self):
+        self.lod.request_chunks(self.editor.undo())
+
+    def redo(self):
+        self.lod.request_chunks(self.editor.redo())
+
+    def pickBlock(self):
+        """
+        Casts a ray from the camera through the mouse pointer into the voxel world.
+        Returns (hit, previous) voxel coordinates, or None if nothing is in reach.
+        """
+        if not self.has_pointer or not self.mouseWatcherNode.hasMouse():
+            return None
         mpos = self.mouseWatcherNode.getMouse()
-        self.picker_ray.setFromLens(self.camNode, mpos.getX(), mpos.getY())
-        self.picker.traverse(render)
-        if self.pq.getNumEntries() > 0:
-            self.pq.sortEntries()
-            entry = self.pq.getEntry(0)
-            hitPos = entry.getSurfacePoint(render)
-            normal = entry.getSurfaceNormal(render)
-            # Compute the position for the new block by offsetting half a unit in the direction of the hit normal.
-            newPos = hitPos + normal * 0.5
-            # Round newPos to the nearest multiple of block_spacing.
-            newBlockPos = (
-                round(newPos.getX() / self.block_spacing) * self.block_spacing,
-                round(newPos.getY() / self.block_spacing) * self.block_spacing,
-                round(newPos.getZ() / self.block_spacing) * self.block_spacing,
-            )
-            self.addBlock(*newBlockPos)
+        near = Point3()
+        far = Point3()
+        self.camLens.extrude(mpos, near, far)
+        origin = render.getRelativePoint(self.cam, near)
+        target = render.getRelativePoint(self.cam, far)
+        return self.world.raycast(origin, target - origin, REACH)
+
+    def addBlockAtMouse(self):
+        """Adds a block against the face of the block the mouse is pointing at."""
+        picked = self.pickBlock()
+        if picked is not None and picked[1] is not None:
+            self.addBlock(*picked[1])
 
     def removeBlockAtMouse(self):
-        """Casts a ray from the camera to the mouse and removes the block hit."""
-        if not self.mouseWatcherNode.hasMouse():
-            return
-        mpos = self.mouseWatcherNode.getMouse()
-        self.picker_ray.setFromLens(self.camNode, mpos.getX(), mpos.getY())
-        self.picker.traverse(render)
-        if self.pq.getNumEntries() > 0:
-            self.pq.sortEntries()
-            entry = self.pq.getEntry(0)
-            hitPos = entry.getSurfacePoint(render)
-            blockPos = (
-                round(hitPos.getX() / self.block_spacing) * self.block_spacing,
-                round(hitPos.getY() / self.block_spacing) * self.block_spacing,
-                round(hitPos.getZ() / self.block_spacing) * self.block_spacing,
+        """Removes the block the mouse is pointing at."""
+        picked = self.pickBlock()
+        if picked is not None:
+            self.removeBlock(*picked[0])
+
+    def fillSphereAtMouse(self):
+        """Fills a sphere of the selected block around the face the mouse points at."""
+        picked = self.pickBlock()
+        if picked is not None and picked[1] is not None:
+            self.fillRegion(Sphere(picked[1], BRUSH_RADIUS))
+
+    def clearSphereAtMouse(self):
+        """Clears a sphere around the block the mouse is pointing at."""
+        picked = self.pickBlock()
+        if picked is not None:
+            self.clearRegion(Sphere(picked[0], BRUSH_RADIUS))
+
+    def streamChunks(self, task):
+        pos = self.camera.getPos()
+        x, y, z = (round(c / self.block_spacing) for c in pos)
+        loaded, unloaded = self.streamer.update(x, y)
+        # Chunks are meshed once they are lit; lighting a batch of them at once can
+        # take longer than a frame, so it shares the remesher's time budget.
+        budget = self.remesher.budget - self.remesher.last_frame_ms / 1000
+        lit, relit = self.light.light_chunks(loaded, max(budget, 0))
+        self.lod.update(pos, lit, unloaded)
+        self.lod.request_light(relit)
+
+        if not self.stats_text.isHidden() and task.frame % 30 == 0:
+            remesh = self.remesher.stats()
+            lod = self.lod.stats()
+            self.stats_text.setText(
+                f"chunks/s: {self.streamer.chunks_per_second()}"
+                f"  queued: {self.streamer.queue_depth()}"
+                f"  loaded: {len(self.world.chunks)}"
+                f"  from disk: {self.streamer.total_loaded}"
+                f"  unlit: {len(self.light.unlit)}\n"
+                f"remesh queued: {remesh['queued']}  building: {remesh['building']}"
+                f"  worst frame: {remesh['worst_frame_ms']:.1f} ms\n"
+                f"meshes by level: {lod['meshes_by_level']}"
+                f"  occluded: {lod['occluded']}\n"
+                f"last edit: {self.editor.last_edit_ms:.1f} ms"
+                f" over {self.editor.last_edit_chunks} chunks"
+                f"  light ({self.light.last_edit_mode}):"
+                f" {self.light.last_edit_ms:.1f} ms over {self.light.last_edit_chunks}"
+                f" chunks\n"
+                f"placing: {BLOCK_NAMES[self.selected_block]}"
             )
-            self.removeBlock(*blockPos)
+        return Task.cont
+
+    def toggleStats(self):
+        if self.stats_text.isHidden():
+            self.stats_text.show()
+        else:
+            self.stats_text.hide()
+
+    def autosave(self, task):
+        self.streamer.save_dirty_chunks()
+        return Task.again
+
+    def closeWorld(self):
+        """Stops the background workers and writes unsaved edits to disk."""
+        self.streamer.shutdown()
+        self.remesher.shutdown()
+
+    def finalizeExit(self):
+        # Every way out, escape or closing the window, ends here through userExit().
+        self.closeWorld()
+        ShowBase.finalizeExit(self)
+
+    def quit(self):
+        self.userExit()
 
     def updateCamera(self, task):
         dt = globalClock.getDt()
         # Mouse look: get the pointer's movement and update the camera heading and pitch.
-        if self.mouseWatcherNode.hasMouse():
+        if self.has_pointer and self.mouseWatcherNode.hasMouse():
             md = self.win.getPointer(0)
             x = md.getX()
             y = md.getY()
@@ -190,12 +336,18 @@ class VoxelGame(ShowBase):
 
     def centerMouse(self):
         """Re-centers the mouse pointer to the window center."""
+        if not self.has_pointer:
+            return
         winProps = self.win.getProperties()
         centerX = int(winProps.getXSize() / 2)
         centerY = int(winProps.getYSize() / 2)
         self.win.movePointer(0, centerX, centerY)
 
 
-if __name__ == "__main__":
+def main():
     game = VoxelGame()
     game.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,15 @@ import pygame
 import sys
 import random
 
-# Initialize Pygame
-pygame.init()
+from game_loop import Game, GameLoop, idle, lerp, open_window
+from game_sprites import sprites
+from game_text import text
 
 # ----- Configuration -----
 TILE_SIZE = 24
-FPS = 10  # Lower FPS for grid-based feel (you can increase for smoother movement)
+PELLET_SIZE = 6
+FPS = 10  # Game steps per second; low for a grid-based feel
+RENDER_FPS = 60  # Frames show Pac-Man and the ghost gliding between tiles
 
 # Colors
 BLACK = (0, 0, 0)
@@ -50,17 +53,13 @@ MAZE_COLS = len(maze_layout[0])
 SCREEN_WIDTH = MAZE_COLS * TILE_SIZE
 SCREEN_HEIGHT = MAZE_ROWS * TILE_SIZE
 
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Simple Pac-Man")
-clock = pygame.time.Clock()
+# The window, opened by setup()
+screen = None
 
 
 # ----- Helper Functions -----
-def draw_text(surface, text, size, color, center):
-    font = pygame.font.SysFont(None, size)
-    text_surface = font.render(text, True, color)
-    rect = text_surface.get_rect(center=center)
-    surface.blit(text_surface, rect)
+def draw_text(surface, string, size, color, center):
+    text.draw(surface, string, size, color, center=center)
 
 
 # ----- Game Classes -----
@@ -71,6 +70,8 @@ class Maze:
         self.pellets = []  # List of pellets as rects (or centers)
         self.pacman_start = None
         self.ghost_start = None
+        # The image and place of every pellet left, for drawing them in one batch.
+        self.pellet_blits = []
         self.parse_layout()
 
     def parse_layout(self):
@@ -82,35 +83,47 @@ class Maze:
                     self.wall_rects.append(pygame.Rect(x, y, TILE_SIZE, TILE_SIZE))
                 elif char == ".":
                     # Place a pellet in the center of the tile.
-                    pellet_rect = pygame.Rect(0, 0, 6, 6)
+                    pellet_rect = pygame.Rect(0, 0, PELLET_SIZE, PELLET_SIZE)
                     pellet_rect.center = (x + TILE_SIZE // 2, y + TILE_SIZE // 2)
                     self.pellets.append(pellet_rect)
+                    self.pellet_blits.append(
+                        (sprites.circle(PELLET_SIZE // 2, WHITE), pellet_rect.topleft)
+                    )
                 elif char == "P":
                     self.pacman_start = (x + TILE_SIZE // 2, y + TILE_SIZE // 2)
                 elif char == "G":
                     self.ghost_start = (x + TILE_SIZE // 2, y + TILE_SIZE // 2)
                 # If the tile is empty " " do nothing.
 
+    def eat(self, pellet):
+        index = self.pellets.index(pellet)
+        del self.pellets[index]
+        del self.pellet_blits[index]
+
     def draw(self, surface):
         # Draw walls
         for wall in self.wall_rects:
             pygame.draw.rect(surface, BLUE, wall)
-        # Draw pellets
-        for pellet in self.pellets:
-            pygame.draw.circle(surface, WHITE, pellet.center, pellet.width // 2)
+        # Draw pellets, all at once
+        surface.blits(self.pellet_blits, doreturn=False)
 
 
 class Pacman:
+    __slots__ = ("pos", "radius", "speed", "direction", "previous")
+
     def __init__(self, pos):
         self.pos = pygame.Vector2(pos)
         self.radius = TILE_SIZE // 2 - 2
         self.speed = TILE_SIZE  # Moves one tile per update
         # Direction vector: (dx, dy). Initially stationary.
         self.direction = pygame.Vector2(0, 0)
+        # Position before the last update, to draw the moves between tiles.
+        self.previous = self.pos.copy()
 
     def update(self, maze):
         # Save current position
         old_pos = self.pos.copy()
+        self.previous = old_pos
         # Update position based on direction
         self.pos += self.direction * self.speed
 
@@ -128,18 +141,20 @@ class Pacman:
         # We use a copy of the list so we can remove items while iterating.
         for pellet in maze.pellets[:]:
             if pac_rect.colliderect(pellet):
-                maze.pellets.remove(pellet)
+                maze.eat(pellet)
 
-    def draw(self, surface):
-        # Draw Pac-Man as a yellow circle.
-        pygame.draw.circle(
-            surface, YELLOW, (int(self.pos.x), int(self.pos.y)), self.radius
-        )
+    def sprite(self, alpha=1.0):
+        # Pac-Man is a yellow circle.
         # For a simple "mouth", you could draw a black triangle overlay.
         # (Optional enhancement)
+        pos = lerp(self.previous, self.pos, alpha)
+        image = sprites.circle(self.radius, YELLOW)
+        return image, (int(pos.x) - self.radius, int(pos.y) - self.radius)
 
 
 class Ghost:
+    __slots__ = ("pos", "radius", "speed", "direction", "previous")
+
     def __init__(self, pos):
         self.pos = pygame.Vector2(pos)
         self.radius = TILE_SIZE // 2 - 2
@@ -153,9 +168,11 @@ class Ghost:
                 pygame.Vector2(0, -1),
             ]
         )
+        self.previous = self.pos.copy()
 
     def update(self, maze):
         old_pos = self.pos.copy()
+        self.previous = old_pos
         self.pos += self.direction * self.speed
 
         ghost_rect = pygame.Rect(0, 0, self.radius * 2, self.radius * 2)
@@ -193,16 +210,17 @@ class Ghost:
         if valid_dirs:
             self.direction = random.choice(valid_dirs)
 
-    def draw(self, surface):
-        pygame.draw.circle(
-            surface, PINK, (int(self.pos.x), int(self.pos.y)), self.radius
-        )
+    def sprite(self, alpha=1.0):
+        pos = lerp(self.previous, self.pos, alpha)
+        image = sprites.circle(self.radius, PINK)
+        return image, (int(pos.x) - self.radius, int(pos.y) - self.radius)
 
 
 # ----- Game Over / Win Screens -----
 def show_end_screen(message):
     """Display a screen with the given message and wait for player to press R to restart or Q to quit."""
-    while True:
+
+    def draw():
         screen.fill(BLACK)
         draw_text(
             screen, message, 48, WHITE, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 30)
@@ -214,47 +232,49 @@ def show_end_screen(message):
             WHITE,
             (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 30),
         )
-        pygame.display.flip()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    return  # restart
-                if event.key == pygame.K_q:
-                    pygame.quit()
-                    sys.exit()
-        clock.tick(15)
 
+    if idle(draw, (pygame.K_r, pygame.K_q)) != pygame.K_r:
+        pygame.quit()
+        sys.exit()
+
+
+# ----- Main Game Class -----
+class PacmanGame(Game):
+    def __init__(self):
+        # Build the maze and identify starting positions.
+        self.maze = Maze(maze_layout)
+        # If the maze layout contains explicit starting positions, use them.
+        # Otherwise, use default positions.
+        pacman_start = (
+            self.maze.pacman_start
+            if self.maze.pacman_start
+            else (TILE_SIZE + TILE_SIZE // 2, TILE_SIZE + TILE_SIZE // 2)
+        )
+        ghost_start = (
+            self.maze.ghost_start
+            if self.maze.ghost_start
+            else (SCREEN_WIDTH - TILE_SIZE, SCREEN_HEIGHT - TILE_SIZE)
+        )
 
-# ----- Main Game Function -----
-def run_game():
-    # Build the maze and identify starting positions.
-    maze = Maze(maze_layout)
-    # If the maze layout contains explicit starting positions, use them.
-    # Otherwise, use default positions.
-    pacman_start = (
-        maze.pacman_start
-        if maze.pacman_start
-        else (TILE_SIZE + TILE_SIZE // 2, TILE_SIZE + TILE_SIZE // 2)
-    )
-    ghost_start = (
-        maze.ghost_start
-        if maze.ghost_start
-        else (SCREEN_WIDTH - TILE_SIZE, SCREEN_HEIGHT - TILE_SIZE)
-    )
-
-    pacman = Pacman(pacman_start)
-    ghost = Ghost(ghost_start)
-
-    running = True
-    while running:
-        clock.tick(FPS)
+        self.pacman = Pacman(pacman_start)
+        self.ghost = Ghost(ghost_start)
+        # The message to end the game with, once it is over.
+        self.result = None
+
+    def snapshot(self):
+        pacman, ghost = self.pacman, self.ghost
+        return (
+            tuple(pacman.pos),
+            tuple(pacman.direction),
+            tuple(ghost.pos),
+            tuple(ghost.direction),
+            len(self.maze.pellets),
+        )
 
+    def input(self, events):
         # --- Event Handling ---
-        for event in pygame.event.get():
+        pacman = self.pacman
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -269,9 +289,11 @@ def run_game():
                 elif event.key == pygame.K_DOWN:
                     pacman.direction = pygame.Vector2(0, 1)
 
+    def update(self, dt):
+        pacman, ghost = self.pacman, self.ghost
         # --- Update Game Objects ---
-        pacman.update(maze)
-        ghost.update(maze)
+        pacman.update(self.maze)
+        ghost.update(self.maze)
 
         # Check for collisions between Pac-Man and the ghost.
         pac_rect = pygame.Rect(0, 0, pacman.radius * 2, pacman.radius * 2)
@@ -279,24 +301,38 @@ def run_game():
         ghost_rect = pygame.Rect(0, 0, ghost.radius * 2, ghost.radius * 2)
         ghost_rect.center = ghost.pos
         if pac_rect.colliderect(ghost_rect):
-            show_end_screen("Game Over!")
+            self.result = "Game Over!"
+            self.running = False
             return
 
         # Check win condition: no more pellets.
-        if not maze.pellets:
-            show_end_screen("You Win!")
-            return
+        if not self.maze.pellets:
+            self.result = "You Win!"
+            self.running = False
 
+    def render(self, alpha):
         # --- Draw Everything ---
         screen.fill(BLACK)
-        maze.draw(screen)
-        pacman.draw(screen)
-        ghost.draw(screen)
-        pygame.display.flip()
+        self.maze.draw(screen)
+        screen.blits(
+            [self.pacman.sprite(alpha), self.ghost.sprite(alpha)], doreturn=False
+        )
+
+
+def run_game():
+    game = PacmanGame()
+    GameLoop(game, step_rate=FPS, render_rate=RENDER_FPS).run()
+    show_end_screen(game.result)
 
 
 # ----- Main Loop -----
+def setup():
+    global screen
+    screen = open_window((SCREEN_WIDTH, SCREEN_HEIGHT), "Simple Pac-Man")
+
+
 def main():
+    setup()
     while True:
         run_game()
 
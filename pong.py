@@ -1,8 +1,9 @@
 import pygame
 import random
 
-# Initialize Pygame
-pygame.init()
+from game_loop import Game, GameLoop, lerp_rect, open_window
+from game_sprites import sprites
+from game_text import text
 
 # Constants
 WIDTH, HEIGHT = 800, 600
@@ -12,100 +13,137 @@ FPS = 60
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
-# Create the screen
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Pong")
-
-# Initialize game objects
-ball = pygame.Rect(
-    WIDTH // 2 - BALL_SIZE // 2, HEIGHT // 2 - BALL_SIZE // 2, BALL_SIZE, BALL_SIZE
-)
-paddle1 = pygame.Rect(30, HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT)
-paddle2 = pygame.Rect(
-    WIDTH - 50, HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT
-)
-
-# Game variables
-ball_speed_x = 7 * random.choice((1, -1))
-ball_speed_y = 7 * random.choice((1, -1))
-paddle_speed = 7
-score1 = 0
-score2 = 0
-
-# Clock to control FPS
-clock = pygame.time.Clock()
-
-
-def reset_ball():
-    global ball_speed_x, ball_speed_y
-    ball.center = (WIDTH // 2, HEIGHT // 2)
-    ball_speed_x *= random.choice((1, -1))
-    ball_speed_y *= random.choice((1, -1))
-
-
-# Main game loop
-running = True
-while running:
-    # Handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    # Move paddles
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_w] and paddle1.top > 0:
-        paddle1.y -= paddle_speed
-    if keys[pygame.K_s] and paddle1.bottom < HEIGHT:
-        paddle1.y += paddle_speed
-    if keys[pygame.K_UP] and paddle2.top > 0:
-        paddle2.y -= paddle_speed
-    if keys[pygame.K_DOWN] and paddle2.bottom < HEIGHT:
-        paddle2.y += paddle_speed
-
-    # Move ball
-    ball.x += ball_speed_x
-    ball.y += ball_speed_y
-
-    # Ball collision with top/bottom
-    if ball.top <= 0 or ball.bottom >= HEIGHT:
-        ball_speed_y *= -1
-
-    # Ball collision with paddles
-    if ball.colliderect(paddle1) or ball.colliderect(paddle2):
-        ball_speed_x *= -1
-        # Add slight vertical speed variation based on paddle impact point
-        ball_speed_y += random.uniform(-1, 1)
-
-    # Score points
-    if ball.left <= 0:
-        score2 += 1
-        reset_ball()
-    if ball.right >= WIDTH:
-        score1 += 1
-        reset_ball()
-
-    # Drawing
-    screen.fill(BLACK)
-
-    # Draw center line
-    for i in range(0, HEIGHT, HEIGHT // 20):
-        if i % 2 == 0:
-            pygame.draw.rect(screen, WHITE, (WIDTH // 2 - 2, i, 4, HEIGHT // 20))
-
-    # Draw paddles and ball
-    pygame.draw.rect(screen, WHITE, paddle1)
-    pygame.draw.rect(screen, WHITE, paddle2)
-    pygame.draw.ellipse(screen, WHITE, ball)
-
-    # Draw scores
-    font = pygame.font.Font(None, 74)
-    text = font.render(str(score1), True, WHITE)
-    screen.blit(text, (WIDTH // 4, 20))
-    text = font.render(str(score2), True, WHITE)
-    screen.blit(text, (WIDTH * 3 // 4, 20))
-
-    # Update display
-    pygame.display.flip()
-    clock.tick(FPS)
-
-pygame.quit()
+# The window, opened by setup()
+screen = None
+
+
+def setup():
+    global screen
+    screen = open_window((WIDTH, HEIGHT), "Pong")
+
+
+class PongGame(Game):
+    def __init__(self):
+        # Initialize game objects
+        self.ball = pygame.Rect(
+            WIDTH // 2 - BALL_SIZE // 2,
+            HEIGHT // 2 - BALL_SIZE // 2,
+            BALL_SIZE,
+            BALL_SIZE,
+        )
+        self.paddle1 = pygame.Rect(
+            30, HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT
+        )
+        self.paddle2 = pygame.Rect(
+            WIDTH - 50, HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT
+        )
+        # Positions before the last step, to draw frames in between.
+        self.previous = [rect.copy() for rect in self.objects()]
+
+        # Game variables
+        self.ball_speed_x = 7 * random.choice((1, -1))
+        self.ball_speed_y = 7 * random.choice((1, -1))
+        self.paddle_speed = 7
+        self.score1 = 0
+        self.score2 = 0
+
+    def objects(self):
+        return self.ball, self.paddle1, self.paddle2
+
+    def snapshot(self):
+        return (
+            [tuple(rect) for rect in self.objects()],
+            self.ball_speed_x,
+            self.ball_speed_y,
+            self.score1,
+            self.score2,
+        )
+
+    def reset_ball(self):
+        self.ball.center = (WIDTH // 2, HEIGHT // 2)
+        self.ball_speed_x *= random.choice((1, -1))
+        self.ball_speed_y *= random.choice((1, -1))
+        # Don't draw the ball sliding back to the middle.
+        self.previous[0] = self.ball.copy()
+
+    def input(self, events):
+        # Handle events
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.running = False
+
+    def update(self, dt):
+        for previous, rect in zip(self.previous, self.objects()):
+            previous.topleft = rect.topleft
+        ball, paddle1, paddle2 = self.objects()
+
+        # Move paddles
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_w] and paddle1.top > 0:
+            paddle1.y -= self.paddle_speed
+        if keys[pygame.K_s] and paddle1.bottom < HEIGHT:
+            paddle1.y += self.paddle_speed
+        if keys[pygame.K_UP] and paddle2.top > 0:
+            paddle2.y -= self.paddle_speed
+        if keys[pygame.K_DOWN] and paddle2.bottom < HEIGHT:
+            paddle2.y += self.paddle_speed
+
+        # Move ball
+        ball.x += self.ball_speed_x
+        ball.y += self.ball_speed_y
+
+        # Ball collision with top/bottom
+        if ball.top <= 0 or ball.bottom >= HEIGHT:
+            self.ball_speed_y *= -1
+
+        # Ball collision with paddles
+        if ball.colliderect(paddle1) or ball.colliderect(paddle2):
+            self.ball_speed_x *= -1
+            # Add slight vertical speed variation based on paddle impact point
+            self.ball_speed_y += random.uniform(-1, 1)
+
+        # Score points
+        if ball.left <= 0:
+            self.score2 += 1
+            self.reset_ball()
+        if ball.right >= WIDTH:
+            self.score1 += 1
+            self.reset_ball()
+
+    def render(self, alpha):
+        # Drawing
+        screen.fill(BLACK)
+
+        # Draw center line
+        for i in range(0, HEIGHT, HEIGHT // 20):
+            if i % 2 == 0:
+                pygame.draw.rect(screen, WHITE, (WIDTH // 2 - 2, i, 4, HEIGHT // 20))
+
+        # Draw paddles and ball where they are between the last two steps
+        ball, paddle1, paddle2 = (
+            lerp_rect(previous, rect, alpha)
+            for previous, rect in zip(self.previous, self.objects())
+        )
+        screen.blits(
+            [
+                (sprites.rect(paddle1.size, WHITE), paddle1),
+                (sprites.rect(paddle2.size, WHITE), paddle2),
+                (sprites.ellipse(ball.size, WHITE), ball),
+            ],
+            doreturn=False,
+        )
+
+        # Draw scores
+        text.draw(screen, str(self.score1), 74, WHITE, topleft=(WIDTH // 4, 20))
+        text.draw(screen, str(self.score2), 74, WHITE, topleft=(WIDTH * 3 // 4, 20))
+
+
+def main():
+    setup()
+    # Main game loop
+    GameLoop(PongGame(), step_rate=FPS, render_rate=FPS).run()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,9 @@ from typing import Dict, List, Literal, Tuple
 import pygame
 import random
 
-# Initialize Pygame
-pygame.init()
+import game_loop
+from game_profile import profiled
+from game_text import text
 
 # Constants
 BLOCK_SIZE = 30
@@ -44,6 +45,8 @@ SHAPES: Dict[ShapeCode, ShapeMask] = {
 
 
 class Tetromino:
+    __slots__ = ("x", "y", "shape_code", "shape", "color", "rotation")
+
     def __init__(self, x: int, y: int, shape_code: ShapeCode):
         self.x = x
         self.y = y
@@ -53,11 +56,9 @@ class Tetromino:
         self.rotation = 0
 
 
-class Game:
+class Game(game_loop.Game):
     def __init__(self):
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        pygame.display.set_caption("Tetris")
-        self.clock = pygame.time.Clock()
+        self.screen = game_loop.open_window((WIDTH, HEIGHT), "Tetris")
         self.grid = [[BLACK] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
         self.score = 0
         self.current_piece = self.new_piece()
@@ -65,7 +66,28 @@ class Game:
         self.game_over = False
         self.paused = False  # Pause state
         self.fall_speed = 500
-        self.last_fall = pygame.time.get_ticks()
+        # Milliseconds of unpaused play since the piece last fell.
+        self.fall_time = 0.0
+
+    @property
+    def running(self):
+        return not self.game_over
+
+    @property
+    def idle(self):
+        # Nothing moves while paused, so the loop waits for the key to resume.
+        return self.paused
+
+    def snapshot(self):
+        piece = self.current_piece
+        return (
+            self.grid,
+            (piece.shape_code, piece.x, piece.y, piece.shape),
+            self.next_piece.shape_code,
+            self.score,
+            self.fall_time,
+            self.paused,
+        )
 
     def new_piece(self):
         shape_code = random.choice(list(SHAPES.keys()))  # Randomly select a shape code
@@ -118,6 +140,7 @@ class Game:
         if lines_cleared:
             self.score += lines_cleared * 100
 
+    @profiled("draw_grid")
     def draw_grid(self):
         for y in range(GRID_HEIGHT):
             for x in range(GRID_WIDTH):
@@ -137,9 +160,9 @@ class Game:
                     pygame.draw.rect(self.screen, piece.color, rect)
 
     def draw_next_piece(self):
-        font = pygame.font.Font(None, 36)
-        text = font.render("Next:", True, WHITE)
-        self.screen.blit(text, (GRID_WIDTH * BLOCK_SIZE + 10, 50))
+        text.draw(
+            self.screen, "Next:", 36, WHITE, topleft=(GRID_WIDTH * BLOCK_SIZE + 10, 50)
+        )
 
         for i, row in enumerate(self.next_piece.shape):
             for j, cell in enumerate(row):
@@ -150,116 +173,116 @@ class Game:
                     pygame.draw.rect(self.screen, self.next_piece.color, rect)
 
     def draw_score(self):
-        font = pygame.font.Font(None, 36)
-        text = font.render(f"Score: {self.score}", True, WHITE)
-        self.screen.blit(text, (GRID_WIDTH * BLOCK_SIZE + 10, 200))
+        # Only rendered again when the score changes.
+        text.draw(
+            self.screen,
+            f"Score: {self.score}",
+            36,
+            WHITE,
+            topleft=(GRID_WIDTH * BLOCK_SIZE + 10, 200),
+        )
 
     def draw_pause(self):
-        font = pygame.font.Font(None, 48)
-        text = font.render("Paused", True, WHITE)
-        text_rect = text.get_rect(center=(WIDTH // 2, HEIGHT // 2))
-        self.screen.blit(text, text_rect)
+        text.draw(self.screen, "Paused", 48, WHITE, center=(WIDTH // 2, HEIGHT // 2))
 
     def draw_game_over(self):
-        font = pygame.font.Font(None, 48)
-        text = font.render("Game Over!", True, WHITE)
-        text_rect = text.get_rect(center=(WIDTH // 2, HEIGHT // 2))
-        self.screen.blit(text, text_rect)
+        text.draw(
+            self.screen, "Game Over!", 48, WHITE, center=(WIDTH // 2, HEIGHT // 2)
+        )
 
-    def run(self):
-        while not self.game_over:
-            self.screen.fill(BLACK)
-            current_time = pygame.time.get_ticks()
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.game_over = True
-
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_p:  # Pause on 'P' key
-                        self.paused = not self.paused
-                    if not self.paused:
-                        if event.key == pygame.K_LEFT:
-                            if self.valid_move(
-                                self.current_piece,
-                                self.current_piece.x - 1,
-                                self.current_piece.y,
-                                0,
-                            ):
-                                self.current_piece.x -= 1
-                        if event.key == pygame.K_RIGHT:
-                            if self.valid_move(
-                                self.current_piece,
-                                self.current_piece.x + 1,
-                                self.current_piece.y,
-                                0,
-                            ):
-                                self.current_piece.x += 1
-                        if event.key == pygame.K_DOWN:
-                            if self.valid_move(
-                                self.current_piece,
-                                self.current_piece.x,
-                                self.current_piece.y + 1,
-                                0,
-                            ):
-                                self.current_piece.y += 1
-                        if event.key == pygame.K_UP:
-                            if self.valid_move(
-                                self.current_piece,
-                                self.current_piece.x,
-                                self.current_piece.y,
-                                1,
-                            ):
-                                self.current_piece.shape = self.rotate_piece(
-                                    self.current_piece, 1
-                                )
-                        if event.key == pygame.K_SPACE:
-                            while self.valid_move(
-                                self.current_piece,
-                                self.current_piece.x,
-                                self.current_piece.y + 1,
-                                0,
-                            ):
-                                self.current_piece.y += 1
-                            self.lock_piece(self.current_piece)
-
-            if not self.paused:
-                # Automatic falling
-                if current_time - self.last_fall > self.fall_speed:
-                    if self.valid_move(
-                        self.current_piece,
-                        self.current_piece.x,
-                        self.current_piece.y + 1,
-                        0,
-                    ):
-                        self.current_piece.y += 1
-                        self.last_fall = current_time
-                    else:
+    def input(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.game_over = True
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_p:  # Pause on 'P' key
+                    self.paused = not self.paused
+                if not self.paused:
+                    if event.key == pygame.K_LEFT:
+                        if self.valid_move(
+                            self.current_piece,
+                            self.current_piece.x - 1,
+                            self.current_piece.y,
+                            0,
+                        ):
+                            self.current_piece.x -= 1
+                    if event.key == pygame.K_RIGHT:
+                        if self.valid_move(
+                            self.current_piece,
+                            self.current_piece.x + 1,
+                            self.current_piece.y,
+                            0,
+                        ):
+                            self.current_piece.x += 1
+                    if event.key == pygame.K_DOWN:
+                        if self.valid_move(
+                            self.current_piece,
+                            self.current_piece.x,
+                            self.current_piece.y + 1,
+                            0,
+                        ):
+                            self.current_piece.y += 1
+                    if event.key == pygame.K_UP:
+                        if self.valid_move(
+                            self.current_piece,
+                            self.current_piece.x,
+                            self.current_piece.y,
+                            1,
+                        ):
+                            self.current_piece.shape = self.rotate_piece(
+                                self.current_piece, 1
+                            )
+                    if event.key == pygame.K_SPACE:
+                        while self.valid_move(
+                            self.current_piece,
+                            self.current_piece.x,
+                            self.current_piece.y + 1,
+                            0,
+                        ):
+                            self.current_piece.y += 1
                         self.lock_piece(self.current_piece)
-                        self.last_fall = current_time
 
-            self.draw_grid()
-            self.draw_piece(self.current_piece)
-            self.draw_next_piece()
-            self.draw_score()
+    def update(self, dt: float):
+        if not self.paused:
+            # Automatic falling
+            self.fall_time += dt * 1000
+            if self.fall_time > self.fall_speed:
+                if self.valid_move(
+                    self.current_piece,
+                    self.current_piece.x,
+                    self.current_piece.y + 1,
+                    0,
+                ):
+                    self.current_piece.y += 1
+                else:
+                    self.lock_piece(self.current_piece)
+                self.fall_time = 0.0
+
+    def render(self, alpha: float):
+        self.screen.fill(BLACK)
+        self.draw_grid()
+        self.draw_piece(self.current_piece)
+        self.draw_next_piece()
+        self.draw_score()
+
+        if self.paused:
+            self.draw_pause()
+        if self.game_over:
+            self.draw_game_over()
 
-            if self.paused:
-                self.draw_pause()
-            if self.game_over:
-                self.draw_game_over()
-
-            pygame.display.flip()
-            self.clock.tick(FPS)
+    def run(self):
+        game_loop.GameLoop(self, step_rate=FPS, render_rate=FPS).run()
 
         # Wait for quit after game over
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return
+        game_loop.idle(lambda: self.render(1.0), ())
 
 
-if __name__ == "__main__":
+def main():
     game = Game()
     game.run()
     pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
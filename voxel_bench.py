@@ -0,0 +1,256 @@
+"""
+Scripted benchmark for minecraft.py. Opens VoxelGame on an offscreen buffer, streams in a
+world of the given radius, replays a recorded camera path and writes per-frame CPU time,
+scene graph and memory figures as JSON. The default software renderer (p3tinydisplay)
+runs on headless machines without a GPU.
+
+    python voxel_bench.py --radius 12 --frames 600 --out result.json
+    python voxel_bench.py --path flight.json
+    python voxel_bench.py record flight.json
+
+`record` opens the game in a normal window and saves the camera path flown until escape.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from panda3d.core import loadPrcFileData
+
+
+def configure(display, width, height):
+    """Panda3D settings for an offscreen buffer; must run before the game starts."""
+    loadPrcFileData(
+        "",
+        "\n".join(
+            [
+                "window-type offscreen",
+                f"load-display {display}",
+                f"win-size {width} {height}",
+                "audio-library-name null",
+                # Frames must run as fast as they can, not at the display's rate.
+                "sync-video false",
+                "notify-level warning",
+            ]
+        ),
+    )
+
+
+def orbit_path(center, radius, height, frames):
+    """A camera path circling center once, looking along the direction of travel."""
+    poses = []
+    for frame in range(frames):
+        angle = 2 * math.pi * frame / frames
+        x = center[0] + radius * math.cos(angle)
+        y = center[1] + radius * math.sin(angle)
+        # Heading 0 looks down +y; face along the tangent of the circle.
+        heading = math.degrees(angle)
+        poses.append([x, y, height, heading, -15.0, 0.0])
+    return poses
+
+
+def load_path(path):
+    with open(path) as file:
+        return json.load(file)["poses"]
+
+
+def save_path(path, poses):
+    with open(path, "w") as file:
+        json.dump({"poses": poses}, file)
+
+
+def visible_geometry(game):
+    """
+    Returns (draw calls, triangles) for the chunk meshes inside the camera's view.
+    Each mesh is a single Geom, so this matches the draw calls the cull pass issues.
+    """
+    lens_bounds = game.camLens.makeBounds()
+    draw_calls = 0
+    triangles = 0
+    for node in game.remesher.nodes.values():
+        if node.isStashed():
+            continue
+        bounds = node.node().getBounds().makeCopy()
+        bounds.xform(node.getMat(game.cam))
+        if not lens_bounds.contains(bounds):
+            continue
+        for geom in node.node().getGeoms():
+            draw_calls += 1
+            triangles += sum(
+                primitive.getNumPrimitives() for primitive in geom.getPrimitives()
+            )
+    return draw_calls, triangles
+
+
+def resident_bytes():
+    """Resident set size of this process, on Linux."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(args):
+    configure(args.display, *args.size)
+    # Imported after configuring, so the game opens the offscreen buffer.
+    from minecraft import VoxelGame
+    from voxel_terrain import surface_height
+    from voxel_world import BLOCK_SPACING
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    # A fresh world every run, so saved edits from playing don't skew the numbers.
+    world_dir = tempfile.TemporaryDirectory(prefix="voxel-bench-")
+    game = VoxelGame(seed=args.seed, view_radius=args.radius, world_dir=world_dir.name)
+    # The camera follows the path instead of the keyboard and mouse.
+    game.taskMgr.remove("updateCamera")
+
+    if args.path:
+        poses = load_path(args.path)
+    else:
+        height = (surface_height(args.seed, 0, 0) + 20) * BLOCK_SPACING
+        poses = orbit_path((0, 0), 40 * BLOCK_SPACING, height, args.frames)
+    game.camera.setPosHpr(*poses[0])
+
+    # Stream the world in around the first pose before measuring anything.
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.load_timeout:
+        game.taskMgr.step()
+        remesh = game.remesher.stats()
+        if not (
+            game.streamer.queue_depth()
+            or game.light.unlit
+            or remesh["queued"]
+            or remesh["building"]
+        ):
+            break
+    load = {
+        "seconds": time.perf_counter() - start,
+        "chunks": len(game.world.chunks),
+        "meshes": len(game.remesher.nodes),
+    }
+
+    frames = []
+    for index, pose in enumerate(poses[: args.frames]):
+        game.camera.setPosHpr(*pose)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        game.taskMgr.step()
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        draw_calls, triangles = visible_geometry(game)
+        frame = {
+            "frame": index,
+            "cpu_ms": cpu * 1000,
+            "wall_ms": wall * 1000,
+            "nodes": game.render.countNumDescendants(),
+            "draw_calls": draw_calls,
+            "triangles": triangles,
+            "python_blocks": sys.getallocatedblocks(),
+            "rss_bytes": resident_bytes(),
+        }
+        if args.tracemalloc:
+            frame["python_heap_bytes"] = tracemalloc.get_traced_memory()[0]
+        frames.append(frame)
+
+    game.closeWorld()
+    game.destroy()
+    world_dir.cleanup()
+
+    summary = {}
+    for name in ("cpu_ms", "wall_ms", "draw_calls", "triangles"):
+        values = [frame[name] for frame in frames]
+        summary[name] = {
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "max": max(values),
+        }
+    summary["peak_rss_bytes"] = max(frame["rss_bytes"] or 0 for frame in frames)
+    return {
+        "config": {
+            "seed": args.seed,
+            "radius": args.radius,
+            "frames": len(frames),
+            "path": args.path,
+            "display": args.display,
+            "size": args.size,
+        },
+        "load": load,
+        "summary": summary,
+        "frames": frames,
+    }
+
+
+def record(path):
+    """Plays the game in a window, saving the camera pose of every frame to path."""
+    from minecraft import VoxelGame
+
+    game = VoxelGame()
+    poses = []
+
+    def record_pose(task):
+        poses.append([*game.camera.getPos(), *game.camera.getHpr()])
+        return task.cont
+
+    def save_and_quit():
+        save_path(path, poses)
+        game.quit()
+
+    game.taskMgr.add(record_pose, "recordPose", sort=1)
+    game.accept("escape", save_and_quit)
+    game.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", nargs="?", choices=["run", "record"], default="run")
+    parser.add_argument("file", nargs="?", help="camera path to write when recording")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--radius", type=int, default=8, help="view radius in chunks")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--path", help="recorded camera path to replay")
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    parser.add_argument("--display", default="p3tinydisplay")
+    parser.add_argument("--load-timeout", type=float, default=600)
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="also trace Python heap bytes"
+    )
+    parser.add_argument("--out", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if not args.file:
+            parser.error("record needs a file to write the camera path to")
+        record(args.file)
+        return
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as file:
+            file.write(text)
+        summary = result["summary"]
+        print(
+            f"{result['config']['frames']} frames, cpu p50 {summary['cpu_ms']['p50']:.1f} ms"
+            f" p95 {summary['cpu_ms']['p95']:.1f} ms,"
+            f" draw calls p50 {summary['draw_calls']['p50']},"
+            f" triangles p50 {summary['triangles']['p50']}"
+        )
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
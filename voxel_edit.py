@@ -0,0 +1,344 @@
+"""
+Bulk edits over boxes and spheres of blocks: fill, clear, replace and clipboard copy and
+paste, each written chunk by chunk as whole arrays, with undo and redo.
+"""
+
+import json
+import time
+
+import numpy as np
+
+from voxel_palette import PalettedBlocks
+from voxel_world import (
+    AIR,
+    BLOCK_DTYPE,
+    BRICK,
+    CHUNK_LAYERS,
+    CHUNK_SIZE,
+    STONE,
+    WORLD_HEIGHT,
+    chunk_key,
+    chunk_origin,
+)
+
+
+class Box:
+    """The blocks from lo up to but not including hi, in voxel coordinates."""
+
+    def __init__(self, lo, hi):
+        self.lo = tuple(int(c) for c in lo)
+        self.hi = tuple(int(c) for c in hi)
+
+    def bounds(self):
+        return self.lo, self.hi
+
+    def mask(self, lo, hi):
+        """Returns which blocks of the box lo..hi (inside the bounds) are in the shape."""
+        return np.ones([b - a for a, b in zip(lo, hi)], dtype=bool)
+
+
+class Sphere:
+    """The blocks whose centres are within radius of center, in voxel coordinates."""
+
+    def __init__(self, center, radius):
+        self.center = tuple(center)
+        self.radius = radius
+
+    def bounds(self):
+        lo = tuple(int(np.ceil(c - self.radius)) for c in self.center)
+        hi = tuple(int(np.floor(c + self.radius)) + 1 for c in self.center)
+        return lo, hi
+
+    def mask(self, lo, hi):
+        xs, ys, zs = np.ogrid[lo[0] : hi[0], lo[1] : hi[1], lo[2] : hi[2]]
+        cx, cy, cz = self.center
+        return (xs - cx) ** 2 + (ys - cy) ** 2 + (zs - cz) ** 2 <= self.radius**2
+
+
+class Clipboard:
+    """Blocks copied out of the world, relative to the lowest corner of their bounds."""
+
+    def __init__(self, blocks, mask):
+        self.blocks = blocks
+        # Which blocks belong to the copied shape; the rest are left alone on paste.
+        self.mask = mask
+
+    @property
+    def size(self):
+        return self.blocks.shape
+
+
+class ChunkDelta:
+    """
+    The blocks one edit changed in one chunk: a bitmask of the changed positions and
+    their values before and after, each stored as a single id when it is the same for
+    every changed block, as it is for fills and clears of uniform ground.
+    """
+
+    __slots__ = ("key", "changed", "old", "new")
+
+    def __init__(self, key, changed, old, new):
+        self.key = key
+        self.changed = np.packbits(changed.reshape(-1))
+        self.old = _compact(old)
+        self.new = _compact(new)
+
+    def positions(self):
+        return np.flatnonzero(np.unpackbits(self.changed))
+
+    @property
+    def nbytes(self):
+        values = sum(
+            v.nbytes if isinstance(v, np.ndarray) else 2 for v in (self.old, self.new)
+        )
+        return self.changed.nbytes + values
+
+
+def _compact(values):
+    if len(values) and (values == values[0]).all():
+        return int(values[0])
+    return values
+
+
+class EditHistory:
+    """Undo and redo stacks of edits, each a list of ChunkDeltas."""
+
+    def __init__(self, limit=64):
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def record(self, deltas):
+        if not deltas:
+            return
+        self.undo_stack.append(deltas)
+        del self.undo_stack[: -self.limit]
+        self.redo_stack.clear()
+
+    @property
+    def nbytes(self):
+        return sum(
+            delta.nbytes
+            for stack in (self.undo_stack, self.redo_stack)
+            for deltas in stack
+            for delta in deltas
+        )
+
+
+class WorldEditor:
+    """
+    Applies bulk edits to a VoxelWorld. Every chunk an edit touches is decompressed
+    once, written with array operations, compressed again and marked dirty once, so
+    an edit costs a few array passes per chunk however many blocks it changes.
+
+    Chunks an edit reaches that aren't loaded are loaded with load_chunk(key), which
+    should add them to the world, or skipped if it is None. Every edit returns the keys
+    of the loaded chunks whose meshes it affects, for the caller to queue for remeshing.
+    If light is set to a LightEngine, it relights the edited area too.
+    """
+
+    def __init__(self, world, load_chunk=None, history_limit=64):
+        self.world = world
+        self.load_chunk = load_chunk
+        self.history = EditHistory(history_limit)
+        self.clipboard = None
+        self.light = None
+        # Duration in milliseconds and number of changed chunks of the last edit.
+        self.last_edit_ms = 0.0
+        self.last_edit_chunks = 0
+
+    def fill(self, shape, block):
+        """Sets every block in the shape to block."""
+        return self._edit(
+            shape.bounds(), lambda lo, hi, old: (shape.mask(lo, hi), block)
+        )
+
+    def clear(self, shape):
+        """Empties every block in the shape."""
+        return self.fill(shape, AIR)
+
+    def replace(self, shape, old_block, new_block):
+        """Sets the blocks in the shape that are old_block to new_block."""
+        return self._edit(
+            shape.bounds(),
+            lambda lo, hi, old: (shape.mask(lo, hi) & (old == old_block), new_block),
+        )
+
+    def copy(self, shape):
+        """Copies the blocks in the shape to the clipboard."""
+        lo, hi = shape.bounds()
+        blocks = np.zeros([b - a for a, b in zip(lo, hi)], dtype=BLOCK_DTYPE)
+        for key, chunk_lo, chunk_hi in _chunk_boxes(lo, hi):
+            chunk = self.world.chunks.get(key)
+            if chunk is None:
+                continue
+            local = _local_slices(key, chunk_lo, chunk_hi)
+            target = tuple(
+                slice(a - o, b - o) for a, b, o in zip(chunk_lo, chunk_hi, lo)
+            )
+            blocks[target] = chunk.blocks.to_array()[local]
+        self.clipboard = Clipboard(blocks, shape.mask(lo, hi))
+        return self.clipboard
+
+    def paste(self, origin, clipboard=None, skip_air=True):
+        """
+        Writes the clipboard with its lowest corner at origin. With skip_air, empty
+        blocks in the clipboard leave the world's blocks as they are.
+        """
+        clipboard = clipboard or self.clipboard
+        if clipboard is None:
+            return set()
+        origin = tuple(int(c) for c in origin)
+        hi = tuple(o + s for o, s in zip(origin, clipboard.size))
+
+        def values(lo, hi, old):
+            source = tuple(slice(a - o, b - o) for a, b, o in zip(lo, hi, origin))
+            mask = clipboard.mask[source]
+            if skip_air:
+                mask = mask & (clipboard.blocks[source] != AIR)
+            return mask, clipboard.blocks[source]
+
+        return self._edit((origin, hi), values)
+
+    def undo(self):
+        """Reverts the last edit. Returns the affected chunk keys."""
+        if not self.history.undo_stack:
+            return set()
+        deltas = self.history.undo_stack.pop()
+        self.history.redo_stack.append(deltas)
+        return self._restore(deltas, "old")
+
+    def redo(self):
+        """Applies the last undone edit again. Returns the affected chunk keys."""
+        if not self.history.redo_stack:
+            return set()
+        deltas = self.history.redo_stack.pop()
+        self.history.undo_stack.append(deltas)
+        return self._restore(deltas, "new")
+
+    def _chunk(self, key):
+        chunk = self.world.chunks.get(key)
+        if chunk is None and self.load_chunk is not None:
+            chunk = self.load_chunk(key)
+        return chunk
+
+    def _edit(self, bounds, values):
+        """
+        Runs values(lo, hi, old) for every chunk's part of bounds, where old holds the
+        current blocks of that part; it returns (mask, new) and the masked blocks are
+        set to new, an id or an array of old's shape.
+        """
+        start = time.perf_counter()
+        deltas = []
+        affected = set()
+        for key, lo, hi in _chunk_boxes(*bounds):
+            chunk = self._chunk(key)
+            if chunk is None:
+                continue
+            blocks = chunk.blocks.to_array()
+            local = _local_slices(key, lo, hi)
+            old = blocks[local]
+            mask, new = values(lo, hi, old)
+            new = np.broadcast_to(np.asarray(new, dtype=BLOCK_DTYPE), old.shape)
+            changed = mask & (old != new)
+            if not changed.any():
+                continue
+            before = old[changed]
+            old[changed] = new[changed]
+            full = np.zeros(blocks.shape, dtype=bool)
+            full[local] = changed
+            deltas.append(ChunkDelta(key, full, before, blocks[full]))
+            self._store(chunk, blocks)
+            affected.update(self.world.affected_chunks(key, full))
+        if self.light is not None and deltas:
+            affected |= self.light.update(deltas)
+        self.history.record(deltas)
+        self.last_edit_ms = (time.perf_counter() - start) * 1000
+        self.last_edit_chunks = len(deltas)
+        return affected
+
+    def _restore(self, deltas, side):
+        start = time.perf_counter()
+        affected = set()
+        for delta in deltas:
+            chunk = self._chunk(delta.key)
+            if chunk is None:
+                continue
+            blocks = chunk.blocks.to_array()
+            blocks.reshape(-1)[delta.positions()] = getattr(delta, side)
+            self._store(chunk, blocks)
+            changed = np.unpackbits(delta.changed).astype(bool).reshape(blocks.shape)
+            affected.update(self.world.affected_chunks(delta.key, changed))
+        if self.light is not None and deltas:
+            affected |= self.light.update(deltas)
+        self.last_edit_ms = (time.perf_counter() - start) * 1000
+        self.last_edit_chunks = len(deltas)
+        return affected
+
+    def _store(self, chunk, blocks):
+        chunk.blocks = PalettedBlocks.from_array(blocks)
+        chunk.version += 1
+        chunk.dirty = True
+
+
+def _chunk_boxes(lo, hi):
+    """Yields (key, lo, hi) for each chunk the box overlaps, clipped to the chunk."""
+    lo = (lo[0], lo[1], max(lo[2], 0))
+    hi = (hi[0], hi[1], min(hi[2], WORLD_HEIGHT))
+    if any(a >= b for a, b in zip(lo, hi)):
+        return
+    first = chunk_key(*lo)
+    last = chunk_key(*(c - 1 for c in hi))
+    for cx in range(first[0], last[0] + 1):
+        for cy in range(first[1], last[1] + 1):
+            for cz in range(first[2], min(last[2], CHUNK_LAYERS - 1) + 1):
+                key = (cx, cy, cz)
+                origin = chunk_origin(key)
+                yield (
+                    key,
+                    tuple(max(a, o) for a, o in zip(lo, origin)),
+                    tuple(min(b, o + CHUNK_SIZE) for b, o in zip(hi, origin)),
+                )
+
+
+def _local_slices(key, lo, hi):
+    origin = chunk_origin(key)
+    return tuple(slice(a - o, b - o) for a, b, o in zip(lo, hi, origin))
+
+
+def benchmark(seed=0, size=100):
+    """Times bulk edits of a size^3 box (clipped to the world height) on terrain."""
+    from voxel_terrain import generate_chunk
+    from voxel_world import Chunk, VoxelWorld
+
+    world = VoxelWorld()
+
+    def load_chunk(key):
+        chunk = Chunk(*generate_chunk(seed, key))
+        world.add_chunk(chunk)
+        return chunk
+
+    editor = WorldEditor(world, load_chunk)
+    box = Box((0, 0, 0), (size, size, size))
+    # Load the chunks up front so only the edits are timed.
+    for key, _, _ in _chunk_boxes((0, 0, 0), (size * 2, size, size)):
+        load_chunk(key)
+    results = {"chunks": len(world.chunks)}
+    for name, edit in (
+        ("fill", lambda: editor.fill(box, STONE)),
+        ("replace", lambda: editor.replace(box, STONE, BRICK)),
+        ("clear_sphere", lambda: editor.clear(Sphere((size / 2,) * 3, size / 2))),
+        ("copy", lambda: editor.copy(box)),
+        ("paste", lambda: editor.paste((size, 0, 0))),
+        ("undo", editor.undo),
+        ("redo", editor.redo),
+    ):
+        start = time.perf_counter()
+        edit()
+        results[f"{name}_ms"] = (time.perf_counter() - start) * 1000
+    results["history_bytes"] = editor.history.nbytes
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,461 @@
+"""
+Sky light and block light, 0-15 per voxel, kept up to date as chunks load and blocks
+change, and read by the mesher to shade faces.
+
+Light spreads from voxel to face neighbour losing one level per step, and only through
+air. Sky light enters from above the world at full strength and falls straight down
+without losing any; block light starts at the emission of blocks like lamps.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+from voxel_world import (
+    AIR,
+    BLOCK_EMISSION,
+    CHUNK_LAYERS,
+    CHUNK_SIZE,
+    NEIGHBOUR_OFFSETS,
+    WORLD_HEIGHT,
+    pad_array,
+)
+
+MAX_LIGHT = 15
+
+# Brightness of a face lit to each level: every level below full is 20% darker, with a
+# little ambient light so caves aren't pitch black.
+LIGHT_CURVE = (0.08 + 0.92 * 0.8 ** (MAX_LIGHT - np.arange(MAX_LIGHT + 1))).astype(
+    np.float32
+)
+
+# Full sky and block light, packed as in Chunk.light.
+FULL_LIGHT = np.uint8(MAX_LIGHT << 4 | MAX_LIGHT)
+
+
+def unpack_light(chunk):
+    """Returns a lit chunk's (sky, block) light levels as two uint8 arrays."""
+    packed = chunk.light
+    if not isinstance(packed, np.ndarray):
+        packed = np.full((CHUNK_SIZE,) * 3, packed or 0, dtype=np.uint8)
+    return packed >> 4, packed & 0x0F
+
+
+def pack_light(chunk, sky, block):
+    """Stores light levels in a chunk, as a single int when they're all the same."""
+    packed = (sky << 4) | block
+    first = packed.flat[0]
+    chunk.light = int(first) if (packed == first).all() else packed
+
+
+def light_levels(world, key):
+    """
+    Returns the brightest of sky and block light for a chunk and a one voxel border
+    around it (see pad_array). Voxels in missing or unlit chunks read as fully lit.
+    """
+
+    def packed(chunk):
+        if chunk is None or chunk.light is None:
+            return None
+        if not isinstance(chunk.light, np.ndarray):
+            # Evenly lit, as most chunks are: a read-only view of one value.
+            return np.broadcast_to(np.uint8(chunk.light), (CHUNK_SIZE,) * 3)
+        return chunk.light
+
+    neighbours = [
+        packed(world.chunks.get((key[0] + dx, key[1] + dy, key[2] + dz)))
+        for dx, dy, dz in NEIGHBOUR_OFFSETS
+    ]
+    center = packed(world.chunks[key])
+    if center is None:
+        center = np.broadcast_to(FULL_LIGHT, (CHUNK_SIZE,) * 3)
+    # Padding the packed levels only copies the neighbours' boundary layers, which are
+    # then unpacked along with the chunk.
+    padded = pad_array(center, neighbours, FULL_LIGHT)
+    return np.maximum(padded >> 4, padded & 0x0F)
+
+
+def relax(sky, block, transparent):
+    """
+    Spreads light through the inner voxels of arrays with a one voxel border, which is
+    left as it is and so lets light flow in from outside. Light only ever grows.
+    """
+    inner = (slice(1, -1),) * 3
+    free = transparent[inner]
+    for _ in range(MAX_LIGHT):
+        grew = False
+        for light in (sky, block):
+            brightest = np.maximum.reduce(
+                [
+                    light[2:, 1:-1, 1:-1],
+                    light[:-2, 1:-1, 1:-1],
+                    light[1:-1, 2:, 1:-1],
+                    light[1:-1, :-2, 1:-1],
+                    light[1:-1, 1:-1, 2:],
+                    light[1:-1, 1:-1, :-2],
+                ]
+            )
+            spread = np.where(free, np.maximum(brightest, 1) - 1, 0).astype(np.uint8)
+            current = light[inner]
+            if (spread > current).any():
+                np.maximum(current, spread, out=current)
+                grew = True
+        if not grew:
+            return
+
+
+class LightWindow:
+    """
+    Dense copies of the blocks and light of chunk columns x0 <= cx < x1, y0 <= cy < y1
+    over the full world height, with a one voxel border. The horizontal border holds the
+    neighbouring columns' boundary voxels if ring is set and nothing otherwise; above
+    the world is full sky light. Unloaded chunks are treated as solid and left alone.
+    """
+
+    def __init__(self, world, x0, y0, x1, y1, ring=True):
+        self.world = world
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        shape = (
+            (x1 - x0) * CHUNK_SIZE + 2,
+            (y1 - y0) * CHUNK_SIZE + 2,
+            WORLD_HEIGHT + 2,
+        )
+        self.transparent = np.zeros(shape, dtype=bool)
+        self.emission = np.zeros(shape, dtype=np.uint8)
+        self.sky = np.zeros(shape, dtype=np.uint8)
+        self.block = np.zeros(shape, dtype=np.uint8)
+        self.sky[:, :, -1] = MAX_LIGHT
+        # Chunks inside the window, which store() writes back.
+        self.chunks = {}
+        for cx in range(x0, x1):
+            for cy in range(y0, y1):
+                for cz in range(CHUNK_LAYERS):
+                    chunk = world.chunks.get((cx, cy, cz))
+                    if chunk is None:
+                        continue
+                    self.chunks[chunk.key] = chunk
+                    box = self.slices(chunk.key)
+                    blocks = chunk.blocks.to_array()
+                    self.transparent[box] = blocks == AIR
+                    self.emission[box] = BLOCK_EMISSION[blocks]
+                    if chunk.light is not None:
+                        self.sky[box], self.block[box] = unpack_light(chunk)
+        if ring:
+            self._load_ring()
+
+    def slices(self, key):
+        """Returns the window slices covering a chunk."""
+        return (
+            self._span(key[0], self.x0),
+            self._span(key[1], self.y0),
+            self._span(key[2], 0),
+        )
+
+    def _span(self, c, c0):
+        start = (c - c0) * CHUNK_SIZE + 1
+        return slice(start, start + CHUNK_SIZE)
+
+    def _ring(self):
+        # Yields (outside chunk key, its boundary layer, the window border holding that
+        # layer, the window voxels just inside the border) for the chunks beside the
+        # window's four sides.
+        first, second = slice(0, 1), slice(1, 2)
+        last, second_last = slice(-1, None), slice(-2, -1)
+        every = slice(None)
+        for cz in range(CHUNK_LAYERS):
+            z = self._span(cz, 0)
+            for cy in range(self.y0, self.y1):
+                y = self._span(cy, self.y0)
+                yield (self.x0 - 1, cy, cz), (last,), (first, y, z), (second, y, z)
+                yield (self.x1, cy, cz), (first,), (last, y, z), (second_last, y, z)
+            for cx in range(self.x0, self.x1):
+                x = self._span(cx, self.x0)
+                low, high = (cx, self.y0 - 1, cz), (cx, self.y1, cz)
+                yield low, (every, last), (x, first, z), (x, second, z)
+                yield high, (every, first), (x, last, z), (x, second_last, z)
+
+    def _load_ring(self):
+        for key, layer, border, _ in self._ring():
+            chunk = self.world.chunks.get(key)
+            if chunk is None or chunk.light is None:
+                continue
+            self.transparent[border] = chunk.blocks.to_array()[layer] == AIR
+            sky, block = unpack_light(chunk)
+            self.sky[border], self.block[border] = sky[layer], block[layer]
+
+    def reset(self, keys):
+        """Clears the light of chunks in the window down to their own emission."""
+        for key in keys:
+            box = self.slices(key)
+            self.sky[box] = 0
+            self.block[box] = self.emission[box]
+
+    def light_sky(self):
+        """Lights every voxel with nothing but air above it to full sky light."""
+        inner = self.transparent[1:-1, 1:-1, 1:-1]
+        open_sky = np.cumprod(inner[:, :, ::-1], axis=2, dtype=bool)[:, :, ::-1]
+        sky = self.sky[1:-1, 1:-1, 1:-1]
+        sky[open_sky] = MAX_LIGHT
+
+    def relax(self):
+        # Light stays in solid blocks that give it off, but spreads only through air.
+        relax(self.sky, self.block, self.transparent)
+
+    def store(self):
+        """
+        Writes the light back to the window's chunks. Returns the keys of the chunks
+        whose meshes the changes affect.
+        """
+        affected = set()
+        for key, chunk in self.chunks.items():
+            box = self.slices(key)
+            sky, block = self.sky[box], self.block[box]
+            if chunk.light is None:
+                changed = np.ones(sky.shape, dtype=bool)
+            else:
+                old_sky, old_block = unpack_light(chunk)
+                changed = (old_sky != sky) | (old_block != block)
+                if not changed.any():
+                    continue
+            pack_light(chunk, sky, block)
+            affected.update(self.world.affected_chunks(key, changed))
+        return affected
+
+    def outflow(self):
+        """
+        Returns the columns beside the window whose light would grow from this window's
+        light, found by comparing the ring with the voxels just inside it.
+        """
+        columns = set()
+        for key, _, border, inside in self._ring():
+            if key[:2] in columns or key not in self.world.chunks:
+                continue
+            receives = self.transparent[border]
+            for light in (self.sky, self.block):
+                if (
+                    (light[inside].astype(np.int16) - 1 > light[border]) & receives
+                ).any():
+                    columns.add(key[:2])
+        return columns
+
+
+class LightEngine:
+    """
+    Lights chunks as they load and relights the area around edits. A single changed
+    block is handled with the usual flood fill pair: a removal pass clearing the light
+    that came through it, then an add pass filling back in from the remaining sources,
+    both limited to the voxels whose light actually changes. Bulk edits and loads relax
+    whole chunk columns with array operations instead. Loaded chunks wait in a queue of
+    columns, lit a few at a time within a time budget per frame.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        # How the last edit was relit ("flood" or "relax"), in how many milliseconds,
+        # and how many chunks' light changed.
+        self.last_edit_mode = None
+        self.last_edit_ms = 0.0
+        self.last_edit_chunks = 0
+        self.last_load_ms = 0.0
+        # Loaded chunks waiting for light, and the columns still to relax for them.
+        self.unlit = set()
+        self.columns = deque()
+        self.queued = set()
+        # Running average of the seconds relaxing a column takes.
+        self.column_seconds = 0.0
+
+    def light_chunks(self, keys, budget=None):
+        """
+        Queues newly loaded chunks for lighting, then relaxes queued columns for up to
+        budget seconds, or until none are left if budget is None. Returns the keys of
+        the loaded chunks now lit, which can be meshed, and of the other chunks whose
+        light changed, which need remeshing.
+
+        A column can't be relaxed in parts, so one is relaxed if any of the budget is
+        left, and more only while another is expected to fit; a frame whose budget is
+        already spent relaxes none.
+        """
+        start = time.perf_counter()
+        self.unlit.update(keys)
+        self._queue(sorted({key[:2] for key in keys}))
+        deadline = None if budget is None else start + budget
+        affected = set()
+        lit = set()
+        relaxed = 0
+        while self.columns:
+            now = time.perf_counter()
+            if deadline is not None and (
+                now >= deadline or relaxed and now + self.column_seconds > deadline
+            ):
+                break
+            column = self.columns.popleft()
+            self.queued.discard(column)
+            changed, outflow = self._relax_column(column)
+            affected |= changed
+            self._queue(outflow)
+            relaxed += 1
+            seconds = time.perf_counter() - now
+            self.column_seconds += (seconds - self.column_seconds) * 0.2
+            # Unlit chunks keep their column queued, so they are all lit, or found
+            # unloaded, once it has been relaxed.
+            for cz in range(CHUNK_LAYERS):
+                key = (*column, cz)
+                if key in self.unlit:
+                    self.unlit.discard(key)
+                    if key in self.world.chunks:
+                        lit.add(key)
+        self.last_load_ms = (time.perf_counter() - start) * 1000
+        return lit, affected - lit
+
+    def _queue(self, columns):
+        for column in columns:
+            if column not in self.queued:
+                self.columns.append(column)
+                self.queued.add(column)
+
+    def _relax_column(self, column):
+        # Unlit chunks start dark and lit ones keep their light, which can only grow, so
+        # relaxing columns until no light flows out of them always settles. Returns the
+        # chunks whose light changed and the neighbouring columns light flows into.
+        window = LightWindow(self.world, *column, column[0] + 1, column[1] + 1)
+        window.reset(key for key, chunk in window.chunks.items() if chunk.light is None)
+        window.light_sky()
+        window.relax()
+        return window.store(), window.outflow()
+
+    def _spread(self, columns):
+        # Relaxes one chunk column at a time, moving on to the neighbouring columns
+        # while light keeps flowing into them.
+        affected = set()
+        columns = deque(sorted(columns))
+        queued = set(columns)
+        while columns:
+            column = columns.popleft()
+            queued.discard(column)
+            changed, outflow = self._relax_column(column)
+            affected |= changed
+            for neighbour in outflow - queued:
+                columns.append(neighbour)
+                queued.add(neighbour)
+        return affected
+
+    def update(self, deltas):
+        """
+        Relights after an edit, given its ChunkDeltas (see voxel_edit.py). Returns the
+        keys of the chunks whose light changed, and so need remeshing.
+        """
+        start = time.perf_counter()
+        changed = [(delta.key, delta.positions()) for delta in deltas]
+        if len(changed) == 1 and len(changed[0][1]) == 1:
+            key, positions = changed[0]
+            local = np.unravel_index(positions[0], (CHUNK_SIZE,) * 3)
+            affected = self._flood(key, tuple(int(c) for c in local))
+            self.last_edit_mode = "flood"
+        else:
+            affected = self._relax_area({key for key, _ in changed})
+            self.last_edit_mode = "relax"
+        self.last_edit_ms = (time.perf_counter() - start) * 1000
+        self.last_edit_chunks = len(affected)
+        return affected
+
+    def _relax_area(self, keys):
+        # Light reaches at most MAX_LIGHT - 1 blocks sideways, so the light outside the
+        # changed columns and their neighbours can't have come through the changes.
+        xs = [key[0] for key in keys]
+        ys = [key[1] for key in keys]
+        window = LightWindow(
+            self.world, min(xs) - 1, min(ys) - 1, max(xs) + 2, max(ys) + 2
+        )
+        window.reset(window.chunks)
+        window.light_sky()
+        window.relax()
+        affected = window.store()
+        # The window's own light is exact, but light may still flow out of it into
+        # columns that were lit while these ones weren't.
+        return affected | self._spread(window.outflow())
+
+    def _flood(self, key, local):
+        window = LightWindow(
+            self.world, key[0] - 1, key[1] - 1, key[0] + 2, key[1] + 2, ring=False
+        )
+        if any(chunk.light is None for chunk in window.chunks.values()):
+            return self._relax_area({key})
+        shape = window.sky.shape
+        start = np.ravel_multi_index(
+            tuple(s.start + c for s, c in zip(window.slices(key), local)), shape
+        )
+        # Plain bytearrays index several times faster than numpy arrays one at a time.
+        transparent = bytearray(window.transparent.tobytes())
+        # The border is all solid, so the walk below never steps outside the window.
+        sky = bytearray(window.sky.tobytes())
+        block = bytearray(window.block.tobytes())
+        emission = window.emission.reshape(-1)[start]
+        x_step = shape[1] * shape[2]
+        y_step = shape[2]
+        steps = (x_step, -x_step, y_step, -y_step, 1, -1)
+        for light, is_sky in ((sky, True), (block, False)):
+            _flood_light(
+                light, transparent, start, steps, is_sky, 0 if is_sky else emission
+            )
+        window.sky = np.frombuffer(sky, dtype=np.uint8).reshape(shape).copy()
+        window.block = np.frombuffer(block, dtype=np.uint8).reshape(shape).copy()
+        return window.store()
+
+    def stats(self):
+        return {
+            "last_edit_mode": self.last_edit_mode,
+            "last_edit_ms": self.last_edit_ms,
+            "last_edit_chunks": self.last_edit_chunks,
+            "last_load_ms": self.last_load_ms,
+            "unlit": len(self.unlit),
+        }
+
+
+def _flood_light(light, transparent, start, steps, is_sky, emission):
+    """
+    Updates one light channel, stored flat in light, after the block at index start
+    changed. steps are the index offsets to the six neighbours, with -1 pointing down.
+    """
+    remove = deque()
+    add = deque()
+    if light[start]:
+        remove.append((start, light[start]))
+        light[start] = 0
+    # Clear everything lit through the changed voxel, keeping the voxels lit some
+    # other way as sources for refilling.
+    while remove:
+        index, level = remove.popleft()
+        for step in steps:
+            neighbour = index + step
+            neighbour_level = light[neighbour]
+            if not neighbour_level:
+                continue
+            falling_sky = is_sky and step == -1 and level == MAX_LIGHT
+            if transparent[neighbour] and (neighbour_level < level or falling_sky):
+                light[neighbour] = 0
+                remove.append((neighbour, neighbour_level))
+            else:
+                add.append(neighbour)
+    if emission:
+        light[start] = emission
+        add.append(start)
+    if transparent[start]:
+        add.extend(start + step for step in steps)
+    # Refill from the sources.
+    while add:
+        index = add.popleft()
+        level = light[index]
+        if level <= 1:
+            continue
+        for step in steps:
+            neighbour = index + step
+            if not transparent[neighbour]:
+                continue
+            if is_sky and step == -1 and level == MAX_LIGHT:
+                spread = MAX_LIGHT
+            else:
+                spread = level - 1
+            if light[neighbour] < spread:
+                light[neighbour] = spread
+                add.append(neighbour)
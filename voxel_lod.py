@@ -0,0 +1,254 @@
+"""
+Chooses which meshes draw the world around the camera: full detail chunks close by and
+merged, downsampled cells further out (see voxel_mesh.py), plus chunk-level occlusion
+culling of the full detail chunks hidden behind solid neighbours.
+"""
+
+import math
+
+from voxel_mesh import mesh_chunks
+from voxel_world import BLOCK_SPACING, CHUNK_LAYERS, CHUNK_SIZE, NEIGHBOUR_OFFSETS
+
+# Columns closer than LOD_DISTANCES[0] chunks are drawn at full detail, those closer
+# than LOD_DISTANCES[1] as level 1 cells, and so on; the rest use the coarsest level.
+LOD_DISTANCES = (3, 6, 12)
+
+
+def mesh_columns(key):
+    """Returns the chunk columns a mesh covers."""
+    return {chunk[:2] for chunk in mesh_chunks(key)}
+
+
+class LodSelector:
+    """
+    Keeps a quadtree of meshes over every chunk column within radius of the camera,
+    finer the closer the column is, and tells the RemeshQueue which meshes to build.
+
+    When the camera moves, a mesh that is no longer selected stays on screen until
+    every mesh replacing it has been built, so switching levels never leaves a hole.
+    """
+
+    def __init__(self, world, remesher, radius, distances=LOD_DISTANCES):
+        self.world = world
+        self.remesher = remesher
+        self.radius = radius
+        self.distances = distances
+        remesher.is_wanted = self.is_wanted
+        remesher.on_ready = self._on_ready
+        # Keys are chunk columns (cx, cy) and values the (level, x, y) cell drawing them.
+        self.column_keys = {}
+        self.selected = set()
+        # Selected meshes that haven't been built yet.
+        self.pending = set()
+        # Keys are meshes on their way out and values the pending meshes they wait for;
+        # `covers` maps the other way round.
+        self.retiring = {}
+        self.covers = {}
+        self.column = None
+        self.camera_chunk = None
+
+    def is_wanted(self, key):
+        return key in self.selected or key in self.retiring
+
+    def update(self, position, loaded=(), unloaded=()):
+        """
+        Follows the camera at position (in world units) and queues the meshes that
+        chunks loaded or unloaded this frame belong to.
+        """
+        center = tuple((c / BLOCK_SPACING + 0.5) / CHUNK_SIZE for c in position)
+        self.remesher.set_center(center)
+        camera_chunk = tuple(math.floor(c) for c in center)
+        if camera_chunk[:2] != self.column:
+            self._select(camera_chunk[:2])
+        for key in unloaded:
+            mesh = (0, *key)
+            if mesh not in self.selected:
+                self._drop(mesh)
+        # Unloaded chunks are rebuilt too, so cells reaching past them drop them.
+        self.request_chunks([*loaded, *unloaded], neighbours=True)
+        if camera_chunk != self.camera_chunk:
+            self.camera_chunk = camera_chunk
+            self._update_occlusion([key for key in self.remesher.nodes if key[0] == 0])
+
+    def request_chunks(self, chunk_keys, neighbours=False):
+        """
+        Queues the meshes drawing the given chunks for a rebuild. With neighbours, the
+        full detail meshes of their face neighbours are rebuilt too, as a new chunk
+        changes which of their border faces are visible.
+        """
+        meshes = set()
+        for key in chunk_keys:
+            for dx, dy, dz in NEIGHBOUR_OFFSETS if neighbours else ():
+                neighbour = (key[0] + dx, key[1] + dy, key[2] + dz)
+                if self.column_keys.get(neighbour[:2], (None,))[0] == 0:
+                    meshes.add((0, *neighbour))
+            cell = self.column_keys.get(key[:2])
+            if cell is None:
+                continue
+            meshes.add((0, *key) if cell[0] == 0 else (*cell, 0))
+        self.remesher.request(meshes)
+
+    def request_light(self, chunk_keys):
+        """
+        Queues the meshes of chunks whose light changed for a rebuild. Only full detail
+        meshes are shaded by light, so merged cells are left as they are.
+        """
+        self.remesher.request(
+            (0, *key)
+            for key in chunk_keys
+            if self.column_keys.get(key[:2], (None,))[0] == 0
+        )
+
+    def _distance(self, point, level, x, y):
+        # Distance from point to the nearest column of a cell, in chunks.
+        size = 1 << level
+        dx = max(x * size - point[0], 0, point[0] - (x + 1) * size)
+        dy = max(y * size - point[1], 0, point[1] - (y + 1) * size)
+        return math.hypot(dx, dy)
+
+    def _select(self, column):
+        self.column = column
+        point = (column[0] + 0.5, column[1] + 0.5)
+        top = len(self.distances)
+        size = 1 << top
+        stack = [
+            (top, x, y)
+            for x in range(
+                (column[0] - self.radius) // size, (column[0] + self.radius) // size + 1
+            )
+            for y in range(
+                (column[1] - self.radius) // size, (column[1] + self.radius) // size + 1
+            )
+        ]
+        column_keys = {}
+        selected = set()
+        while stack:
+            level, x, y = stack.pop()
+            distance = self._distance(point, level, x, y)
+            if distance > self.radius:
+                continue
+            if level > 0 and distance < self.distances[level - 1]:
+                stack.extend(
+                    (level - 1, x * 2 + i, y * 2 + j) for i in (0, 1) for j in (0, 1)
+                )
+                continue
+            if level == 0:
+                selected.update((0, x, y, z) for z in range(CHUNK_LAYERS))
+            else:
+                selected.add((level, x, y, 0))
+            cell_size = 1 << level
+            for cx in range(x * cell_size, (x + 1) * cell_size):
+                for cy in range(y * cell_size, (y + 1) * cell_size):
+                    column_keys[(cx, cy)] = (level, x, y)
+
+        added = selected - self.selected
+        removed = self.selected - selected
+        self.column_keys = column_keys
+        self.selected = selected
+        for key in added:
+            if key in self.retiring:
+                # Coming back before it was replaced; its mesh is still there.
+                self._cancel_retirement(key)
+            else:
+                self.pending.add(key)
+        for key in removed:
+            self.pending.discard(key)
+            # Meshes waiting for this one to be built now wait for its replacements.
+            for old in self.covers.pop(key, ()):
+                self._retire(old)
+            self._retire(key)
+        self.remesher.request(self.pending & added)
+
+    def _retire(self, key):
+        self._cancel_retirement(key)
+        if key not in self.remesher.nodes:
+            return
+        waits = set()
+        for column in mesh_columns(key):
+            cell = self.column_keys.get(column)
+            if cell is None:
+                continue
+            if cell[0] == 0:
+                replacements = {(0, *column, z) for z in range(CHUNK_LAYERS)}
+            else:
+                replacements = {(*cell, 0)}
+            waits.update(replacements & self.pending)
+        if not waits:
+            self._drop(key)
+            return
+        self.retiring[key] = waits
+        for replacement in waits:
+            self.covers.setdefault(replacement, set()).add(key)
+
+    def _cancel_retirement(self, key):
+        for replacement in self.retiring.pop(key, ()):
+            waiting = self.covers.get(replacement)
+            if waiting is not None:
+                waiting.discard(key)
+                if not waiting:
+                    del self.covers[replacement]
+
+    def _drop(self, key):
+        self._cancel_retirement(key)
+        self.remesher.remove(key)
+
+    def _on_ready(self, key):
+        # Called by the RemeshQueue once a mesh is attached, or found to be empty.
+        self.pending.discard(key)
+        for old in self.covers.pop(key, ()):
+            waits = self.retiring.get(old)
+            if waits is None:
+                continue
+            waits.discard(key)
+            if not waits:
+                del self.retiring[old]
+                self.remesher.remove(old)
+        if key[0] == 0:
+            # A chunk's solid faces also decide whether its neighbours are occluded.
+            _, x, y, z = key
+            self._update_occlusion(
+                [key]
+                + [(0, x + dx, y + dy, z + dz) for dx, dy, dz in NEIGHBOUR_OFFSETS]
+            )
+
+    def _occluded(self, chunk):
+        """
+        A chunk is hidden when, on every side facing the camera, its neighbour's
+        boundary layer against it is solid, since any line of sight would cross it.
+        """
+        if self.camera_chunk is None or chunk == self.camera_chunk:
+            return False
+        for i, offset in enumerate(NEIGHBOUR_OFFSETS):
+            axis = next(a for a in range(3) if offset[a])
+            if (self.camera_chunk[axis] - chunk[axis]) * offset[axis] <= 0:
+                continue
+            neighbour = self.world.chunks.get(
+                (chunk[0] + offset[0], chunk[1] + offset[1], chunk[2] + offset[2])
+            )
+            # Offsets come in opposite pairs, so i ^ 1 is the face pointing back at us.
+            if neighbour is None or not neighbour.solid_faces() & (1 << (i ^ 1)):
+                return False
+        return True
+
+    def _update_occlusion(self, keys):
+        for key in keys:
+            node = self.remesher.nodes.get(key)
+            if node is None:
+                continue
+            hidden = self._occluded(key[1:])
+            if hidden and not node.isStashed():
+                node.stash()
+            elif not hidden and node.isStashed():
+                node.unstash()
+
+    def stats(self):
+        nodes = self.remesher.nodes
+        levels = [0] * (len(self.distances) + 1)
+        for key in nodes:
+            levels[key[0]] += 1
+        return {
+            "meshes_by_level": levels,
+            "occluded": sum(1 for node in nodes.values() if node.isStashed()),
+            "retiring": len(self.retiring),
+            "pending": len(self.pending),
+        }
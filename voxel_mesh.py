@@ -0,0 +1,412 @@
+"""
+Turns chunk blocks into Panda3D geometry holding only the visible block faces.
+
+Meshes are keyed (level, x, y, z). A level 0 mesh is the single chunk (x, y, z) at full
+detail. A level L mesh merges the 2^L by 2^L chunk columns of cell (x, y), every layer,
+downsampled to one voxel per 2^L blocks; its z is always 0.
+"""
+
+import heapq
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from panda3d.core import Geom, GeomNode, GeomTriangles, GeomVertexData, GeomVertexFormat
+
+from voxel_light import LIGHT_CURVE, MAX_LIGHT, light_levels
+from voxel_world import (
+    AIR,
+    BEDROCK,
+    BLOCK_COLORS,
+    BLOCK_DTYPE,
+    BLOCK_EMISSION,
+    BLOCK_SPACING,
+    CHUNK_LAYERS,
+    CHUNK_SIZE,
+    WORLD_HEIGHT,
+    pad_blocks,
+)
+
+# Matches GeomVertexFormat.getV3c4(): a float position followed by an RGBA byte colour.
+VERTEX_DTYPE = np.dtype([("position", np.float32, 3), ("color", np.uint8, 4)])
+
+# For each face direction: the neighbour offset, the four corners of the face relative to
+# the block centre (counter-clockwise seen from outside), and a fixed shade so the sides
+# of the terrain can be told apart without scene lights.
+FACES = (
+    ((1, 0, 0), ((1, -1, -1), (1, 1, -1), (1, 1, 1), (1, -1, 1)), 0.8),
+    ((-1, 0, 0), ((-1, 1, -1), (-1, -1, -1), (-1, -1, 1), (-1, 1, 1)), 0.8),
+    ((0, 1, 0), ((1, 1, -1), (-1, 1, -1), (-1, 1, 1), (1, 1, 1)), 0.65),
+    ((0, -1, 0), ((-1, -1, -1), (1, -1, -1), (1, -1, 1), (-1, -1, 1)), 0.65),
+    ((0, 0, 1), ((-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1)), 1.0),
+    ((0, 0, -1), ((-1, 1, -1), (1, 1, -1), (1, -1, -1), (-1, -1, -1)), 0.5),
+)
+
+# How many voxels deep the skirts around merged cells reach below their edges.
+SKIRT_DEPTH = 2
+
+# Two triangles per quad.
+QUAD_INDICES = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint16)
+
+
+def merge_runs(faces, keys):
+    """
+    Joins faces into runs along the last axis, each face joining the run of the face
+    before it if their keys match. Returns the indices of the faces that start runs, as
+    np.nonzero gives them, and the lengths of the runs.
+    """
+    joins = faces[..., 1:] & faces[..., :-1] & (keys[..., 1:] == keys[..., :-1])
+    starts = faces.copy()
+    starts[..., 1:] &= ~joins
+    ends = faces.copy()
+    ends[..., :-1] &= ~joins
+    first = np.nonzero(starts)
+    # Runs never cross rows, so the nth start and the nth end in order belong together.
+    return first, np.nonzero(ends)[-1] - first[-1] + 1
+
+
+def build_mesh_arrays(padded, scale=1, light=None):
+    """
+    Builds vertex and index arrays from a block array with a one voxel border
+    (see pad_blocks), where each voxel stands for scale^3 blocks. Positions are
+    relative to the first inner voxel's lowest block. If given, light holds the light
+    level of every voxel in the same layout, and each face is shaded by the light of
+    the voxel it faces. Returns None when there are no visible faces.
+
+    Rows of neighbouring faces of one block type and light level, facing the same
+    way, are drawn as one quad.
+    """
+    sx, sy, sz = (n - 2 for n in padded.shape)
+    solid = padded != AIR
+    inner = solid[1:-1, 1:-1, 1:-1]
+    inner_ids = padded[1:-1, 1:-1, 1:-1]
+    keys = inner_ids
+    vertex_parts = []
+    for (dx, dy, dz), corners, shade in FACES:
+        facing = (slice(1 + dx, sx + 1 + dx), slice(1 + dy, sy + 1 + dy))
+        facing += (slice(1 + dz, sz + 1 + dz),)
+        faces = inner & ~solid[facing]
+        if not faces.any():
+            continue
+        if light is not None:
+            # Blocks that give off light are drawn at least as bright as they shine.
+            level = np.maximum(light[facing], BLOCK_EMISSION[inner_ids])
+            keys = inner_ids * np.uint16(MAX_LIGHT + 1) + level
+        # Rows of faces run along the first axis the face lies in, so they stay level.
+        along = 1 if dx else 0
+        order = [axis for axis in range(3) if axis != along] + [along]
+        first, lengths = merge_runs(faces.transpose(order), keys.transpose(order))
+        cells = np.empty((len(lengths), 3), dtype=np.int64)
+        cells[:, order] = np.stack(first, axis=1)
+        xs, ys, zs = cells.T
+        # Block centres sit on whole block coordinates, so a voxel of scale blocks is
+        # centred half a voxel minus half a block from its lowest block.
+        centres = (cells + 0.5) * scale - 0.5
+        offsets = np.array(corners, dtype=np.float32) * 0.5 * scale
+        offsets = np.broadcast_to(offsets, (len(cells), 4, 3)).copy()
+        # The far corners of a row's quad stretch to the last face in the row.
+        far = offsets[:, :, along] > 0
+        offsets[:, :, along] += far * ((lengths - 1) * scale)[:, None]
+        vertices = np.empty((len(cells), 4), dtype=VERTEX_DTYPE)
+        vertices["position"] = (centres[:, None, :] + offsets) * BLOCK_SPACING
+        block_ids = inner_ids[xs, ys, zs]
+        colors = BLOCK_COLORS[block_ids].astype(np.float32)
+        if light is None:
+            colors[:, :3] *= shade
+        else:
+            lit = LIGHT_CURVE[level[xs, ys, zs]]
+            colors[:, :3] *= (shade * lit)[:, None]
+        vertices["color"] = colors.astype(np.uint8)[:, None, :]
+        vertex_parts.append(vertices.reshape(-1))
+
+    if not vertex_parts:
+        return None
+    vertices = np.concatenate(vertex_parts)
+    index_type = np.uint16 if len(vertices) <= 0xFFFF else np.uint32
+    quad_starts = np.arange(0, len(vertices), 4, dtype=index_type)
+    indices = (quad_starts[:, None] + QUAD_INDICES[None, :]).reshape(-1)
+    return vertices, indices
+
+
+def downsample(blocks, factor):
+    """
+    Shrinks a block array by factor on every axis. A coarse voxel is solid if any of
+    its blocks is, and takes the type of its topmost solid block so surfaces keep
+    their colour.
+    """
+    if factor == 1:
+        return blocks
+    nx, ny, nz = (n // factor for n in blocks.shape)
+    groups = blocks.reshape(nx, factor, ny, factor, nz, factor)
+    # Order each group's blocks top layer first, then flatten them.
+    groups = groups.transpose(0, 2, 4, 5, 1, 3)[:, :, :, ::-1]
+    groups = groups.reshape(nx, ny, nz, factor**3)
+    first = np.argmax(groups != AIR, axis=-1)
+    return np.take_along_axis(groups, first[..., None], axis=-1)[..., 0]
+
+
+def mesh_origin(key):
+    """Returns the voxel coordinate of the lowest corner a mesh covers."""
+    level, x, y, z = key
+    columns = 1 << level
+    return (x * columns * CHUNK_SIZE, y * columns * CHUNK_SIZE, z * CHUNK_SIZE)
+
+
+def mesh_center(key):
+    """Returns the centre of the area a mesh covers, in chunk units."""
+    level, x, y, z = key
+    if level == 0:
+        return (x + 0.5, y + 0.5, z + 0.5)
+    columns = 1 << level
+    return ((x + 0.5) * columns, (y + 0.5) * columns, CHUNK_LAYERS / 2)
+
+
+def mesh_chunks(key):
+    """Yields the keys of the chunks a mesh is built from."""
+    level, x, y, z = key
+    if level == 0:
+        yield (x, y, z)
+        return
+    columns = 1 << level
+    for cx in range(x * columns, (x + 1) * columns):
+        for cy in range(y * columns, (y + 1) * columns):
+            for cz in range(CHUNK_LAYERS):
+                yield (cx, cy, cz)
+
+
+def snapshot_mesh(world, key):
+    """
+    Copies the blocks a mesh is built from, so build_mesh can run on another thread.
+    Returns None when none of them are loaded, or there is nothing to draw.
+    """
+    if key[0] == 0:
+        chunk_key = key[1:]
+        chunk = world.chunks.get(chunk_key)
+        if chunk is None:
+            return None
+        if chunk.blocks.words is None and chunk.blocks.palette[0] == AIR:
+            # All air, as the chunks above the surface are: no faces to draw.
+            return None
+        return (*world.snapshot(chunk_key), light_levels(world, chunk_key))
+    chunks = {
+        chunk_key: world.chunks[chunk_key].blocks.copy()
+        for chunk_key in mesh_chunks(key)
+        if chunk_key in world.chunks
+    }
+    return chunks or None
+
+
+def build_mesh(key, snapshot):
+    """Builds the vertex and index arrays of a mesh from snapshot_mesh's copy."""
+    level = key[0]
+    if level == 0:
+        blocks, neighbours, light = snapshot
+        padded = pad_blocks(blocks, neighbours)
+        if key[3] == 0:
+            # Nothing is ever seen from below the world, so skip the bottom faces.
+            padded[:, :, 0] = BEDROCK
+        return build_mesh_arrays(padded, light=light)
+    columns = 1 << level
+    ox, oy, _ = mesh_origin(key)
+    size = columns * CHUNK_SIZE
+    blocks = np.zeros((size, size, WORLD_HEIGHT), dtype=BLOCK_DTYPE)
+    for (cx, cy, cz), chunk_blocks in snapshot.items():
+        x = cx * CHUNK_SIZE - ox
+        y = cy * CHUNK_SIZE - oy
+        z = cz * CHUNK_SIZE
+        blocks[x : x + CHUNK_SIZE, y : y + CHUNK_SIZE, z : z + CHUNK_SIZE] = (
+            chunk_blocks.to_array()
+        )
+    # The border copies the cell's own edge sunk by SKIRT_DEPTH voxels, so each cell
+    # draws a short skirt down its sides that hides cracks against neighbouring meshes
+    # of another level, without walls down to bedrock.
+    padded = np.pad(downsample(blocks, columns), 1, mode="edge")
+    padded[:, :, -1] = AIR
+    for side in (padded[0], padded[-1], padded[:, 0], padded[:, -1]):
+        side[:, :-SKIRT_DEPTH] = side[:, SKIRT_DEPTH:].copy()
+        side[:, -SKIRT_DEPTH:] = AIR
+    return build_mesh_arrays(padded, scale=columns)
+
+
+def make_geom_node(name, vertices, indices):
+    """Copies mesh arrays into a new GeomNode."""
+    vdata = GeomVertexData(name, GeomVertexFormat.getV3c4(), Geom.UHStatic)
+    vdata.uncleanSetNumRows(len(vertices))
+    memoryview(vdata.modifyArray(0)).cast("B")[:] = vertices.tobytes()
+
+    triangles = GeomTriangles(Geom.UHStatic)
+    triangles.setIndexType(
+        Geom.NT_uint16 if indices.dtype == np.uint16 else Geom.NT_uint32
+    )
+    index_data = triangles.modifyVertices()
+    index_data.uncleanSetNumRows(len(indices))
+    memoryview(index_data).cast("B")[:] = indices.tobytes()
+
+    geom = Geom(vdata)
+    geom.addPrimitive(triangles)
+    node = GeomNode(name)
+    node.addGeom(geom)
+    return node
+
+
+# How far (in chunks) the camera moves before the remesh queue is re-sorted.
+RESORT_DISTANCE = 0.5
+
+
+class RemeshQueue:
+    """
+    Rebuilds meshes nearest to the camera first. Vertex arrays are built on a
+    thread pool and drain() only spends up to budget_ms per frame, snapshotting blocks,
+    attaching finished meshes and starting builds, so a big edit or a teleport spreads
+    its remeshing over several frames instead of causing a hitch. The builds take CPU
+    time away from the frame like the rest, so each one started counts against the
+    budget at the average time builds take.
+
+    is_wanted(key) decides whether a mesh should still exist when its turn comes, and
+    on_ready(key), if set, is called once a requested mesh is attached or dropped.
+    """
+
+    def __init__(self, world, parent, budget_ms=3.0, workers=2):
+        self.world = world
+        self.parent = parent
+        self.budget = budget_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_in_flight = workers * 2
+        # Keys are mesh keys and values are the NodePaths of their current meshes.
+        self.nodes = {}
+        # The camera position in chunk units.
+        self.center = (0, 0, 0)
+        self.is_wanted = lambda key: key[1:] in world.chunks
+        self.on_ready = None
+        # Heap of (distance, sequence, key); `queued` mirrors its keys.
+        self.heap = []
+        self.queued = set()
+        self.sequence = 0
+        self.building = set()
+        # Chunks that changed again while their mesh was being built.
+        self.rebuild_after = set()
+        self.finished = queue.SimpleQueue()
+        self.last_frame_ms = 0.0
+        self.worst_frame_ms = 0.0
+        self.meshes_uploaded = 0
+        # Running average of the CPU seconds a build takes on a worker.
+        self.build_seconds = 0.0
+
+    def _priority(self, key):
+        return sum((a - b) ** 2 for a, b in zip(mesh_center(key), self.center))
+
+    def _push(self, key):
+        self.sequence += 1
+        heapq.heappush(self.heap, (self._priority(key), self.sequence, key))
+        self.queued.add(key)
+
+    def request(self, keys):
+        """Queues meshes whose blocks changed for a rebuild."""
+        for key in keys:
+            if key not in self.queued:
+                self._push(key)
+
+    def set_center(self, center):
+        """Re-sorts the queue when the camera moves (in chunk units)."""
+        # Re-sorting works out every queued mesh's priority again, which moves of less
+        # than RESORT_DISTANCE barely change the order of.
+        moved = sum((a - b) ** 2 for a, b in zip(center, self.center))
+        if moved < RESORT_DISTANCE**2:
+            return
+        self.center = center
+        self.heap = [(self._priority(key), seq, key) for _, seq, key in self.heap]
+        heapq.heapify(self.heap)
+
+    def remove(self, key):
+        """Drops a mesh. Queued work for it is skipped later if it isn't wanted."""
+        node = self.nodes.pop(key, None)
+        if node is not None:
+            node.removeNode()
+
+    def _build(self, key, snapshot):
+        # Runs on a worker thread, with a private copy of the blocks.
+        start = time.thread_time()
+        try:
+            arrays = build_mesh(key, snapshot)
+        except Exception:
+            # The key still has to reach drain(), or its slot among the builds in flight
+            # and any rebuild waiting on it would never be freed. The mesh is dropped and
+            # built again the next time its blocks change.
+            arrays = None
+        seconds = time.thread_time() - start
+        self.build_seconds += (seconds - self.build_seconds) * 0.2
+        self.finished.put((key, arrays))
+
+    def _attach(self, key, arrays):
+        self.remove(key)
+        if arrays is not None:
+            node = self.parent.attachNewNode(make_geom_node(f"mesh{key}", *arrays))
+            node.setPos(*(c * BLOCK_SPACING for c in mesh_origin(key)))
+            self.nodes[key] = node
+            self.meshes_uploaded += 1
+        self._ready(key)
+
+    def _ready(self, key):
+        if self.on_ready is not None:
+            self.on_ready(key)
+
+    def drain(self, task=None):
+        """Panda3D task: attaches finished meshes, then starts new builds, within budget."""
+        start = time.perf_counter()
+        deadline = start + self.budget
+
+        # Finished meshes first, they are what the player is waiting to see.
+        while time.perf_counter() < deadline:
+            try:
+                key, arrays = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            self.building.discard(key)
+            if not self.is_wanted(key):
+                self._ready(key)
+                continue
+            self._attach(key, arrays)
+            if key in self.rebuild_after:
+                self.rebuild_after.discard(key)
+                self.request([key])
+
+        # Then hand the nearest queued chunks to the builders.
+        started = 0
+        while (
+            self.heap
+            and len(self.building) < self.max_in_flight
+            and time.perf_counter() + started * self.build_seconds < deadline
+        ):
+            _, _, key = heapq.heappop(self.heap)
+            self.queued.discard(key)
+            if key in self.building:
+                # Two builds of one mesh could finish out of order; wait for this one.
+                self.rebuild_after.add(key)
+                continue
+            snapshot = snapshot_mesh(self.world, key) if self.is_wanted(key) else None
+            if snapshot is None:
+                self._attach(key, None)
+                continue
+            self.building.add(key)
+            self.executor.submit(self._build, key, snapshot)
+            started += 1
+
+        # What this frame costs includes the builds it started.
+        spent = time.perf_counter() - start + started * self.build_seconds
+        self.last_frame_ms = spent * 1000
+        self.worst_frame_ms = max(self.worst_frame_ms, self.last_frame_ms)
+        if task is not None:
+            return task.cont
+
+    def stats(self):
+        return {
+            "queued": len(self.heap),
+            "building": len(self.building),
+            "last_frame_ms": self.last_frame_ms,
+            "worst_frame_ms": self.worst_frame_ms,
+            "uploaded": self.meshes_uploaded,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
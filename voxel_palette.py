@@ -0,0 +1,132 @@
+"""Palette-compressed block storage for chunks."""
+
+import json
+import sys
+
+import numpy as np
+
+from voxel_world import BLOCK_DTYPE, CHUNK_SIZE
+
+CHUNK_VOLUME = CHUNK_SIZE**3
+
+
+def _bits_for(palette_size):
+    """Index width needed for a palette; a single entry needs no indices at all."""
+    if palette_size <= 1:
+        return 0
+    return max(1, (palette_size - 1).bit_length())
+
+
+def _pack(indices, bits):
+    """Packs indices into 64-bit words, 64 // bits per word, never straddling words."""
+    per_word = 64 // bits
+    count = -(-len(indices) // per_word)
+    padded = np.zeros(count * per_word, dtype=np.uint64)
+    padded[: len(indices)] = indices
+    shifts = np.arange(per_word, dtype=np.uint64) * np.uint64(bits)
+    return np.bitwise_or.reduce(padded.reshape(count, per_word) << shifts, axis=1)
+
+
+def _unpack(words, bits, count):
+    per_word = 64 // bits
+    shifts = np.arange(per_word, dtype=np.uint64) * np.uint64(bits)
+    mask = np.uint64((1 << bits) - 1)
+    return ((words[:, None] >> shifts) & mask).reshape(-1)[:count]
+
+
+class PalettedBlocks:
+    """
+    The block ids of one chunk, stored as a small palette of the ids it uses plus a
+    bit-packed array of palette indices. The indices are as wide as the palette needs,
+    1 to 16 bits (block ids are 16-bit, so a palette never needs more), and a chunk of
+    a single block type (all air, all stone) keeps only that id.
+    """
+
+    __slots__ = ("palette", "bits", "words")
+
+    def __init__(self, palette, bits, words):
+        # Block ids used by the chunk; indices refer to positions in this list.
+        self.palette = palette
+        self.bits = bits
+        # Packed indices, or None when the chunk is uniform.
+        self.words = words
+
+    @classmethod
+    def uniform(cls, block):
+        return cls([block], 0, None)
+
+    @classmethod
+    def from_array(cls, blocks):
+        """Compresses a (CHUNK_SIZE,) * 3 array of block ids indexed [x, y, z]."""
+        palette, indices = np.unique(blocks.reshape(-1), return_inverse=True)
+        if len(palette) == 1:
+            return cls.uniform(int(palette[0]))
+        bits = _bits_for(len(palette))
+        return cls([int(b) for b in palette], bits, _pack(indices, bits))
+
+    def to_array(self):
+        """Decompresses to a (CHUNK_SIZE,) * 3 array of block ids indexed [x, y, z]."""
+        shape = (CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        if self.words is None:
+            return np.full(shape, self.palette[0], dtype=BLOCK_DTYPE)
+        palette = np.array(self.palette, dtype=BLOCK_DTYPE)
+        return palette[_unpack(self.words, self.bits, CHUNK_VOLUME)].reshape(shape)
+
+    def get(self, x, y, z):
+        if self.words is None:
+            return self.palette[0]
+        index = (x * CHUNK_SIZE + y) * CHUNK_SIZE + z
+        per_word = 64 // self.bits
+        word = int(self.words[index // per_word])
+        shift = (index % per_word) * self.bits
+        return self.palette[(word >> shift) & ((1 << self.bits) - 1)]
+
+    def copy(self):
+        words = None if self.words is None else self.words.copy()
+        return PalettedBlocks(list(self.palette), self.bits, words)
+
+    @property
+    def nbytes(self):
+        """Bytes of block data held: the palette as 16-bit ids plus the packed words."""
+        words = 0 if self.words is None else self.words.nbytes
+        return len(self.palette) * 2 + words
+
+    def memory_usage(self):
+        """Bytes actually allocated for this chunk's blocks, Python objects included."""
+        total = sys.getsizeof(self) + sys.getsizeof(self.palette)
+        if self.words is not None:
+            total += sys.getsizeof(self.words)
+        return total
+
+
+def memory_report(seed=0, radius=4):
+    """Summarises block storage for the terrain chunks within radius of the origin."""
+    from voxel_terrain import generate_chunk
+    from voxel_world import CHUNK_LAYERS
+
+    keys = [
+        (x, y, z)
+        for x in range(-radius, radius)
+        for y in range(-radius, radius)
+        for z in range(CHUNK_LAYERS)
+    ]
+    chunks = [generate_chunk(seed, key)[1] for key in keys]
+    widths = {}
+    for blocks in chunks:
+        widths[blocks.bits] = widths.get(blocks.bits, 0) + 1
+    total = sum(blocks.nbytes for blocks in chunks)
+    allocated = sum(blocks.memory_usage() for blocks in chunks)
+    dense = CHUNK_VOLUME * np.dtype(BLOCK_DTYPE).itemsize
+    return {
+        "chunks": len(chunks),
+        "uniform_chunks": widths.get(0, 0),
+        "chunks_by_index_bits": dict(sorted(widths.items())),
+        "data_bytes_per_chunk": total / len(chunks),
+        "allocated_bytes_per_chunk": allocated / len(chunks),
+        "dense_bytes_per_chunk": dense,
+        "compression_ratio": dense * len(chunks) / allocated,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(memory_report(), indent=2))
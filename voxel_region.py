@@ -0,0 +1,350 @@
+"""
+Region files: chunks grouped into one file per REGION_SIZE^3 block of chunks.
+
+Each file starts with a header and a fixed offset table with one entry per chunk,
+(offset, length, crc32), followed by the compressed chunk payloads. Payloads are only
+ever appended; a chunk is replaced by appending its new payload, syncing it to disk and
+then rewriting its 16 byte table entry, so a crash at any point leaves every entry
+pointing at a complete payload. The CRC catches anything the disk tore anyway.
+"""
+
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from voxel_palette import PalettedBlocks
+from voxel_world import BLOCK_DTYPE, CHUNK_LAYERS, CHUNK_SIZE
+
+REGION_SIZE = 8
+CHUNKS_PER_REGION = REGION_SIZE**3
+
+MAGIC = b"VXRG"
+VERSION = 1
+HEADER = struct.Struct("<4sI8x")
+ENTRY = struct.Struct("<QII")
+TABLE_START = HEADER.size
+DATA_START = TABLE_START + ENTRY.size * CHUNKS_PER_REGION
+
+# First byte of every payload, so the chunk encoding can change without a new file version.
+# Dense payloads are one byte per block; paletted ones are the chunk's PalettedBlocks:
+# index width, palette length, the palette as 16-bit ids and then the packed words.
+FORMAT_DENSE = 1
+FORMAT_PALETTED = 2
+PALETTE_HEADER = struct.Struct("<BH")
+
+
+def encode_chunk(blocks):
+    """Compresses a chunk's PalettedBlocks into a region file payload."""
+    body = [
+        PALETTE_HEADER.pack(blocks.bits, len(blocks.palette) - 1),
+        np.array(blocks.palette, dtype="<u2").tobytes(),
+    ]
+    if blocks.words is not None:
+        body.append(blocks.words.astype("<u8").tobytes())
+    return bytes((FORMAT_PALETTED,)) + zlib.compress(b"".join(body), 1)
+
+
+def decode_chunk(payload):
+    """Returns the PalettedBlocks stored in a region file payload."""
+    data = zlib.decompress(payload[1:])
+    if payload[0] == FORMAT_DENSE:
+        blocks = np.frombuffer(data, dtype=np.uint8).astype(BLOCK_DTYPE)
+        return PalettedBlocks.from_array(blocks.reshape((CHUNK_SIZE,) * 3))
+    if payload[0] != FORMAT_PALETTED:
+        raise ValueError(f"unknown chunk format {payload[0]}")
+    bits, last = PALETTE_HEADER.unpack_from(data)
+    start = PALETTE_HEADER.size
+    palette = np.frombuffer(data, dtype="<u2", count=last + 1, offset=start)
+    start += palette.nbytes
+    words = None
+    if bits:
+        words = np.frombuffer(data, dtype="<u8", offset=start).astype(np.uint64)
+    return PalettedBlocks([int(b) for b in palette], bits, words)
+
+
+def region_key(key):
+    """Returns (region key, index within the region's table) for a chunk key."""
+    region = tuple(c // REGION_SIZE for c in key)
+    x, y, z = (c % REGION_SIZE for c in key)
+    return region, (x * REGION_SIZE + y) * REGION_SIZE + z
+
+
+def _write_atomically(path, chunks):
+    """Writes a file under a temporary name and renames it into place."""
+    temp = path + ".tmp"
+    with open(temp, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+    directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class RegionFile:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            _write_atomically(
+                path, [HEADER.pack(MAGIC, VERSION), bytes(DATA_START - TABLE_START)]
+            )
+        self._open()
+
+    def _open(self):
+        self.fd = os.open(self.path, os.O_RDWR)
+        magic, version = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))
+        if magic != MAGIC or version != VERSION:
+            os.close(self.fd)
+            raise ValueError(f"{self.path} is not a version {VERSION} region file")
+        table = os.pread(self.fd, DATA_START - TABLE_START, TABLE_START)
+        self.entries = [
+            ENTRY.unpack_from(table, i * ENTRY.size) for i in range(CHUNKS_PER_REGION)
+        ]
+        self.end = max(os.fstat(self.fd).st_size, DATA_START)
+        self.map = None
+
+    def has(self, index):
+        return self.entries[index][1] > 0
+
+    def read(self, index):
+        """Returns the payload stored for a chunk, or None if it is missing or damaged."""
+        with self.lock:
+            offset, length, crc = self.entries[index]
+            if length == 0:
+                return None
+            # The file only grows, so map it again once entries point past the old end.
+            if self.map is None or len(self.map) < offset + length:
+                if self.map is not None:
+                    self.map.close()
+                self.map = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+            payload = self.map[offset : offset + length]
+        if zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def write(self, items):
+        """Stores (index, payload) pairs with one sync for the data and one for the table."""
+        with self.lock:
+            updates = []
+            for index, payload in items:
+                os.pwrite(self.fd, payload, self.end)
+                updates.append((index, (self.end, len(payload), zlib.crc32(payload))))
+                self.end += len(payload)
+            os.fsync(self.fd)
+            for index, entry in updates:
+                os.pwrite(self.fd, ENTRY.pack(*entry), TABLE_START + index * ENTRY.size)
+                self.entries[index] = entry
+            os.fsync(self.fd)
+
+    def wasted_bytes(self):
+        """Bytes taken up by payloads that have since been replaced."""
+        return self.end - DATA_START - sum(length for _, length, _ in self.entries)
+
+    def compact(self):
+        """Rewrites the file without replaced payloads."""
+        with self.lock:
+            table = bytearray(DATA_START - TABLE_START)
+            payloads = []
+            offset = DATA_START
+            for index, (old_offset, length, crc) in enumerate(self.entries):
+                if length == 0:
+                    continue
+                payloads.append(os.pread(self.fd, length, old_offset))
+                ENTRY.pack_into(table, index * ENTRY.size, offset, length, crc)
+                offset += length
+            _write_atomically(
+                self.path, [HEADER.pack(MAGIC, VERSION), table, *payloads]
+            )
+            self._close()
+            self._open()
+
+    def _close(self):
+        if self.map is not None:
+            self.map.close()
+        os.close(self.fd)
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+class RegionStore:
+    """
+    A directory of region files. load() reads straight from the files; save() only
+    queues a copy of the chunk for a background writer thread, and load() sees queued
+    chunks before they reach the disk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.regions = {}
+        self.regions_lock = threading.Lock()
+        # Chunks saved but not yet written, keyed by chunk key.
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.wakeup = queue.SimpleQueue()
+        self.idle = threading.Event()
+        self.idle.set()
+        # The exception of the writer's last failed write, raised by flush() and close().
+        self.error = None
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        self.metadata_path = os.path.join(directory, "level.json")
+
+    def load_metadata(self):
+        try:
+            with open(self.metadata_path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def save_metadata(self, metadata):
+        _write_atomically(self.metadata_path, [json.dumps(metadata).encode()])
+
+    def _region(self, region, create):
+        """Returns the open region file, or None if it doesn't exist and create is False."""
+        with self.regions_lock:
+            file = self.regions.get(region)
+            if file is None:
+                path = os.path.join(self.directory, "r.{}.{}.{}.vxr".format(*region))
+                if not create and not os.path.exists(path):
+                    return None
+                file = RegionFile(path)
+                self.regions[region] = file
+            return file
+
+    def load(self, key):
+        """Returns the stored blocks of a chunk, or None if it was never saved."""
+        with self.pending_lock:
+            blocks = self.pending.get(key)
+        if blocks is not None:
+            return blocks.copy()
+        region, index = region_key(key)
+        file = self._region(region, create=False)
+        payload = file.read(index) if file is not None else None
+        if payload is None:
+            return None
+        return decode_chunk(payload)
+
+    def save(self, key, blocks):
+        """Queues a copy of a chunk's blocks to be written in the background."""
+        with self.pending_lock:
+            self.pending[key] = blocks.copy()
+            self.idle.clear()
+        self.wakeup.put(True)
+
+    def _write_loop(self):
+        while True:
+            if self.wakeup.get() is None:
+                return
+            try:
+                self._write_pending()
+            except Exception as error:
+                # The chunks stay queued, and are tried again on the next save.
+                with self.pending_lock:
+                    self.error = error
+                    self.idle.set()
+
+    def _write_pending(self):
+        with self.pending_lock:
+            batch = dict(self.pending)
+        by_region = {}
+        for key, blocks in batch.items():
+            region, index = region_key(key)
+            by_region.setdefault(region, []).append((index, encode_chunk(blocks)))
+        for region, items in by_region.items():
+            self._region(region, create=True).write(items)
+        with self.pending_lock:
+            for key, blocks in batch.items():
+                # Leave chunks that were saved again while we were writing.
+                if self.pending.get(key) is blocks:
+                    del self.pending[key]
+            self.error = None
+            if not self.pending:
+                self.idle.set()
+
+    def flush(self):
+        """
+        Blocks until every queued chunk is on disk, or raises the writer's error if the
+        last write failed.
+        """
+        self.idle.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Writes the queued chunks and closes the files, raising the writer's error."""
+        try:
+            self.flush()
+        finally:
+            self.wakeup.put(None)
+            self.writer.join()
+            for file in self.regions.values():
+                # Reclaim space once more than half the file is replaced payloads.
+                if self.error is None and file.wasted_bytes() > file.end // 2:
+                    file.compact()
+                file.close()
+            self.regions.clear()
+
+
+def benchmark(directory, count=2048, seed=0):
+    """Measures save and load throughput for generated terrain chunks."""
+    from voxel_terrain import generate_chunk
+
+    side = max(1, round((count / CHUNK_LAYERS) ** 0.5))
+    keys = [
+        (x, y, z) for x in range(side) for y in range(side) for z in range(CHUNK_LAYERS)
+    ]
+    chunks = {key: generate_chunk(seed, key)[1] for key in keys}
+
+    store = RegionStore(directory)
+    start = time.perf_counter()
+    for key, blocks in chunks.items():
+        store.save(key, blocks)
+    store.flush()
+    save_seconds = time.perf_counter() - start
+    store.close()
+    disk_bytes = sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+        if name.endswith(".vxr")
+    )
+
+    store = RegionStore(directory)
+    start = time.perf_counter()
+    for key in keys:
+        store.load(key)
+    load_seconds = time.perf_counter() - start
+    store.close()
+
+    raw_bytes = len(keys) * CHUNK_SIZE**3 * np.dtype(BLOCK_DTYPE).itemsize
+    return {
+        "chunks": len(keys),
+        "save_chunks_per_second": len(keys) / save_seconds,
+        "save_mb_per_second": raw_bytes / save_seconds / 1e6,
+        "load_chunks_per_second": len(keys) / load_seconds,
+        "load_mb_per_second": raw_bytes / load_seconds / 1e6,
+        "disk_bytes_per_chunk": disk_bytes / len(keys),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        count = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+        print(json.dumps(benchmark(directory, count), indent=2))
@@ -0,0 +1,306 @@
+"""
+Seeded procedural terrain, generated chunk by chunk in background worker processes,
+or loaded from region files for chunks that were edited and saved.
+"""
+
+import math
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from voxel_palette import PalettedBlocks
+from voxel_world import (
+    BEDROCK,
+    BLOCK_DTYPE,
+    CHUNK_LAYERS,
+    CHUNK_SIZE,
+    DIRT,
+    GRASS,
+    SAND,
+    SNOW,
+    STONE,
+    Chunk,
+)
+
+# Terrain shape: surface height in blocks is BASE_HEIGHT +/- HEIGHT_RANGE.
+BASE_HEIGHT = 24
+HEIGHT_RANGE = 14
+NOISE_SCALE = 48.0
+NOISE_OCTAVES = 4
+# Surfaces at or below SAND_LEVEL are sand, at or above SNOW_LEVEL snow.
+SAND_LEVEL = BASE_HEIGHT - 6
+SNOW_LEVEL = BASE_HEIGHT + 9
+# Blocks of dirt between the surface and the stone below it.
+DIRT_DEPTH = 3
+
+
+def _lattice_hash(ix, iy, seed):
+    """Hashes integer lattice coordinates to floats in [0, 1]."""
+    h = (
+        ix.astype(np.uint64) * np.uint64(374761393)
+        + iy.astype(np.uint64) * np.uint64(668265263)
+        + np.uint64(seed & 0xFFFFFFFF) * np.uint64(2246822519)
+    ) & np.uint64(0xFFFFFFFF)
+    h = ((h ^ (h >> np.uint64(13))) * np.uint64(1274126177)) & np.uint64(0xFFFFFFFF)
+    h ^= h >> np.uint64(16)
+    return h.astype(np.float64) / 0xFFFFFFFF
+
+
+def value_noise(xs, ys, seed):
+    """Smoothly interpolated value noise in [0, 1] sampled at float coordinates."""
+    x0 = np.floor(xs)
+    y0 = np.floor(ys)
+    fx = xs - x0
+    fy = ys - y0
+    # Smoothstep the fractional part so the lattice isn't visible.
+    fx = fx * fx * (3 - 2 * fx)
+    fy = fy * fy * (3 - 2 * fy)
+    ix = x0.astype(np.int64)
+    iy = y0.astype(np.int64)
+    v00 = _lattice_hash(ix, iy, seed)
+    v10 = _lattice_hash(ix + 1, iy, seed)
+    v01 = _lattice_hash(ix, iy + 1, seed)
+    v11 = _lattice_hash(ix + 1, iy + 1, seed)
+    top = v00 + (v10 - v00) * fx
+    bottom = v01 + (v11 - v01) * fx
+    return top + (bottom - top) * fy
+
+
+def fractal_noise(xs, ys, seed, octaves=NOISE_OCTAVES):
+    """Sums octaves of value noise, each at double the frequency and half the weight."""
+    total = np.zeros(np.broadcast(xs, ys).shape)
+    amplitude = 1.0
+    frequency = 1.0
+    weight = 0.0
+    for octave in range(octaves):
+        total += value_noise(xs * frequency, ys * frequency, seed + octave) * amplitude
+        weight += amplitude
+        amplitude *= 0.5
+        frequency *= 2.0
+    return total / weight
+
+
+def height_map(seed, cx, cy):
+    """Returns the surface height of every block column in a chunk column, indexed [x, y]."""
+    xs = (cx * CHUNK_SIZE + np.arange(CHUNK_SIZE))[:, None] / NOISE_SCALE
+    ys = (cy * CHUNK_SIZE + np.arange(CHUNK_SIZE))[None, :] / NOISE_SCALE
+    noise = fractal_noise(xs, ys, seed)
+    return (BASE_HEIGHT + (noise * 2 - 1) * HEIGHT_RANGE).astype(np.int64)
+
+
+def surface_height(seed, x, y):
+    """Returns the height of the topmost solid block at voxel column (x, y)."""
+    heights = height_map(seed, x // CHUNK_SIZE, y // CHUNK_SIZE)
+    return int(heights[x % CHUNK_SIZE, y % CHUNK_SIZE])
+
+
+def generate_chunk(seed, key):
+    """Generates the block ids for one chunk. Runs inside a worker process."""
+    cx, cy, cz = key
+    heights = height_map(seed, cx, cy)[:, :, None]
+    zs = (cz * CHUNK_SIZE + np.arange(CHUNK_SIZE))[None, None, :]
+    surface = np.where(
+        heights <= SAND_LEVEL, SAND, np.where(heights >= SNOW_LEVEL, SNOW, GRASS)
+    )
+    blocks = np.select(
+        [zs == 0, zs < heights - DIRT_DEPTH, zs < heights, zs == heights],
+        [BEDROCK, STONE, DIRT, surface],
+        default=0,
+    ).astype(BLOCK_DTYPE)
+    return key, PalettedBlocks.from_array(blocks)
+
+
+class ChunkStreamer:
+    """
+    Keeps the chunks within a radius of the camera loaded. Missing chunks are read from
+    the region store if they were saved, or generated in a process pool otherwise,
+    nearest first, and handed back to the main thread through a queue that update()
+    drains a few at a time, so the frame never waits on a worker or the disk.
+    Edited chunks are queued for saving when they are unloaded.
+    """
+
+    def __init__(
+        self,
+        world,
+        seed,
+        radius=6,
+        unload_radius=None,
+        workers=None,
+        max_results_per_frame=4,
+        store=None,
+    ):
+        self.world = world
+        self.seed = seed
+        self.store = store
+        # Region files are read on their own thread, off the main thread.
+        self.loader = ThreadPoolExecutor(max_workers=1) if store is not None else None
+        # Radii are horizontal distances measured in chunks.
+        self.radius = radius
+        # Unload a little further out than we load so chunks don't flicker at the edge.
+        self.unload_radius = unload_radius if unload_radius is not None else radius + 2
+        # Offsets (dx, dy, cz) from the centre column of the chunks within radius, in
+        # the order they are requested: nearest columns first, and the upper layers
+        # (where the surface is) before the lower.
+        self.offsets = sorted(
+            (
+                (dx, dy, cz)
+                for dx in range(-radius, radius + 1)
+                for dy in range(-radius, radius + 1)
+                if dx * dx + dy * dy <= radius * radius
+                for cz in range(CHUNK_LAYERS)
+            ),
+            key=lambda offset: (math.hypot(offset[0], offset[1]), -offset[2]),
+        )
+        self.max_results_per_frame = max_results_per_frame
+        workers = workers or os.cpu_count() or 1
+        # Spawn rather than fork, the parent process owns a graphics context.
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.max_in_flight = workers * 2
+        self.results = queue.SimpleQueue()
+        self.center = None
+        # Chunk keys waiting to be submitted, sorted nearest first.
+        self.backlog = []
+        self.in_flight = set()
+        self.completed_times = deque()
+        self.total_generated = 0
+        self.total_loaded = 0
+
+    def update(self, x, y):
+        """
+        Streams chunks around voxel column (x, y).
+        Returns (loaded, unloaded) lists of chunk keys that changed this frame.
+        """
+        center = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        unloaded = []
+        if center != self.center:
+            self.center = center
+            unloaded = self._unload_far_chunks()
+            self._plan_requests()
+
+        # Keep a few requests per worker in flight; the rest wait in the backlog so
+        # that a change of direction doesn't leave the pool busy with stale chunks.
+        while self.backlog and len(self.in_flight) < self.max_in_flight:
+            key = self.backlog.pop(0)
+            self.in_flight.add(key)
+            if self.loader is not None:
+                self.loader.submit(self._load_or_generate, key)
+            else:
+                self._generate(key)
+
+        loaded = []
+        for _ in range(self.max_results_per_frame):
+            try:
+                key, blocks = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.in_flight.discard(key)
+            if blocks is None:
+                continue
+            self.completed_times.append(time.perf_counter())
+            if self._distance(key) > self.unload_radius or key in self.world.chunks:
+                continue
+            self.world.add_chunk(Chunk(key, blocks))
+            loaded.append(key)
+        return loaded, unloaded
+
+    def load_now(self, key):
+        """
+        Loads or generates a chunk on the calling thread and adds it to the world, for
+        edits that reach past the streamed area. Returns the new Chunk.
+        """
+        blocks = None
+        if self.store is not None:
+            try:
+                blocks = self.store.load(key)
+            except (OSError, ValueError, zlib.error):
+                blocks = None
+        if blocks is None:
+            blocks = generate_chunk(self.seed, key)[1]
+        chunk = Chunk(key, blocks)
+        # A request still in flight for this key is dropped when it arrives.
+        self.world.add_chunk(chunk)
+        return chunk
+
+    def _generate(self, key):
+        future = self.executor.submit(generate_chunk, self.seed, key)
+        future.add_done_callback(lambda future: self._on_generated(key, future))
+
+    def _load_or_generate(self, key):
+        # Runs on the loader thread.
+        try:
+            blocks = self.store.load(key)
+        except (OSError, ValueError, zlib.error):
+            # A damaged chunk is regenerated rather than taking the world down.
+            blocks = None
+        if blocks is None:
+            self._generate(key)
+        else:
+            self.total_loaded += 1
+            self.results.put((key, blocks))
+
+    def _on_generated(self, key, future):
+        # Runs on the executor's management thread; only hand the result over.
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            # The chunk is requested again the next time the camera changes chunk.
+            self.results.put((key, None))
+        else:
+            self.total_generated += 1
+            self.results.put(future.result())
+
+    def _distance(self, key):
+        return math.hypot(key[0] - self.center[0], key[1] - self.center[1])
+
+    def _plan_requests(self):
+        cx, cy = self.center
+        wanted = []
+        for dx, dy, cz in self.offsets:
+            key = (cx + dx, cy + dy, cz)
+            if key not in self.world.chunks and key not in self.in_flight:
+                wanted.append(key)
+        self.backlog = wanted
+
+    def _unload_far_chunks(self):
+        far = [
+            key for key in self.world.chunks if self._distance(key) > self.unload_radius
+        ]
+        for key in far:
+            chunk = self.world.remove_chunk(key)
+            if chunk.dirty and self.store is not None:
+                self.store.save(key, chunk.blocks)
+        return far
+
+    def save_dirty_chunks(self):
+        """Queues every loaded chunk with unsaved edits for writing."""
+        for key, chunk in self.world.chunks.items():
+            if chunk.dirty:
+                self.store.save(key, chunk.blocks)
+                chunk.dirty = False
+
+    def chunks_per_second(self):
+        """Chunks generated over the last second."""
+        now = time.perf_counter()
+        while self.completed_times and now - self.completed_times[0] > 1.0:
+            self.completed_times.popleft()
+        return len(self.completed_times)
+
+    def queue_depth(self):
+        """Chunks requested but not yet added to the world."""
+        return len(self.backlog) + len(self.in_flight)
+
+    def shutdown(self):
+        if self.loader is not None:
+            self.loader.shutdown(wait=True, cancel_futures=True)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.store is not None:
+            self.save_dirty_chunks()
+            self.store.close()
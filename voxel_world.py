@@ -0,0 +1,255 @@
+"""Chunked voxel storage shared by the terrain generator, the mesher and minecraft.py."""
+
+import math
+
+import numpy as np
+
+# Chunks are cubes of CHUNK_SIZE blocks. The world is CHUNK_LAYERS chunks tall and
+# unbounded horizontally.
+CHUNK_SIZE = 16
+CHUNK_LAYERS = 4
+WORLD_HEIGHT = CHUNK_SIZE * CHUNK_LAYERS
+
+# This value defines the spacing between blocks (and their size) in world units.
+BLOCK_SPACING = 1.1
+
+# Block ids. Zero is always empty space. Ids are 16-bit; chunks store them
+# palette-compressed (see voxel_palette.py), so adding types costs no memory per block.
+BLOCK_DTYPE = np.uint16
+AIR = 0
+GRASS = 1
+DIRT = 2
+STONE = 3
+SAND = 4
+SNOW = 5
+BEDROCK = 6
+WOOD = 7
+LEAVES = 8
+BRICK = 9
+PLANKS = 10
+LAMP = 11
+
+BLOCK_NAMES = [
+    "air",
+    "grass",
+    "dirt",
+    "stone",
+    "sand",
+    "snow",
+    "bedrock",
+    "wood",
+    "leaves",
+    "brick",
+    "planks",
+    "lamp",
+]
+
+# RGBA colour for each block id, indexed by id.
+BLOCK_COLORS = np.array(
+    [
+        (0, 0, 0, 0),  # Air
+        (51, 255, 51, 255),  # Grass
+        (134, 96, 67, 255),  # Dirt
+        (125, 125, 125, 255),  # Stone
+        (219, 207, 163, 255),  # Sand
+        (240, 250, 255, 255),  # Snow
+        (40, 40, 40, 255),  # Bedrock
+        (102, 81, 51, 255),  # Wood
+        (40, 140, 40, 255),  # Leaves
+        (150, 60, 50, 255),  # Brick
+        (180, 144, 90, 255),  # Planks
+        (255, 230, 150, 255),  # Lamp
+    ],
+    dtype=np.uint8,
+)
+
+# Block light level (0-15) each block id gives off, indexed by id. Every block but air
+# stops light (see voxel_light.py).
+BLOCK_EMISSION = np.zeros(len(BLOCK_NAMES), dtype=np.uint8)
+BLOCK_EMISSION[LAMP] = 15
+
+# Unit offsets to the six face neighbours of a block or chunk.
+NEIGHBOUR_OFFSETS = (
+    (1, 0, 0),
+    (-1, 0, 0),
+    (0, 1, 0),
+    (0, -1, 0),
+    (0, 0, 1),
+    (0, 0, -1),
+)
+
+
+def chunk_key(x, y, z):
+    """Returns the key of the chunk holding the block at voxel coordinate (x, y, z)."""
+    return (x // CHUNK_SIZE, y // CHUNK_SIZE, z // CHUNK_SIZE)
+
+
+def chunk_origin(key):
+    """Returns the voxel coordinate of the lowest corner of a chunk."""
+    return (key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, key[2] * CHUNK_SIZE)
+
+
+def pad_array(array, neighbours, fill=0):
+    """
+    Returns a chunk-sized array with a one voxel border copied from its face
+    neighbours' arrays, given in NEIGHBOUR_OFFSETS order. Missing (None) neighbours
+    leave the border at fill.
+    """
+    size = CHUNK_SIZE
+    padded = np.full((size + 2, size + 2, size + 2), fill, dtype=array.dtype)
+    padded[1:-1, 1:-1, 1:-1] = array
+    for (dx, dy, dz), neighbour in zip(NEIGHBOUR_OFFSETS, neighbours):
+        if neighbour is None:
+            continue
+        # Copy the neighbour's slab that touches this chunk into the matching border.
+        src = [slice(None)] * 3
+        dst = [slice(1, -1)] * 3
+        for axis, offset in enumerate((dx, dy, dz)):
+            if offset == 1:
+                src[axis] = slice(0, 1)
+                dst[axis] = slice(size + 1, size + 2)
+            elif offset == -1:
+                src[axis] = slice(size - 1, size)
+                dst[axis] = slice(0, 1)
+        padded[tuple(dst)] = neighbour[tuple(src)]
+    return padded
+
+
+def pad_blocks(blocks, neighbours):
+    """
+    Returns a chunk's blocks with a one block border copied from its face neighbours,
+    so faces on the chunk boundary can be culled. `neighbours` holds the neighbours'
+    blocks in NEIGHBOUR_OFFSETS order, None where not loaded; missing ones read as air.
+    """
+    return pad_array(
+        blocks.to_array(),
+        [
+            None if neighbour is None else neighbour.to_array()
+            for neighbour in neighbours
+        ],
+        AIR,
+    )
+
+
+class Chunk:
+    def __init__(self, key, blocks):
+        self.key = key
+        # PalettedBlocks holding the block ids, indexed [x, y, z] from the chunk origin.
+        self.blocks = blocks
+        # Bumped on every edit so stale meshes can be recognised.
+        self.version = 0
+        # Set when the chunk has edits that aren't saved to disk yet.
+        self.dirty = False
+        # Light levels, sky light in the high nibble and block light in the low one:
+        # a uint8 array indexed like blocks, one int when the whole chunk has the same
+        # level, or None until voxel_light.py has lit the chunk.
+        self.light = None
+        self._solid_faces = None
+
+    def solid_faces(self):
+        """
+        Returns a bitmask with bit i set when the chunk's boundary layer facing
+        NEIGHBOUR_OFFSETS[i] is entirely solid, for chunk-level occlusion tests.
+        """
+        if self._solid_faces is None or self._solid_faces[0] != self.version:
+            if self.blocks.words is None:
+                mask = 0b111111 if self.blocks.palette[0] != AIR else 0
+            else:
+                solid = self.blocks.to_array() != AIR
+                layers = (
+                    solid[-1],
+                    solid[0],
+                    solid[:, -1],
+                    solid[:, 0],
+                    solid[:, :, -1],
+                    solid[:, :, 0],
+                )
+                mask = sum(1 << i for i, layer in enumerate(layers) if layer.all())
+            self._solid_faces = (self.version, mask)
+        return self._solid_faces[1]
+
+
+class VoxelWorld:
+    def __init__(self):
+        # Keys are chunk (cx, cy, cz) tuples and values are the loaded Chunks.
+        self.chunks = {}
+
+    def add_chunk(self, chunk):
+        self.chunks[chunk.key] = chunk
+
+    def remove_chunk(self, key):
+        return self.chunks.pop(key, None)
+
+    def get_block(self, x, y, z):
+        """Returns the block id at a voxel coordinate, or AIR if its chunk isn't loaded."""
+        chunk = self.chunks.get(chunk_key(x, y, z))
+        if chunk is None:
+            return AIR
+        return chunk.blocks.get(x % CHUNK_SIZE, y % CHUNK_SIZE, z % CHUNK_SIZE)
+
+    def affected_chunks(self, key, changed):
+        """
+        Returns the chunk and those of its loaded face neighbours whose meshes depend on
+        the blocks (or light) marked in the boolean array changed, since changes on a
+        chunk's boundary layers also show in the border faces of the chunk next to it.
+        """
+        affected = [key]
+        for axis in range(3):
+            for layer, direction in ((0, -1), (CHUNK_SIZE - 1, 1)):
+                if changed.take(layer, axis=axis).any():
+                    neighbour = list(key)
+                    neighbour[axis] += direction
+                    if tuple(neighbour) in self.chunks:
+                        affected.append(tuple(neighbour))
+        return affected
+
+    def snapshot(self, key):
+        """
+        Copies a chunk's blocks and its face neighbours' (see pad_blocks), so they can
+        be read on another thread while the world keeps changing.
+        """
+        neighbours = []
+        for dx, dy, dz in NEIGHBOUR_OFFSETS:
+            neighbour = self.chunks.get((key[0] + dx, key[1] + dy, key[2] + dz))
+            neighbours.append(None if neighbour is None else neighbour.blocks.copy())
+        return self.chunks[key].blocks.copy(), neighbours
+
+    def raycast(self, origin, direction, max_distance):
+        """
+        Walks the voxel grid from origin along direction (both in world units).
+        Returns (hit, previous) voxel coordinates for the first solid block within
+        max_distance, where previous is the empty voxel the ray came from, or None.
+        """
+        # Work in voxel units where voxel i spans [i, i + 1) on each axis.
+        position = [c / BLOCK_SPACING + 0.5 for c in origin]
+        length = math.sqrt(sum(c * c for c in direction))
+        if length == 0:
+            return None
+        direction = [c / length for c in direction]
+        voxel = [math.floor(c) for c in position]
+
+        step = [0, 0, 0]
+        t_max = [math.inf] * 3
+        t_delta = [math.inf] * 3
+        for axis in range(3):
+            if direction[axis] > 0:
+                step[axis] = 1
+                t_max[axis] = (voxel[axis] + 1 - position[axis]) / direction[axis]
+                t_delta[axis] = 1 / direction[axis]
+            elif direction[axis] < 0:
+                step[axis] = -1
+                t_max[axis] = (position[axis] - voxel[axis]) / -direction[axis]
+                t_delta[axis] = -1 / direction[axis]
+
+        previous = None
+        limit = max_distance / BLOCK_SPACING
+        travelled = 0.0
+        while travelled <= limit:
+            if self.get_block(*voxel) != AIR:
+                return tuple(voxel), previous
+            previous = tuple(voxel)
+            axis = t_max.index(min(t_max))
+            travelled = t_max[axis]
+            voxel[axis] += step[axis]
+            t_max[axis] += t_delta[axis]
+        return None